@@ -2,22 +2,18 @@
 Utility functions for packet handling in CCS
 """
 
-import gi
-gi.require_version('Gtk', '3.0')
-# gi.require_version('Notify', '0.7')
-
-from gi.repository import Gtk, GLib, GdkPixbuf  #, Notify
 import subprocess
 import struct
 import datetime
 import dateutil.parser as duparser
 import io
 import types
+import functools
+import pickle
 import sys
 import select
 import json
 import time
-import dbus
 import socket
 import os
 from pathlib import Path
@@ -25,8 +21,9 @@ import glob
 import numpy as np
 import logging.handlers
 from database.tm_db import scoped_session_maker, DbTelemetry, DbTelemetryPool, RMapTelemetry, FEEDataTelemetry
-from sqlalchemy.exc import OperationalError as SQLOperationalError
-from sqlalchemy.sql.expression import func
+from sqlalchemy.exc import OperationalError as SQLOperationalError, ProgrammingError as SQLProgrammingError
+from sqlalchemy.sql.expression import func, literal, union_all, and_
+from sqlalchemy.sql.expression import select as sql_select
 import threading
 
 from typing import NamedTuple
@@ -35,6 +32,43 @@ import confignator
 import importlib
 
 import timeformats
+from pus_framing import IDLE_APID, PacketSync, PusStream
+
+# headless mode for scripts and command line tools, GTK and D-Bus are not imported
+HEADLESS = os.environ.get('CCS_HEADLESS', '').lower() not in ('', '0', 'false', 'no')
+
+
+class _Unavailable:
+    """
+    Stand-in for the GTK and D-Bus modules in headless mode. Classes derived from their classes can be defined, but
+    not instantiated.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return type(attr, (_UnavailableClass,), {'_module': self._name})
+
+
+class _UnavailableClass:
+
+    _module = None
+
+    def __init__(self, *args, **kwargs):
+        raise RuntimeError('{} is not available in headless mode'.format(self._module))
+
+
+if HEADLESS:
+    Gtk, GLib, GdkPixbuf = _Unavailable('Gtk'), _Unavailable('GLib'), _Unavailable('GdkPixbuf')
+    dbus = _Unavailable('dbus')
+else:
+    import gi
+    gi.require_version('Gtk', '3.0')
+    # gi.require_version('Notify', '0.7')
+
+    from gi.repository import Gtk, GLib, GdkPixbuf  #, Notify
+    import dbus
 
 cfg = confignator.get_config(check_interpolation=False)
 
@@ -55,18 +89,30 @@ communication = {name: 0 for name in cfg['ccs-dbus_names']}
 scoped_session_idb = scoped_session_maker('idb', idb_version=None)
 scoped_session_storage = scoped_session_maker('storage')
 
-# check if MIB schema exists
-try:
-    scoped_session_idb.execute('show schemas').fetchall()
-except SQLOperationalError as err:
-    logger.critical(err)
-    sys.exit()
+# check if MIB schema exists, the connection is deferred to the first query in headless mode
+if not HEADLESS:
+    try:
+        scoped_session_idb.execute('show schemas').fetchall()
+    except SQLOperationalError as err:
+        logger.critical(err)
+        sys.exit()
 
 # MIB caches to reduce SQL load
-_pcf_cache = {}
-_cap_cache = {}
-_txp_cache = {}
+_cal_cache = {}  # CalibrationRegistry of the current MIB
 _pcf_descr_cache = {}
+_pic_cache = {}
+_mib_apids = set()
+_ool_cache = {}  # LimitsTable of the current MIB
+_mib_luts = {}  # look-up tables derived from the MIB, see _get_mib_lut
+_ext_cal = {}  # project specific calibrations module
+
+# compiled TM decoder plans, keyed by (ST, SST, APID, PI1VAL)
+_tm_decoder_plans = {}
+_tm_decoder_plan_stats = {'hits': 0, 'misses': 0, 'build_time': 0.}
+
+# compiled TC encoder plans, keyed by CCF_DESCR, and the TC parameter info they use, keyed by (table, name)
+_tc_encoder_plans = {}
+_tc_param_cache = {}
 
 project = cfg.get('ccs-database', 'project')
 pc = importlib.import_module(PCPREFIX + str(project).upper())
@@ -90,18 +136,18 @@ except AttributeError as err:
     logger.critical(err)
     raise err
 
-try:
-    cal = importlib.import_module('calibrations_' + str(project).upper())
-except Exception as err:
-    logger.warning(err)
-    cal = None
-
 SREC_MAX_BYTES_PER_LINE = 250
 SEG_HEADER_FMT = '>III'
 SEG_HEADER_LEN = struct.calcsize(SEG_HEADER_FMT)
 SEG_SPARE_LEN = 2
 SEG_CRC_LEN = 2
 
+# access to the live packet buffer of the pool manager
+LIVE_RING_SOCKET = cfg.get('ccs-database', 'live_ring_socket', fallback='/tmp/ccs_pmgr_live.sock')
+LIVE_RESP_FMT = '>BqI'  # status, last idx in buffer, number of packets
+LIVE_PKT_FMT = '>qH'  # idx, packet length
+LIVE_OK, LIVE_GAP, LIVE_NO_POOL = 0, 1, 2
+
 pid_offset = int(cfg.get('ccs-misc', 'pid_offset'))
 
 fmtlist = {'INT8': 'b', 'UINT8': 'B', 'INT16': 'h', 'UINT16': 'H', 'INT32': 'i', 'UINT32': 'I', 'INT64': 'q',
@@ -110,26 +156,32 @@ fmtlist = {'INT8': 'b', 'UINT8': 'B', 'INT16': 'h', 'UINT16': 'H', 'INT32': 'i',
 
 personal_fmtlist = []
 
+# formats that can be compiled into a single struct.Struct
+_STRUCT_FMTS = ('b', 'B', 'h', 'H', 'i', 'I', 'q', 'Q', 'f', 'd')
+
 fmtlengthlist = {'b': 1, 'B': 1, 'h': 2, 'H': 2, 'i': 4, 'I': 4, 'q': 8,
                  'Q': 8, 'f': 4, 'd': 8, 'i24': 3, 'I24': 3}
 
 # get format and offset of SIDs/discriminants
 SID_FORMAT = {8: '>B', 16: '>H', 32: '>I'}
-try:
-    _sidfmt = scoped_session_idb.execute('SELECT PIC_TYPE,PIC_STYPE,PIC_APID,PIC_PI1_OFF,PIC_PI1_WID FROM pic').fetchall()
-    if len(_sidfmt) != 0:
-        SID_LUT = {tuple(k[:3]): tuple(k[3:]) for k in _sidfmt}
-    else:
-        SID_LUT = {}
-        logger.warning('SID definitions not found in MIB!')
-except SQLOperationalError:
-    _sidfmt = scoped_session_idb.execute('SELECT PIC_TYPE,PIC_STYPE,PIC_PI1_OFF,PIC_PI1_WID FROM pic').fetchall()
-    SID_LUT = {tuple([*k[:2], None]): tuple(k[2:]) for k in _sidfmt}
-    logger.warning('MIB structure not fully compatible, no APID in PIC for SID format definition.')
-
 
-# get names of TC parameters that carry data pool IDs, i.e. have CPC_CATEG=P
-DATA_POOL_ID_PARAMETERS = [par[0] for par in scoped_session_idb.execute('SELECT cpc_pname FROM cpc WHERE cpc_categ="P"').fetchall()]
+MIB_SNAPSHOT_VERSION = 2
+# MIB tables read by the CalibrationRegistry and the look-up tables in the MIB snapshot, see get_mib_key
+MIB_KEY_TABLES = ('pcf', 'cap', 'txp', 'mcf', 'lgf', 'pic', 'pid', 'plf', 'vpd', 'cpc')
+
+# lazily loaded module attributes and the accessors providing them, see __getattr__
+_LAZY_ATTRS = {
+    'cal': lambda: get_ext_calibrations(),
+    'SID_LUT': lambda: get_sid_lut(),
+    'DATA_POOL_ID_PARAMETERS': lambda: get_data_pool_id_parameters(),
+    'DP_ITEMS_SRC_FILE': lambda: get_dp_luts().src_file,
+    'DP_IDS_TO_ITEMS': lambda: get_dp_luts().ids_to_items,
+    'DP_ITEMS_TO_IDS': lambda: get_dp_luts().items_to_ids,
+    'SDU_PAR_LENGTH': lambda: get_s13_info().sdu_par_length,
+    'S13_HEADER_LEN_TOTAL': lambda: get_s13_info().header_len_total,
+    'S13_DATALEN_PAR_OFFSET': lambda: get_s13_info().datalen_par_offset,
+    'S13_DATALEN_PAR_SIZE': lambda: get_s13_info().datalen_par_size,
+}
 
 
 counters = {}  # keeps track of PUS TC packet sequence counters (one per APID)
@@ -148,10 +200,59 @@ ActivePoolInfo = NamedTuple(
         ('live', bool)])
 
 
+TmDecoderPlan = NamedTuple(
+    'TmDecoderPlan', [
+        ('spid', int),
+        ('name', tuple),
+        ('mode', str),
+        ('params', tuple),
+        ('fmts', tuple),
+        ('struct', struct.Struct),
+        ('calibrations', types.MappingProxyType)])
+
+TcEncoderPlan = NamedTuple(
+    'TcEncoderPlan', [
+        ('cmd', str),
+        ('st', int),
+        ('sst', int),
+        ('apid', int),
+        ('npars', int),
+        ('ack', int),
+        ('params', tuple),
+        ('variable', bool),
+        ('fmts', tuple),
+        ('struct', struct.Struct)])
+
+DataPoolLuts = NamedTuple(
+    'DataPoolLuts', [
+        ('dp_items', dict),
+        ('ids_to_items', dict),
+        ('items_to_ids', dict),
+        ('src_file', str)])
+
+S13Info = NamedTuple(
+    'S13Info', [
+        ('sdu_par_length', int),
+        ('header_len_total', int),
+        ('datalen_par_offset', int),
+        ('datalen_par_size', int),
+        ('par_sizes', tuple)])
+
+# decoding modes of TmDecoderPlan
+PLAN_FIXED = 'fixed'
+PLAN_VARIABLE = 'variable'
+PLAN_VARIABLE_UDEF = 'variable_udef'
+
+
 def _reset_mib_caches():
-    _pcf_cache.clear()
-    _cap_cache.clear()
-    _txp_cache.clear()
+    _cal_cache.clear()
+    _pic_cache.clear()
+    _mib_apids.clear()
+    _ool_cache.clear()
+    _mib_luts.clear()
+    _tm_decoder_plans.clear()
+    _tc_encoder_plans.clear()
+    _tc_param_cache.clear()
 
 
 def _add_log_socket_handler():
@@ -194,6 +295,224 @@ def get_scoped_session_storage():
     return scoped_session_maker('storage')
 
 
+def __getattr__(name):
+    # provide the lazily loaded module attributes, e.g. cfl.SID_LUT
+    try:
+        return _LAZY_ATTRS[name]()
+    except KeyError:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name)) from None
+
+
+def get_mib_key():
+    """
+    Identify the MIB by its schema name and the checksums of the contents of the tables the calibrations and look-up
+    tables are derived from (see MIB_KEY_TABLES), to detect outdated snapshots and caches. Tables missing in the MIB
+    have a checksum of None.
+
+    :return:
+    """
+    try:
+        return _mib_luts['key']
+    except KeyError:
+        pass
+
+    try:
+        schema, = scoped_session_idb.execute('SELECT DATABASE()').fetchall()[0]
+        checksums = scoped_session_idb.execute('CHECKSUM TABLE {}'.format(','.join(MIB_KEY_TABLES))).fetchall()
+    finally:
+        scoped_session_idb.close()
+
+    key = (schema, tuple((table, checksum) for table, checksum in checksums))
+    _mib_luts['key'] = key
+    return key
+
+
+def _get_mib_lut(name, build):
+    """
+    Return a look-up table derived from the MIB, built on first use. If *mib_snapshot* is set in the config, the
+    tables are stored there and loaded from it as long as the MIB is unchanged.
+
+    :param name: name of the table
+    :param build: function returning the table
+    :return:
+    """
+    try:
+        return _mib_luts[name]
+    except KeyError:
+        pass
+
+    snapshot_file = cfg['ccs-database'].get('mib_snapshot', '')
+    if not snapshot_file:
+        lut = _mib_luts[name] = build()
+        return lut
+
+    if 'snapshot' not in _mib_luts:
+        _mib_luts['snapshot'] = _load_mib_snapshot(snapshot_file, get_mib_key())
+
+    snapshot = _mib_luts['snapshot']
+    if name not in snapshot:
+        snapshot[name] = build()
+        _save_mib_snapshot(snapshot_file, get_mib_key(), snapshot)
+
+    lut = _mib_luts[name] = snapshot[name]
+    return lut
+
+
+def _load_mib_snapshot(fname, key):
+    try:
+        with open(fname, 'rb') as fd:
+            cache = pickle.load(fd)
+        if cache['version'] == MIB_SNAPSHOT_VERSION and cache['key'] == key:
+            return cache['luts']
+    except FileNotFoundError:
+        pass
+    except Exception as err:
+        logger.warning('Failed loading MIB snapshot {} ({})'.format(fname, err))
+
+    return {}
+
+
+def _save_mib_snapshot(fname, key, luts):
+    cache = {'version': MIB_SNAPSHOT_VERSION, 'key': key, 'luts': luts}
+
+    tmp = '{}.{}'.format(fname, os.getpid())
+    try:
+        with open(tmp, 'wb') as fd:
+            pickle.dump(cache, fd, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fname)
+    except OSError as err:
+        logger.warning('Failed writing MIB snapshot {} ({})'.format(fname, err))
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def get_ext_calibrations():
+    """
+    Return the module with the project specific calibrations, imported on first use
+
+    :return: module or None if there is none
+    """
+    try:
+        return _ext_cal['module']
+    except KeyError:
+        pass
+
+    try:
+        module = importlib.import_module('calibrations_' + str(project).upper())
+    except Exception as err:
+        logger.warning(err)
+        module = None
+
+    _ext_cal['module'] = module
+    return module
+
+
+def get_sid_lut():
+    """
+    Return the offset and width of the SIDs/discriminants of TM packets, by (ST, SST, APID)
+
+    :return:
+    """
+    return _get_mib_lut('sid_lut', _build_sid_lut)
+
+
+def _build_sid_lut():
+    try:
+        sidfmt = scoped_session_idb.execute('SELECT PIC_TYPE,PIC_STYPE,PIC_APID,PIC_PI1_OFF,PIC_PI1_WID FROM pic').fetchall()
+        if len(sidfmt) != 0:
+            sid_lut = {tuple(k[:3]): tuple(k[3:]) for k in sidfmt}
+        else:
+            sid_lut = {}
+            logger.warning('SID definitions not found in MIB!')
+    except SQLOperationalError:
+        sidfmt = scoped_session_idb.execute('SELECT PIC_TYPE,PIC_STYPE,PIC_PI1_OFF,PIC_PI1_WID FROM pic').fetchall()
+        sid_lut = {tuple([*k[:2], None]): tuple(k[2:]) for k in sidfmt}
+        logger.warning('MIB structure not fully compatible, no APID in PIC for SID format definition.')
+    finally:
+        scoped_session_idb.close()
+
+    return sid_lut
+
+
+def get_data_pool_id_parameters():
+    """
+    Return the names of TC parameters that carry data pool IDs, i.e. have CPC_CATEG=P
+
+    :return: list of CPC_PNAME
+    """
+    return _get_mib_lut('dp_id_parameters', _build_data_pool_id_parameters)
+
+
+def _build_data_pool_id_parameters():
+    try:
+        return [par[0] for par in scoped_session_idb.execute('SELECT cpc_pname FROM cpc WHERE cpc_categ="P"').fetchall()]
+    finally:
+        scoped_session_idb.close()
+
+
+def _get_data_pool_id_parameter_set():
+    # set of get_data_pool_id_parameters for membership tests
+    try:
+        return _mib_luts['dp_id_parameter_set']
+    except KeyError:
+        pass
+
+    pars = _mib_luts['dp_id_parameter_set'] = set(get_data_pool_id_parameters())
+    return pars
+
+
+def get_dp_luts():
+    """
+    Return the data pool items and look-up tables between their IDs and names, from the file set by *datapool-items*
+    in the config or else from the MIB
+
+    :return: DataPoolLuts
+    """
+    try:
+        return _mib_luts['dp_luts']
+    except KeyError:
+        pass
+
+    src_file = None
+    try:
+        src_file = cfg.get('database', 'datapool-items')
+        if src_file:
+            # get DP from file
+            dp_items = get_data_pool_items(src_file=src_file, as_dict=True)
+        else:
+            raise ValueError
+    except (FileNotFoundError, ValueError, confignator.config.configparser.NoOptionError):
+        logger.warning('Could not load data pool from file: {} Using MIB instead.'.format(src_file))
+        dp_items = _get_mib_lut('dp_items', lambda: get_data_pool_items(as_dict=True))
+
+    luts = DataPoolLuts(dp_items, {k: dp_items[k]['descr'] for k in dp_items},
+                        {dp_items[k]['descr']: k for k in dp_items}, src_file)
+    _mib_luts['dp_luts'] = luts
+    return luts
+
+
+def get_s13_info():
+    """
+    Return the S13 header/offset info, with default values if it cannot be obtained from the MIB
+
+    :return: S13Info
+    """
+    return _get_mib_lut('s13_info', _build_s13_info)
+
+
+def _build_s13_info():
+    try:
+        s13_info = get_tm_parameter_sizes(13, 1)
+        # length of PUS + source header in S13 packets (i.e. data to be removed when collecting S13)
+        return S13Info(s13_info[0][-1], TM_HEADER_LEN + sum([p[-1] for p in s13_info]),
+                       TM_HEADER_LEN + sum([x[1] for x in s13_info[:-1]]), s13_info[-1][1], tuple(s13_info))
+    except (SQLOperationalError, NotImplementedError, IndexError):
+        logger.warning('Could not get S13 info from MIB, using default values')
+        return S13Info(1, 21, 19, 2, ())
+    finally:
+        scoped_session_idb.close()
+
+
 def start_app(file_path, wd, *args, console=False, **kwargs):
     """
     
@@ -768,8 +1087,6 @@ def Tmdata(tm, udef=False, floatfmt=None):
     :param udef:
     :return:
     """
-    tpsd = None
-    params = None
     dbcon = scoped_session_idb
 
     # check if a UDEF exists and use to decode, if not the IDB will be checked
@@ -777,10 +1094,7 @@ def Tmdata(tm, udef=False, floatfmt=None):
         try:
             header, data, crc = Tmread(tm)
             st, sst, apid = header.SERV_TYPE, header.SERV_SUB_TYPE, header.APID
-            que = 'SELECT pic_pi1_off,pic_pi1_wid from pic where pic_type=%s and pic_stype=%s' % (st, sst)
-            # que = 'SELECT pic_pi1_off,pic_pi1_wid from pic where pic_type=%s and pic_stype=%s and pic_apid=%s' % (st, sst, apid)
-            dbres = dbcon.execute(que)
-            pi1, pi1w = dbres.fetchall()[0]
+            pi1, pi1w = _get_pi1_info(st, sst)
 
             pi1val = int.from_bytes(tm[pi1:pi1 + pi1w//8], 'big')
             tag = '{}-{}-{}-{}'.format(st, sst, apid, pi1val)
@@ -811,12 +1125,100 @@ def Tmdata(tm, udef=False, floatfmt=None):
 
         header, data, crc = Tmread(tm)
         st, sst, apid = header.SERV_TYPE, header.SERV_SUB_TYPE, header.APID
-        que = 'SELECT pic_pi1_off,pic_pi1_wid from pic where pic_type=%s and pic_stype=%s' % (st, sst)
-        dbres = dbcon.execute(que)
-        pi1, pi1w = dbres.fetchall()[0]
+        pi1, pi1w = _get_pi1_info(st, sst)
 
         if pi1 != -1:
             pi1val = int.from_bytes(tm[pi1:pi1 + pi1w//8], 'big')
+        else:
+            pi1val = None
+
+        plan = get_decoder_plan(st, sst, apid, pi1val)
+        vals_params = decode_with_plan(plan, data)
+
+        if plan.mode == PLAN_VARIABLE:
+            tmdata = [(get_calibrated(i[0], j, properties=plan.calibrations[i[0]], floatfmt=floatfmt), i[6], i[1],
+                       pidfmt(i[7]), j) for j, i in vals_params]
+        else:
+            tmdata = [(get_calibrated(i[0], j[0], properties=plan.calibrations[i[0]], floatfmt=floatfmt), i[6], i[1],
+                       pidfmt(i[7]), j) for i, j in zip(plan.params, vals_params)]
+
+        tmname = plan.name
+
+    except Exception as failure:
+        raise Exception('Packet data decoding failed: ' + str(failure))
+
+    finally:
+        dbcon.close()
+
+    return tmdata, tmname
+
+
+def _get_pi1_info(st, sst):
+    """
+    Get offset and width of the packet identification field (PI1) for TMs of type (ST, SST), cached
+
+    :param st:
+    :param sst:
+    :return:
+    """
+    if (st, sst) in _pic_cache:
+        return _pic_cache[(st, sst)]
+
+    que = 'SELECT pic_pi1_off,pic_pi1_wid from pic where pic_type=%s and pic_stype=%s' % (st, sst)
+    dbres = scoped_session_idb.execute(que)
+    pi1, pi1w = dbres.fetchall()[0]
+    scoped_session_idb.close()
+
+    _pic_cache[(st, sst)] = (pi1, pi1w)
+    return pi1, pi1w
+
+
+def get_decoder_plan(st, sst, apid, pi1val=None):
+    """
+    Return the compiled decoder plan for TMs identified by (ST, SST, APID, PI1VAL). The plan is built from the MIB on
+    first request and reused afterwards, until the MIB caches are reset (e.g. by switching the MIB version).
+
+    :param st:
+    :param sst:
+    :param apid:
+    :param pi1val: value of the packet identification field, *None* if the packet type has none
+    :return: TmDecoderPlan
+    """
+    key = (st, sst, apid, pi1val)
+
+    try:
+        plan = _tm_decoder_plans[key]
+        _tm_decoder_plan_stats['hits'] += 1
+        return plan
+    except KeyError:
+        pass
+
+    t1 = time.time()
+    plan = _build_decoder_plan(st, sst, apid, pi1val)
+    _tm_decoder_plan_stats['build_time'] += time.time() - t1
+    _tm_decoder_plan_stats['misses'] += 1
+
+    _tm_decoder_plans[key] = plan
+    return plan
+
+
+def _build_decoder_plan(st, sst, apid, pi1val):
+    """
+    Collect the decoding info for a TM type from the MIB (or the user defined decoders) and compile it into a
+    TmDecoderPlan
+
+    :param st:
+    :param sst:
+    :param apid:
+    :param pi1val:
+    :return:
+    """
+    tpsd = None
+    params = None
+    dbcon = scoped_session_idb
+
+    try:
+        if pi1val is not None:
             que = 'SELECT pid_spid,pid_tpsd,pid_dfhsize from pid where pid_type=%s and pid_stype=%s and ' \
                   'pid_apid=%s and pid_pi1_val=%s' % (st, sst, apid, pi1val)
         else:
@@ -832,7 +1234,7 @@ def Tmdata(tm, udef=False, floatfmt=None):
         else:
             if (st, sst) != (3, 25):
                 logger.info('APID {} not found for TM{},{} in I-DB -- not using APID'.format(apid, st, sst))
-            if pi1 != -1:
+            if pi1val is not None:
                 try:
                     tag = '{}-{}-{}-{}'.format(st, sst, apid, pi1val)
                     user_label, params = user_tm_decoders[tag]
@@ -854,18 +1256,15 @@ def Tmdata(tm, udef=False, floatfmt=None):
             ORDER BY plf_offby,plf_offbi'.format(spid)
             dbres = dbcon.execute(que)
             params = dbres.fetchall()
-            vals_params = decode_pus(data, params)
-            tmdata = [(get_calibrated(i[0], j[0], floatfmt=floatfmt), i[6], i[1], pidfmt(i[7]), j) for i, j in zip(params, vals_params)]
+            mode = PLAN_FIXED
 
         elif params is not None:
             # Length of a parameter which should be decoded according to given position
             if len(params[0]) == 9:
-                vals_params = decode_pus(data, params)
+                mode = PLAN_FIXED
             # Decode according to given order, length is then 11
             else:
-                vals_params = read_variable_pckt(data, params)
-
-            tmdata = [(get_calibrated(i[0], j[0], floatfmt=floatfmt), i[6], i[1], pidfmt(i[7]), j) for i, j in zip(params, vals_params)]
+                mode = PLAN_VARIABLE_UDEF
 
         else:
             que = 'SELECT pcf.pcf_name,pcf.pcf_descr,pcf.pcf_ptc,pcf.pcf_pfc,pcf.pcf_curtx,pcf.pcf_width,\
@@ -873,25 +1272,77 @@ def Tmdata(tm, udef=False, floatfmt=None):
             vpd.vpd_name=pcf.pcf_name where vpd_tpsd={} AND pcf_name NOT LIKE "DPTG%" \
             AND pcf_name NOT LIKE "SCTG%" ORDER BY vpd_pos'.format(tpsd)
             dbres = dbcon.execute(que)
-            params_in = dbres.fetchall()
-
-            vals_params = read_variable_pckt(data, params_in)
-            tmdata = [(get_calibrated(i[0], j, floatfmt=floatfmt), i[6], i[1], pidfmt(i[7]), j) for j, i in vals_params]
-            # tmdata = [(get_calibrated(i[0], j[0]), i[6], i[1], pidfmt(i[7]), j) for i, j in zip(params, vals_params)]
+            params = dbres.fetchall()
+            mode = PLAN_VARIABLE
 
         if spid is not None:
             dbres = dbcon.execute("SELECT pid_descr FROM pid WHERE pid_spid={}".format(spid))
-            tmname = dbres.fetchall()[0]
+            tmname = tuple(dbres.fetchall()[0])
         else:
-            tmname = ['USER DEFINED: {}'.format(user_label)]
-
-    except Exception as failure:
-        raise Exception('Packet data decoding failed: ' + str(failure))
+            tmname = ('USER DEFINED: {}'.format(user_label),)
 
     finally:
         dbcon.close()
 
-    return tmdata, tmname
+    params = tuple(tuple(par) for par in params)
+
+    if mode == PLAN_FIXED:
+        fmts = tuple(parameter_ptt_type_tm(par) for par in params)
+        # only pre-compile if all parameters are plain struct types, bit-sized and special types need read_stream
+        if all(fmt in _STRUCT_FMTS for fmt in fmts):
+            fmt_struct = struct.Struct('>' + ''.join(fmts))
+        else:
+            fmt_struct = None
+    else:
+        fmts = ()
+        fmt_struct = None
+
+    calibrations = types.MappingProxyType({par[0]: _get_pcf_properties(par[0]) for par in params})
+
+    return TmDecoderPlan(spid, tmname, mode, params, fmts, fmt_struct, calibrations)
+
+
+def decode_with_plan(plan, data):
+    """
+    Decode the source data of a TM using a compiled decoder plan
+
+    :param plan: TmDecoderPlan
+    :param data: TM source data
+    :return: list of (value, parameter) tuples
+    """
+    if plan.mode != PLAN_FIXED:
+        return read_variable_pckt(data, plan.params)
+
+    if plan.struct is not None:
+        try:
+            return list(zip(plan.struct.unpack(data), plan.params))
+        except struct.error:
+            pass
+
+    tms = io.BytesIO(data)
+    return [(read_stream(tms, fmt, pos=par[2] - TM_HEADER_LEN, offbi=par[3]), par) for fmt, par in zip(plan.fmts, plan.params)]
+
+
+def get_decoder_plan_stats():
+    """
+    Return usage statistics of the TM decoder plan cache
+
+    :return: dict with number of cache hits and misses, total time spent building plans [s] and number of cached plans
+    """
+    return {**_tm_decoder_plan_stats, 'plans': len(_tm_decoder_plans)}
+
+
+def reset_decoder_plans(reset_stats=False):
+    """
+    Drop all compiled TM decoder plans, they are rebuilt on demand
+
+    :param reset_stats: also reset the cache statistics
+    """
+    _tm_decoder_plans.clear()
+    _pic_cache.clear()
+
+    if reset_stats:
+        _tm_decoder_plan_stats.update({'hits': 0, 'misses': 0, 'build_time': 0.})
 
 
 def read_pus(data):
@@ -919,55 +1370,78 @@ def read_pus(data):
 
 def extract_pus(data):
     """
+    Split a PUS packet stream into packets. An incomplete packet at the end of the stream is included as is.
 
-    @param data:
-    @return:
+    @param data: bytes-like object or file object
+    @return: list of packets as byte strings
     """
-    pckts = []
-    if isinstance(data, bytes):
-        data = io.BufferedReader(io.BytesIO(data))
+    if hasattr(data, 'read'):
+        data = data.read()
 
-    while True:
-        pckt = read_pus(data)
-        if pckt is not None:
-            pckts.append(pckt)
-        else:
-            break
-    return pckts
+    return [bytes(pckt) for pckt in PusStream(data, partial=True)]
 
 
-def extract_pus_brute_search(data, filename=None, trashcnt=None):
+def extract_pus_brute_search(data, filename=None, trashcnt=None, sync=None):
     """
 
     :param data:
     :param filename:
     :param trashcnt:
+    :param sync: PacketSync used to resynchronise after corrupt data, see :func:`packet_sync`
     :return:
     """
-    pckts = []
     if trashcnt is None:
         trashcnt = {filename: 0}  # dummy counter if no trashcnt dict is given
 
-    if isinstance(data, bytes):
-        data = io.BufferedReader(io.BytesIO(data))
-    elif isinstance(data, io.BufferedReader):
-        pass
-    else:
+    if isinstance(data, io.BufferedReader):
+        data = data.read()
+    elif not isinstance(data, (bytes, bytearray, memoryview)):
         raise TypeError('Cannot handle input of type {}'.format(type(data)))
 
-    while True:
-        pos = data.tell()
-        pckt = read_pus(data)
-        if pckt is not None:
-            if not crc_check(pckt):
-                pckts.append(pckt)
-            else:
-                data.seek(pos + 1)
-                trashcnt[filename] += 1
-        else:
-            break
+    # only offsets with a plausible packet header are considered when resynchronising after corrupt data
+    stream = PusStream(data, validate=True, sync=sync if sync is not None else packet_sync())
+    trashcnt[filename] += stream.skipped
 
-    return pckts
+    for start, end in stream.gaps:
+        logger.debug('{}: skipped {} bytes of corrupt data at offset {}-{}'.format(filename, end - start, start, end))
+
+    return [bytes(pckt) for pckt in stream]
+
+
+def get_mib_apids():
+    """
+    Return the APIDs of all TM and TC packets defined in the MIB, including the APID of idle packets
+
+    :return: set of APIDs, empty if the MIB defines none
+    """
+    if not _mib_apids:
+        try:
+            res = scoped_session_idb.execute('SELECT DISTINCT pid_apid FROM pid UNION '
+                                             'SELECT DISTINCT ccf_apid FROM ccf').fetchall()
+        except SQLOperationalError as err:
+            logger.warning(err)
+            res = []
+        finally:
+            scoped_session_idb.close()
+
+        apids = {int(apid) for apid, in res if apid not in (None, '')}
+        if apids:
+            _mib_apids.update(apids | {IDLE_APID})
+
+    return set(_mib_apids)
+
+
+def packet_sync(**kwargs):
+    """
+    Return a PacketSync to validate and resynchronise PUS streams of the current project. Packets may be up to
+    MAX_PKT_LEN long. When resynchronising after corrupt data, a packet must also have an APID defined in the MIB,
+    unless disabled by *resync_mib_apids* in the config.
+
+    :param kwargs: further arguments for PacketSync, e.g. *check_next* or *on_gap*
+    :return:
+    """
+    apids = get_mib_apids() if int(cfg['ccs-misc'].get('resync_mib_apids', 1)) else None
+    return PacketSync(apids=apids or None, max_len=MAX_PKT_LEN, **kwargs)
 
 
 def unpack_pus(pckt, use_pktlen=False, logger=logger):
@@ -1334,6 +1808,24 @@ def cuc_time_str(head, logger=logger):
         return '#######'
 
 
+def cuc_time_columns(head, logger=logger):
+    """
+    Return PUS header time as storage DB columns, i.e. the timestamp string together with the numerical CUC time and
+    sync status. The latter two are None for packets without a time field.
+
+    :param head: TMHeader instance
+    :param logger:
+    :return:
+    """
+    timestamp = cuc_time_str(head, logger=logger)
+    try:
+        cuc = float(timestamp[:-1])
+    except ValueError:
+        return dict(timestamp=timestamp, cuc=None, tsync=None)
+
+    return dict(timestamp=timestamp, cuc=cuc, tsync=timestamp[-1] == 'S')
+
+
 ##
 #  Parametertooltiptext
 #
@@ -1684,7 +2176,7 @@ def tc_param_alias_reverse(paf, cca, val, pname=None):
         alval = np.interp(val, yvals, xvals)
         return alval
     # get name for ParamID if datapool item (in MIB)
-    elif pname in DATA_POOL_ID_PARAMETERS:
+    elif pname in _get_data_pool_id_parameter_set():
         return get_pid_name(pidfmt_reverse(val))
     else:
         return val
@@ -1702,7 +2194,7 @@ def get_pid_name(pid):
         pids = [pid]
 
     try:
-        names = [DP_IDS_TO_ITEMS[p] for p in pids]
+        names = [get_dp_luts().ids_to_items[p] for p in pids]
     except KeyError as err:
         logger.warning('Unknown datapool ID')
         raise err
@@ -1755,28 +2247,12 @@ def get_calibrated(pcf_name, rawval, properties=None, numerical=False, dbcon=Non
         return
 
     if properties is None:
+        properties = _get_pcf_properties(pcf_name)
 
-        # cache
-        if pcf_name in _pcf_cache:
-            if _pcf_cache[pcf_name] is None:
-                return rawval if isinstance(rawval, (int, float, str, bytes)) else rawval[0]
-            else:
-                ptc, pfc, categ, curtx = _pcf_cache[pcf_name]
+        if properties is None:
+            return rawval if isinstance(rawval, (int, float, str, bytes)) else rawval[0]
 
-        else:
-            que = 'SELECT pcf.pcf_ptc,pcf.pcf_pfc,pcf.pcf_categ,pcf.pcf_curtx from pcf where pcf_name="%s"' % pcf_name
-            dbres = scoped_session_idb.execute(que)
-            fetch = dbres.fetchall()
-            scoped_session_idb.close()
-            if len(fetch) == 0:
-                _pcf_cache[pcf_name] = None
-                return rawval if isinstance(rawval, (int, float, str, bytes)) else rawval[0]
-
-            ptc, pfc, categ, curtx = fetch[0]
-            _pcf_cache[pcf_name] = (ptc, pfc, categ, curtx)
-
-    else:
-        ptc, pfc, categ, curtx = properties
+    ptc, pfc, categ, curtx = properties
 
     try:
         type_par = ptt(ptc, pfc)
@@ -1793,6 +2269,7 @@ def get_calibrated(pcf_name, rawval, properties=None, numerical=False, dbcon=Non
     elif type_par.startswith('oct'):
         return rawval.hex().upper()
     elif curtx is None:
+        cal = get_ext_calibrations()
         if not nocal and cal is not None:
             calval = cal.calibrate_ext(rawval, pcf_name_to_descr(pcf_name))
             return calval if floatfmt is None else format(calval, floatfmt)
@@ -1813,6 +2290,42 @@ def get_calibrated(pcf_name, rawval, properties=None, numerical=False, dbcon=Non
         return rawval
 
 
+def _get_pcf_properties(pcf_name):
+    """
+    Get the calibration relevant PCF properties (PTC, PFC, CATEG, CURTX) of a parameter
+
+    :param pcf_name:
+    :return: tuple of properties or *None* if the parameter is not in the MIB
+    """
+    return get_calibration_registry().pcf.get(pcf_name)
+
+
+def get_calibration_registry():
+    """
+    Return the calibrations of all parameters in the MIB. They are loaded in bulk on first use, from the file set by
+    *calibration_cache* in the config if it is up to date, and reloaded after the MIB has been changed.
+
+    :return: CalibrationRegistry
+    """
+    try:
+        return _cal_cache['registry']
+    except KeyError:
+        pass
+
+    cachefile = cfg['ccs-database'].get('calibration_cache', '')
+    if cachefile:
+        key = get_mib_key()
+        registry = CalibrationRegistry.load(cachefile, key=key)
+        if registry is None:
+            registry = CalibrationRegistry.from_mib(scoped_session_idb)
+            registry.save(cachefile, key=key)
+    else:
+        registry = CalibrationRegistry.from_mib(scoped_session_idb)
+
+    _cal_cache['registry'] = registry
+    return registry
+
+
 ##
 #  Numerical calibration
 #
@@ -1821,45 +2334,16 @@ def get_calibrated(pcf_name, rawval, properties=None, numerical=False, dbcon=Non
 #  @param xval     Raw value of the parameter
 def get_cap_yval(pcf_name, xval, properties=None, dbcon=None):
     """
+    Apply the numerical calibration (CAP, MCF or LGF) of a parameter to a raw value or an array of raw values. Values
+    outside the range of a CAP curve are calibrated to NaN.
 
     :param pcf_name:
     :param xval:
     :param properties:
     :param dbcon:
-    :return:
+    :return: calibrated value(s), *xval* if the parameter has no numerical calibration
     """
-
-    # cache
-    if pcf_name in _cap_cache:
-        if _cap_cache[pcf_name] is None:
-            return xval
-        xvals, yvals = _cap_cache[pcf_name]
-
-    else:
-        que = 'SELECT cap.cap_xvals,cap.cap_yvals from pcf left join cap on pcf.pcf_curtx=cap.cap_numbr\
-                where pcf.pcf_name="%s"' % pcf_name
-        dbres = scoped_session_idb.execute(que)
-
-        try:
-            xvals, yvals = np.array([x for x in zip(*dbres.fetchall())], dtype=float)
-            if np.isnan(xvals).any() or np.isnan(yvals).any():
-                logger.error('Error in CAP support points for {}'.format(pcf_name))
-                _cap_cache[pcf_name] = None
-                return xval
-            sortidx = xvals.argsort()
-            xvals, yvals = xvals[sortidx], yvals[sortidx]  # make sure value pairs are sorted in x-ascending order
-            _cap_cache[pcf_name] = (xvals, yvals)
-        except IndexError:
-            return xval
-        finally:
-            scoped_session_idb.close()
-
-    yval = np.interp(xval, xvals, yvals, left=np.nan, right=np.nan)  # return NAN if outside defined calibration range
-
-    # if yval == np.nan:
-    #     logger.info('Calibration of {} failed. Value {} outside calibrated range {}-{}'.format(pcf_name, xval, xvals.min(), xvals.max()))
-
-    return yval  # format(yval, 'g')
+    return get_calibration_registry().calibrate_num(pcf_name, xval)
 
 
 ##
@@ -1870,30 +2354,14 @@ def get_cap_yval(pcf_name, xval, properties=None, dbcon=None):
 #  @param alval    Raw value of the parameter
 def get_txp_altxt(pcf_name, alval, dbcon=None):
     """
+    Apply the textual calibration (TXP) of a parameter to a raw value or an array of raw values
 
     :param pcf_name:
     :param alval:
     :param dbcon:
-    :return:
+    :return: calibrated text(s), raw values without calibration are returned unchanged
     """
-
-    # cache
-    if (pcf_name, alval) in _txp_cache:
-        altxt = _txp_cache[(pcf_name, alval)]
-        return altxt
-
-    dbcon = scoped_session_idb
-    que = 'SELECT txp.txp_altxt from pcf left join txp on pcf.pcf_curtx=txp.txp_numbr where\
-            pcf.pcf_name="%s" and txp.txp_from=%s' % (pcf_name, alval if isinstance(alval, int) else alval[0])
-    dbres = dbcon.execute(que)
-    try:
-        altxt, = dbres.fetchall()[0]
-        _txp_cache[(pcf_name, alval)] = altxt
-    except IndexError:
-        altxt = alval
-    finally:
-        dbcon.close()
-    return altxt
+    return get_calibration_registry().calibrate_text(pcf_name, alval)
 
 
 ##
@@ -2023,10 +2491,10 @@ def filter_rows(rows, st=None, sst=None, apid=None, sid=None, time_from=None, ti
             logger.error('SID ({}) not applicable for {}-{}-{}'.format(sid, st, sst, apid))
 
     if time_from is not None:
-        rows = rows.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) >= time_from)
+        rows = rows.filter(DbTelemetry.cuc >= time_from)
 
     if time_to is not None:
-        rows = rows.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) <= time_to)
+        rows = rows.filter(DbTelemetry.cuc <= time_to)
 
     if idx_from is not None:
         rows = rows.filter(DbTelemetry.idx >= idx_from)
@@ -2144,6 +2612,60 @@ def get_pool_rows(pool_name, check_existence=False):
     return rows
 
 
+def get_latest_packets(pool_name, keys):
+    """
+    Fetch the most recent packet for each of the given packet types with a single query
+
+    :param pool_name: name of the pool
+    :param keys: iterable of (ST, SST, APID[, SID]) tuples, None entries match any value
+    :return: dict of key: DbTelemetry row, None if there is no matching packet
+    """
+    keys = [tuple(key) for key in keys]
+    latest = dict.fromkeys(keys)
+    if not latest:
+        return latest
+
+    dbcon = scoped_session_storage()
+    try:
+        pool_id = dbcon.query(DbTelemetryPool.iid).filter(DbTelemetryPool.pool_name == pool_name).scalar()
+        if pool_id is None:
+            return latest
+
+        # one MAX(idx) per key, resolved on the (pool_id, stc, sst, apid, idx) index
+        uniq_keys = list(latest)
+        maxidx = []
+        for i, key in enumerate(uniq_keys):
+            st, sst, apid, sid = (key + (None,))[:4]
+            sel = sql_select(literal(i).label('kid'), func.max(DbTelemetry.idx).label('idx')).where(
+                DbTelemetry.pool_id == pool_id)
+            maxidx.append(filter_rows(sel, st=st, sst=sst, apid=apid, sid=sid))
+        maxidx = union_all(*maxidx).subquery()
+
+        rows = dbcon.query(maxidx.c.kid, DbTelemetry).join(
+            DbTelemetry, and_(DbTelemetry.pool_id == pool_id, DbTelemetry.idx == maxidx.c.idx)).all()
+    finally:
+        dbcon.close()
+
+    for kid, row in rows:
+        latest[uniq_keys[kid]] = row
+
+    return latest
+
+
+def tail(pool_name, n=1, **filters):
+    """
+    Get the last *n* packets of a pool. Only the requested rows are fetched from the DB, other than slicing the result
+    of get_pool_rows with negative indices, which loads the whole pool.
+
+    :param pool_name: name of the pool
+    :param n: number of packets
+    :param filters: keyword arguments for filter_rows, e.g. st, sst, apid, sid, tmtc or idx_to
+    :return: list of DbTelemetry rows in ascending order of idx
+    """
+    rows = filter_rows(get_pool_rows(pool_name), **filters).order_by(DbTelemetry.idx.desc()).limit(n).all()
+    return rows[::-1]
+
+
 def get_hk_val(pool_name, sid, par_id, apid=None):
 
     assert isinstance(sid, int)
@@ -2165,6 +2687,140 @@ def get_hk_val(pool_name, sid, par_id, apid=None):
     return get_param_values(pool_name=pool_name, hk=hk, param=par_id, last=1, mk_array=False)
 
 
+# numpy dtypes for bulk decoding of plain struct formats
+_NP_FMTS = {'b': '>i1', 'B': '>u1', 'h': '>i2', 'H': '>u2', 'i': '>i4', 'I': '>u4', 'q': '>i8', 'Q': '>u8',
+            'f': '>f4', 'd': '>f8'}
+
+
+def _header_bit_layout(fields):
+    """
+    Return dict of (bit offset, bit width) of the fields in a ctypes header structure
+
+    :param fields: _fields_ of a header structure
+    :return:
+    """
+    layout = {}
+    bitpos = 0
+    for label, _, bits in fields:
+        layout[label] = (bitpos, bits)
+        bitpos += bits
+    return layout
+
+
+# bit offset and width of the TM header fields, used for array-wise header decoding
+TM_HEADER_BITS = _header_bit_layout(pc.TMHeaderBits._fields_)
+
+
+def stack_packets(pckts):
+    """
+    Stack raw packets into a contiguous 2D uint8 array, shorter packets are zero-padded to the length of the longest
+
+    :param pckts: list of packet bytestrings
+    :return: array of shape (number of packets, max packet length) and array of packet lengths
+    """
+    lens = np.fromiter(map(len, pckts), dtype=int, count=len(pckts))
+    if len(lens) == 0:
+        return np.zeros((0, 0), dtype=np.uint8), lens
+
+    width = lens.max()
+    if (lens == width).all():
+        arr = np.frombuffer(b''.join(pckts), dtype=np.uint8).reshape(-1, width)
+    else:
+        arr = np.zeros((len(pckts), width), dtype=np.uint8)
+        for i, pckt in enumerate(pckts):
+            arr[i, :len(pckt)] = np.frombuffer(pckt, dtype=np.uint8)
+
+    return arr, lens
+
+
+def extract_bits(arr, bitoff, bitlen):
+    """
+    Extract an unsigned bit field from every row of a stacked packet array
+
+    :param arr: 2D uint8 array as returned by stack_packets
+    :param bitoff: offset of the field from the start of the packet in bits
+    :param bitlen: size of the field in bits (max 57)
+    :return: uint64 array
+    """
+    offby, offbi = divmod(bitoff, 8)
+    nbytes = (bitlen + offbi - 1) // 8 + 1
+    bitsize = nbytes * 8
+
+    val = np.zeros(len(arr), dtype=np.uint64)
+    for i in range(nbytes):
+        val = (val << np.uint64(8)) | arr[:, offby + i].astype(np.uint64)
+
+    mask = np.uint64(2 ** (bitsize - offbi) - 1)
+    return (val & mask) >> np.uint64(bitsize - offbi - bitlen)
+
+
+def extract_param_column(arr, offby, fmt, offbi=0):
+    """
+    Decode the raw values of one parameter from every row of a stacked packet array
+
+    :param arr: 2D uint8 array as returned by stack_packets
+    :param offby: byte offset of the parameter in the packet
+    :param fmt: parameter format as returned by ptt, only numerical formats are supported
+    :param offbi: bit offset of the parameter
+    :return: array of raw parameter values
+    """
+    if fmt in _NP_FMTS:
+        size = fmtlengthlist[fmt]
+        return np.ascontiguousarray(arr[:, offby:offby + size]).view(_NP_FMTS[fmt]).ravel()
+    elif fmt == 'I24':
+        return extract_bits(arr, offby * 8, 24).astype(np.int64)
+    elif fmt == 'i24':
+        val = extract_bits(arr, offby * 8, 24).astype(np.int64)
+        return np.where(val & 0x800000, val - 0x1000000, val)
+    elif fmt.startswith('uint'):
+        return extract_bits(arr, offby * 8 + offbi, int(fmt[4:]))
+    else:
+        raise NotImplementedError('Bulk decoding not supported for format {}'.format(fmt))
+
+
+def get_cuctime_array(arr):
+    """
+    Array-wise equivalent of get_cuctime for stacked TM packets
+
+    :param arr: 2D uint8 array as returned by stack_packets
+    :return: float array of CUC timestamps
+    """
+    ctime = extract_bits(arr, *TM_HEADER_BITS['CTIME'])
+    ftime = extract_bits(arr, *TM_HEADER_BITS['FTIME'])
+    return ctime + ftime / timepack[2]
+
+
+def decode_param_bulk(pckts, offby, fmt, offbi=0):
+    """
+    Decode CUC time and raw value of a parameter from a list of TM packets of one type in one pass
+
+    :param pckts: list of packet bytestrings
+    :param offby: byte offset of the parameter in the packet
+    :param fmt: parameter format as returned by ptt
+    :param offbi: bit offset of the parameter
+    :return: float array of shape (2, number of packets), values of packets too short to hold the parameter are NaN
+    """
+    arr, lens = stack_packets(pckts)
+    if len(arr) == 0:
+        return np.zeros((2, 0), dtype=float)
+
+    # pad to make sure the parameter is within the array bounds for all rows
+    minlen = max(TM_HEADER_LEN, offby + csize(fmt, offbi))
+    if arr.shape[1] < minlen:
+        arr = np.pad(arr, ((0, 0), (0, minlen - arr.shape[1])))
+
+    xy = np.empty((2, len(arr)), dtype=float)
+    xy[0] = get_cuctime_array(arr)
+    xy[1] = extract_param_column(arr, offby, fmt, offbi=offbi)
+    xy[1, lens < offby + csize(fmt, offbi)] = np.nan
+
+    return xy
+
+
+def _bulk_decodable(fmt):
+    return fmt in _NP_FMTS or fmt in ('I24', 'i24') or (fmt.startswith('uint') and int(fmt[4:]) <= 32)
+
+
 # get values of parameter from HK packets
 def get_param_values(tmlist=None, hk=None, param=None, last=0, numerical=False, tmfilter=True, pool_name=None, mk_array=True, nocal=False):
     """
@@ -2258,6 +2914,9 @@ def get_param_values(tmlist=None, hk=None, param=None, last=0, numerical=False,
         tmlist_filt = filter_rows(tmlist, st=st, sst=sst, apid=apid, sid=sid)[-last:] if tmfilter else tmlist[-last:]
         tmlist_filt = [x.raw for x in tmlist_filt]
 
+    # decode all values at once if the parameter format allows it
+    bulk = mk_array and len(tmlist_filt) > 0 and _bulk_decodable(ufmt)
+
     if name is not None:
         que = 'SELECT pcf.pcf_categ,pcf.pcf_curtx from pcf where pcf_name="%s"' % name
         dbres = dbcon.execute(que)
@@ -2269,18 +2928,22 @@ def get_param_values(tmlist=None, hk=None, param=None, last=0, numerical=False,
 
         categ, curtx = fetch[0]
 
-        if mk_array:
-            xy = [(get_cuctime(tm),
-                   get_calibrated(name, read_stream(io.BytesIO(tm[offby:offby + bylen]), ufmt, offbi=offbi, none_on_fail=True),
-                                  properties=[ptc, pfc, categ, curtx], numerical=numerical, nocal=True)) for tm in tmlist_filt]  # no calibration here, done below on array
-        else:
-            xy = [(get_cuctime(tm),
-                   get_calibrated(name, read_stream(io.BytesIO(tm[offby:offby + bylen]), ufmt, offbi=offbi, none_on_fail=True),
-                                  properties=[ptc, pfc, categ, curtx], numerical=numerical, nocal=nocal)) for tm in
-                  tmlist_filt]
+        def decode_xy(nocal):
+            return [(get_cuctime(tm),
+                     get_calibrated(name, read_stream(io.BytesIO(tm[offby:offby + bylen]), ufmt, offbi=offbi, none_on_fail=True),
+                                    properties=[ptc, pfc, categ, curtx], numerical=numerical, nocal=nocal)) for tm in
+                    tmlist_filt]
 
     else:
-        xy = [(get_cuctime(tm), read_stream(io.BytesIO(tm[offby:offby + bylen]), ufmt, offbi=offbi, none_on_fail=True)) for tm in tmlist_filt]
+        def decode_xy(nocal):
+            return [(get_cuctime(tm), read_stream(io.BytesIO(tm[offby:offby + bylen]), ufmt, offbi=offbi, none_on_fail=True)) for tm in tmlist_filt]
+
+    if bulk:
+        xy = None
+    elif mk_array:
+        xy = decode_xy(nocal=True)  # no calibration here, done below on array
+    else:
+        xy = decode_xy(nocal=nocal)
 
     dbcon.close()
 
@@ -2288,24 +2951,30 @@ def get_param_values(tmlist=None, hk=None, param=None, last=0, numerical=False,
         return xy, (descr, unit)
 
     try:
-        arr = np.array(np.array(xy).T, dtype='float')
+        if xy is None:
+            arr = decode_param_bulk(tmlist_filt, offby, ufmt, offbi=offbi)
+        else:
+            arr = np.array(np.array(xy).T, dtype='float')
 
         # calibrate y values
         if not nocal and name is not None:
-            get_cap_yval(name, arr[1, 0])  # calibrate one value to get name into _cap_cache
+            calibrate = get_calibration_registry().num_calibrator(name)
 
-            if _cap_cache[name] is None:
+            if calibrate is None:
                 # try custom calibration if not in MIB
+                cal = get_ext_calibrations()
                 if cal is not None:
                     arr[1, :] = cal.calibrate_ext(arr[1, :], pcf_name_to_descr(name))
                 return arr, (descr, unit)
 
-            xvals, yvals = _cap_cache[name]
-            arr[1, :] = np.interp(arr[1, :], xvals, yvals, left=np.nan, right=np.nan)
+            arr[1, :] = calibrate(arr[1, :])
 
         return arr, (descr, unit)
 
     except (ValueError, IndexError):
+        if xy is None:
+            # decoded in bulk, the values are needed per packet for the structured array
+            xy = decode_xy(nocal=True)
         return np.array(xy, dtype='float, U32'), (descr, unit)
 
 
@@ -2578,55 +3247,269 @@ def Tcbuild(cmd, *args, sdid=0, ack=None, no_check=False, hack_value=None, sourc
     :return:
     """
 
+    plan = get_tc_encoder_plan(cmd)
+
+    if ack is None:
+        ack = bin(plan.ack)
+
+    if plan.npars == 0:
+        pdata = b''
+
+        if source_data_only:
+            return pdata
+
+    else:
+        params = plan.params
+
+        # generate full list of parameters from input values for variable packets
+        if plan.variable:
+
+            params, idx = _get_tc_params_var(params, args)
+
+            if idx != len(args):
+                raise ValueError('Wrong number of TC parameter values ({}), expected {}.'.format(len(args), idx))
+
+        if hack_value is None:
+            values = [tc_param_alias(p[-1], v, no_check=no_check) for p, v in zip_no_pad(params, args)]
+        else:
+            values = hack_value
+
+        pdata = encode_pus(params, *values, fmts=None if plan.variable else plan.fmts)
+
+        if source_data_only:
+            return pdata
+
+    return Tcpack(st=plan.st, sst=plan.sst, apid=int(plan.apid), data=pdata, sdid=sdid, ack=ack, **kwargs), \
+        (plan.st, plan.sst, plan.apid)
+
+
+def Tcbuild_many(cmd, rows, sdid=0, ack=None, no_check=False, source_data_only=False, **kwargs):
+    """
+    Create TC bytestrings for many instances of the same command, e.g. to set a parameter to a series of values. The
+    encoder plan is looked up once, the parameter values are calibrated and checked column by column and, for commands
+    of fixed structure, packed with the precompiled struct of the plan.
+
+    :param cmd: CCF_DESCR string of the requested TC
+    :param rows: iterable of parameter values, one sequence per TC as *args* of Tcbuild
+    :param sdid:
+    :param ack: Override the I-DB TC acknowledment value (4-bit binary, e.g., 0b1011)
+    :param no_check:
+    :param source_data_only: return only the application data of the TCs
+    :param kwargs: passed on to Tcpack
+    :return: list of TC bytestrings
+    """
+    plan = get_tc_encoder_plan(cmd)
+
+    if ack is None:
+        ack = bin(plan.ack)
+
+    rows = [tuple(row) for row in rows]
+
+    if plan.npars == 0:
+        pdatas = [b''] * len(rows)
+
+    elif plan.variable:
+        # the parameter list depends on the values of each TC
+        pdatas = [Tcbuild(cmd, *row, no_check=no_check, source_data_only=True) for row in rows]
+
+    else:
+        ed_pars = [par for par in plan.params if par[5] not in ['A', 'F']]
+        for row in rows:
+            if len(row) != len(ed_pars):
+                raise ValueError('Wrong number of parameters: Expected {}, but got {}.\n{}'.format(
+                    len(ed_pars), len(row), ', '.join(x[10] for x in ed_pars)))
+
+        columns = [[tc_param_alias(par[-1], val, no_check=no_check) for val in col] for par, col in
+                   zip(ed_pars, zip(*rows))]
+        values = list(zip(*columns)) if columns else [()] * len(rows)
+
+        if plan.struct is None:
+            pdatas = [encode_pus(plan.params, *vals, fmts=plan.fmts) for vals in values]
+        else:
+            # insert fixed parameter values, spares are padded by the struct
+            fixed = {}
+            for i, par in enumerate([par for par in plan.params if par[5] != 'A']):
+                if par[5] == 'F':
+                    fixed[i] = tc_param_alias(par[-1], cast_str_value_ptc(par[7], par[8]))
+
+            pdatas = []
+            for vals in values:
+                if fixed:
+                    vals = list(vals)
+                    for i in sorted(fixed):
+                        vals.insert(i, fixed[i])
+                try:
+                    pdatas.append(plan.struct.pack(*vals))
+                except struct.error:
+                    pdatas.append(encode_pus(plan.params, *[v for i, v in enumerate(vals) if i not in fixed],
+                                             fmts=plan.fmts))
+
+    if source_data_only:
+        return pdatas
+
+    return [Tcpack(st=plan.st, sst=plan.sst, apid=int(plan.apid), data=pdata, sdid=sdid, ack=ack, **kwargs)
+            for pdata in pdatas]
+
+
+def get_tc_encoder_plan(cmd):
+    """
+    Return the compiled encoder plan for the TC with CCF_DESCR *cmd*. The plan is built from the MIB on first request,
+    together with the calibration and range check info of its parameters, and reused afterwards, until the MIB caches
+    are reset (e.g. by switching the MIB version).
+
+    :param cmd: CCF_DESCR
+    :return: TcEncoderPlan
+    """
+    try:
+        return _tc_encoder_plans[cmd]
+    except KeyError:
+        pass
+
     try:
-        params = _get_tc_params(cmd)
+        plan = _build_tc_encoder_plan(cmd)
     except SQLOperationalError:
         scoped_session_idb.close()
-        params = _get_tc_params(cmd)
+        plan = _build_tc_encoder_plan(cmd)
+
+    _tc_encoder_plans[cmd] = plan
+    return plan
+
+
+def _build_tc_encoder_plan(cmd):
+    """
+    Collect the encoding info for a TC from the MIB and compile it into a TcEncoderPlan
+
+    :param cmd:
+    :return:
+    """
+    params = _get_tc_params(cmd)
 
     try:
         st, sst, apid, npars = params[0][:4]
     except IndexError:
         raise NameError('Unknown command "{}"'.format(cmd))
 
-    if ack is None:
-        ack = bin(Tcack(cmd))
+    ack = Tcack(cmd)
 
     if npars == 0:
-        pdata = b''
+        return TcEncoderPlan(cmd, st, sst, apid, npars, ack, (), False, (), None)
 
-        if source_data_only:
-            return pdata
+    # padded parameters are encoded as spares
+    params = tuple(tuple(par[:8]) + ('SPARE', par[6]) + tuple(par[10:]) if par[5] == 'A' else tuple(par)
+                   for par in params)
+    variable = any(par[4] for par in params)
+
+    _load_tc_param_info([par[-1] for par in params if par[5] != 'A'])
 
+    if variable:
+        return TcEncoderPlan(cmd, st, sst, apid, npars, ack, params, True, (), None)
+
+    fmts = tuple(parameter_ptt_type_tc(par) for par in params)
+    # only pre-compile if all parameters are plain struct types or spares
+    if all(fmt in _STRUCT_FMTS or fmt.endswith('x') for fmt in fmts):
+        fmt_struct = struct.Struct('>' + ''.join(fmts))
+    else:
+        fmt_struct = None
+
+    return TcEncoderPlan(cmd, st, sst, apid, npars, ack, params, False, fmts, fmt_struct)
+
+
+def _load_tc_param_info(pnames):
+    """
+    Load the calibration (PAS, CCS) and range check (PRF/PRV) info of TC parameters into the TC parameter cache, with
+    one query per table
+
+    :param pnames: CPC_PNAMEs
+    """
+    pnames = {pname for pname in pnames if pname is not None and ('cpc', pname) not in _tc_param_cache}
+    if not pnames:
+        return
+
+    que = 'SELECT cpc_pname,cpc_prfref,cpc_ccaref,cpc_pafref,cpc_descr,cpc_categ from cpc where cpc_pname in ({})'
+    try:
+        cpc = scoped_session_idb.execute(que.format(_sql_str_list(pnames))).fetchall()
+    finally:
+        scoped_session_idb.close()
+
+    for pname, *info in cpc:
+        _tc_param_cache[('cpc', pname)] = tuple(info)
+
+    _load_tc_refs('prf', [row[1] for row in cpc])
+    _load_tc_refs('cca', [row[2] for row in cpc])
+    _load_tc_refs('paf', [row[3] for row in cpc])
+
+
+def _load_tc_refs(table, numbrs):
+    """
+    Load range checks (prf), numerical (cca) or textual (paf) calibrations of TC parameters into the TC parameter
+    cache
+
+    :param table: 'prf', 'cca' or 'paf'
+    :param numbrs: references as given in CPC
+    """
+    numbrs = {numbr for numbr in numbrs if numbr is not None and (table, numbr) not in _tc_param_cache}
+    if not numbrs:
+        return
+
+    if table == 'prf':
+        que = 'SELECT prv_numbr,prf_dspfmt,prf_radix,prv_minval,prv_maxval FROM prv INNER JOIN prf ON ' \
+              'prf_numbr=prv_numbr WHERE prv_numbr in ({})'
+    elif table == 'cca':
+        que = 'SELECT ccs_numbr,ccs_xvals,ccs_yvals from ccs where ccs_numbr in ({})'
+    elif table == 'paf':
+        que = 'SELECT pas_numbr,pas_altxt,pas_alval from pas where pas_numbr in ({})'
     else:
-        # check for padded parameters
-        padded, = np.where(np.array([i[5] for i in params]) == 'A')
-        if len(padded) != 0:
-            for n in padded:
-                x = list(params[n])
-                x[8:10] = 'SPARE', x[6]
-                params.remove(params[n])
-                params.insert(n, tuple(x))
+        raise ValueError('Unknown TC parameter table {}'.format(table))
+
+    rows = {}
+    try:
+        for numbr, *row in scoped_session_idb.execute(que.format(_sql_str_list(numbrs))).fetchall():
+            rows.setdefault(numbr, []).append(tuple(row))
+    finally:
+        scoped_session_idb.close()
+
+    for numbr in numbrs:
+        if table == 'paf':
+            _tc_param_cache[(table, numbr)] = _mk_pas_lut(rows.get(numbr, []))
+        else:
+            _tc_param_cache[(table, numbr)] = tuple(rows.get(numbr, ()))
+
+
+def _sql_str_list(names):
+    return ','.join('"{}"'.format(name) for name in names)
 
-        # generate full list of parameters from input values for variable packets
-        if np.any([i[4] for i in params]):
 
-            params, idx = _get_tc_params_var(params, args)
+def _mk_pas_lut(pas):
+    # alias values by text, the first entry is used for duplicates and the look-up is case-insensitive as in SQL
+    lut = {}
+    for altxt, alval in pas:
+        lut.setdefault(str(altxt), alval)
+        lut.setdefault(str(altxt).lower(), alval)
+    return lut, tuple(x[0] for x in pas)
 
-            if idx != len(args):
-                raise ValueError('Wrong number of TC parameter values ({}), expected {}.'.format(len(args), idx))
 
-        if hack_value is None:
-            values = [tc_param_alias(p[-1], v, no_check=no_check) for p, v in zip_no_pad(params, args)]
-        else:
-            values = hack_value
+def _get_tc_param_cache(table, name):
+    """
+    Get cached TC parameter info, loading it from the MIB if necessary
 
-        pdata = encode_pus(params, *values)
+    :param table: 'cpc', 'prf', 'cca' or 'paf'
+    :param name: CPC_PNAME for 'cpc', otherwise the respective reference from CPC
+    :return:
+    """
+    try:
+        return _tc_param_cache[(table, name)]
+    except KeyError:
+        pass
 
-        if source_data_only:
-            return pdata
+    if table == 'cpc':
+        _load_tc_param_info([name])
+    else:
+        _load_tc_refs(table, [name])
 
-    return Tcpack(st=st, sst=sst, apid=int(apid), data=pdata, sdid=sdid, ack=ack, **kwargs), (st, sst, apid)
+    try:
+        return _tc_param_cache[(table, name)]
+    except KeyError:
+        raise IndexError('{} {} not in MIB'.format(table.upper(), name))
 
 
 def _get_tc_params(cmd, paf_cal=False):
@@ -2697,12 +3580,13 @@ def _get_tc_params_var(params, vals, idx=None):
     return rp, idx
 
 
-def encode_pus(params, *values, params_as_fmt_string=False):
+def encode_pus(params, *values, params_as_fmt_string=False, fmts=None):
     """
 
     :param params:
     :param values:
     :param params_as_fmt_string:
+    :param fmts: formats of *params*, e.g. from a TcEncoderPlan, derived from *params* if not given
     :return:
     """
     if params_as_fmt_string or isinstance(params, str):
@@ -2723,7 +3607,10 @@ def encode_pus(params, *values, params_as_fmt_string=False):
             fixed_val = cast_str_value_ptc(par[7], par[8])
             values.insert(i, tc_param_alias(par[-1], fixed_val))
 
-    fmts = [parameter_ptt_type_tc(par) for par in params]
+    if fmts is None:
+        fmts = [parameter_ptt_type_tc(par) for par in params]
+    else:
+        fmts = list(fmts)
 
     if 'deduced' in fmts:
 
@@ -2740,7 +3627,7 @@ def encode_pus(params, *values, params_as_fmt_string=False):
                     vidx += 1
 
             elif p[10] == 'P':
-                pfmt = _dp_items[values[vidx]]['fmt']
+                pfmt = get_dp_luts().dp_items[values[vidx]]['fmt']
                 vidx += 1
 
             elif not fmts[i].endswith('x'):
@@ -2914,9 +3801,7 @@ def tc_param_alias(param, val, no_check=False):
     :param no_check:
     :return:
     """
-    que = 'SELECT cpc_prfref,cpc_ccaref,cpc_pafref,cpc_descr,cpc_categ from cpc where cpc_pname="%s"' % param
-    dbcon = scoped_session_idb
-    prf, cca, paf, pdesc, categ = dbcon.execute(que).fetchall()[0]
+    prf, cca, paf, pdesc, categ = _get_tc_param_cache('cpc', param)
     # this is a workaround for datapool items not being present in PAF/PAS table # DEPRECATED!
     # if param in ['DPP70004', 'DPP70043']:  # DataItemID in TC(211,1)
     #     val = get_pid(val)
@@ -2926,7 +3811,7 @@ def tc_param_alias(param, val, no_check=False):
     # check if parameter holds a data pool ID (categ=P) and look up numerical value in case it is given as string
     if categ == 'P' and isinstance(val, str):
         try:
-            val = DP_ITEMS_TO_IDS[val]
+            val = get_dp_luts().items_to_ids[val]
         except KeyError:
             raise KeyError('Unknown data pool item "{}"'.format(val))
 
@@ -2944,35 +3829,24 @@ def tc_param_alias(param, val, no_check=False):
 
     if paf is not None:
 
-        que = 'SELECT pas_alval from pas where pas_numbr="%s" and pas_altxt="%s"' % (paf, val)
-        dbres = dbcon.execute(que)
-        try:
-            alval, = dbres.fetchall()[0]
-        except IndexError as error:
+        alvals, altxts = _get_tc_param_cache('paf', paf)
+        alval = alvals.get(str(val), alvals.get(str(val).lower()))
+        if alval is None:
             if no_check:
                 alval = val
                 logger.info('Inserting unchecked value for {}: {}'.format(pdesc, val))
             else:
-                que = 'SELECT pas_altxt from pas where pas_numbr="%s"' % paf
-                alvals = [x[0] for x in dbcon.execute(que).fetchall()]
-                raise ValueError('Invalid {} value: {}. Allowed values are: {}.'.format(pdesc, val, ', '.join(alvals)))
-        finally:
-            dbcon.close()
+                raise ValueError('Invalid {} value: {}. Allowed values are: {}.'.format(pdesc, val, ', '.join(altxts)))
 
         return int(alval)
     elif cca is not None:
 
-        que = 'SELECT ccs_xvals,ccs_yvals from ccs where ccs_numbr="%s"' % cca
-        dbres = dbcon.execute(que)
-        xvals, yvals = np.array([x for x in zip(*dbres.fetchall())], dtype=float)
-        dbcon.close()
+        xvals, yvals = np.array([x for x in zip(*_get_tc_param_cache('cca', cca))], dtype=float)
         alval = int(np.interp(val, xvals, yvals))
 
         return alval
     else:
 
-        dbcon.close()
-
         return val
 
 
@@ -2995,7 +3869,8 @@ def get_pid(parnames):
     #     msg = "Duplicate parameters will be ignored! {}".format(set([p for p in parnames if parnames.count(p) > 1]))
     #     logger.warning(msg)
 
-    pids = [DP_ITEMS_TO_IDS[parname] for parname in parnames]
+    items_to_ids = get_dp_luts().items_to_ids
+    pids = [items_to_ids[parname] for parname in parnames]
 
     return pids if len(pids) > 1 else pids[0]
 
@@ -3008,12 +3883,13 @@ def get_sid(st, sst, apid):
     :param apid:
     :return:
     """
-    if (st, sst, apid) in SID_LUT:
-        return SID_LUT[(st, sst, apid)]
+    sid_lut = get_sid_lut()
+    if (st, sst, apid) in sid_lut:
+        return sid_lut[(st, sst, apid)]
     else:
         try:
             logger.warning('APID {} not known'.format(apid))
-            return SID_LUT[(st, sst, None)]
+            return sid_lut[(st, sst, None)]
         except KeyError:
             return
 
@@ -3033,10 +3909,7 @@ def tc_param_in_range(prf, val, pdesc):
     :param pdesc:
     :return:
     """
-    que = 'SELECT prf_dspfmt,prf_radix,prv_minval,prv_maxval FROM prv INNER JOIN prf ON prf_numbr=prv_numbr WHERE prv_numbr="{}"'.format(prf)
-    dbcon = scoped_session_idb
-    prfs = dbcon.execute(que).fetchall()
-    dbcon.close()
+    prfs = _get_tc_param_cache('prf', prf)
     if prfs[0][0] in ['I', 'U', 'R']:  # numerical range check if not text encoded (A) parameter
         if prfs[0][1] == 'D':
             ranges = [(int(pval[2], 10), int(pval[3], 10)) for pval in prfs]
@@ -3421,6 +4294,7 @@ def get_last_pckt_time(pool_name='LIVE', string=True, use_pmgr=False):
         filename = pool_name
 
     # get the first packet from the pool
+    packet = None
     dbcon = scoped_session_storage
     row = dbcon.query(
         DbTelemetry
@@ -3642,12 +4516,13 @@ def Datasend(data, pool_name):
 #  @param val   Parameter value
 def Tm_limits_check(param, val, user_limit: dict = None, dbcon=None):
     """
+    Check a parameter value against user defined limits or the out-of-limits checks of the MIB, see LimitsTable
 
     :param param:
     :param val:
     :param user_limit:
-    :param dbcon:
-    :return:
+    :param dbcon: unused, the MIB checks are loaded once by get_limits_table
+    :return: 0 if in limits, 1 if outside soft limits, 2 if outside hard limits
     """
     if user_limit is not None:
         val = float(val)
@@ -3660,28 +4535,69 @@ def Tm_limits_check(param, val, user_limit: dict = None, dbcon=None):
         else:
             return 1
 
-    dbcon = scoped_session_idb
-    que = 'SELECT ocf_nbool,ocf_codin,ocp_pos,ocp_type,ocp_lvalu,ocp_hvalu from ocf\
-            left join ocp on ocf_name=ocp_name where ocf_name="%s"' % param
-    dbres = dbcon.execute(que)
-    oc = dbres.fetchall()
-    dbcon.close()
-    if len(oc) == 0:
-        return 0
-    fmt = oc[0][1]
-    if oc[0][3] == 'C':
-        return 2 if val not in [i[4] for i in oc] else 0
-    elif oc[0][3] in ['S', 'H']:
-        oolimits = [str_to_num(pval[4], fmt) <= str_to_num(val, fmt) <= str_to_num(pval[5], fmt) for
-                    pval in oc]
-        if not any(oolimits):
-            return 2
-        elif all(oolimits):
-            return 0
-        elif any(oolimits) and ([lt[3] for lt in oc].count('S') == 0):
-            return 0
-        else:
-            return 1
+    return get_limits_table().check(param, val)
+
+
+def get_limits_table():
+    """
+    Return the out-of-limits checks of all parameters in the MIB. They are loaded on first use and reloaded after the
+    MIB has been changed.
+
+    :return: LimitsTable
+    """
+    try:
+        return _ool_cache['table']
+    except KeyError:
+        pass
+
+    que = 'SELECT ocf_name,pcf_descr,ocf_codin,ocp_type,ocp_lvalu,ocp_hvalu from ocf left join ocp on ocf_name=ocp_name ' \
+          'left join pcf on ocf_name=pcf_name order by ocf_name,ocp_pos'
+    rows = scoped_session_idb.execute(que).fetchall()
+    scoped_session_idb.close()
+
+    table = _ool_cache['table'] = LimitsTable(rows)
+    return table
+
+
+def get_limit_violations(pool_name, params=None):
+    """
+    Check all samples of TM parameters in a pool against their MIB limits. The packets of the pool are read once and
+    the values of each parameter are checked in bulk.
+
+    :param pool_name:
+    :param params: names (PCF_NAME) of the parameters to check, defaults to all parameters with out-of-limits checks
+    :return: dict of parameter name and tuple of times, values and states of the samples out of limits
+    """
+    table = get_limits_table()
+    if params is None:
+        params = [name for name in table.names if table.kind[table.index[name]] != 0]
+
+    tmlist = [row.raw for row in get_pool_rows(pool_name, check_existence=True).yield_per(1000)]
+
+    violations = {}
+    for name in params:
+        try:
+            if table.kind[table.index[name]] == LimitsTable.STATUS:
+                # status checks compare the calibrated text values
+                xy, _ = get_param_values(tmlist=tmlist, param=name, mk_array=False)
+                times, values = np.array([x[0] for x in xy]), np.array([x[1] for x in xy], dtype=object)
+            else:
+                arr, _ = get_param_values(tmlist=tmlist, param=name)
+                if arr.dtype.names:
+                    # values that could not be converted to float are returned as structured array of time and text
+                    times, values = arr['f0'], arr['f1']
+                else:
+                    times, values = arr
+            states = table.check_array(name, values)
+        except Exception as err:
+            logger.warning('Could not check limits of {} ({})'.format(name, err))
+            continue
+
+        ool = states != 0
+        if ool.any():
+            violations[name] = (times[ool], values[ool], states[ool])
+
+    return violations
 
 
 ##
@@ -3721,25 +4637,283 @@ def calc_param_crc(cmd, *args, no_check=False, hack_value=None):
     return crc(pdata[:-PEC_LEN])
 
 
+class UploadAborted(Exception):
+    """
+    Raised if a memory upload is aborted because a packet could not be sent or was not acknowledged. The upload can be
+    resumed by passing *resume* as *start* to the same upload function.
+    """
+
+    def __init__(self, msg, report):
+        """
+
+        :param msg:
+        :param report: statistics of the upload, see MemoryUpload.report
+        """
+        super().__init__(msg)
+        self.report = report
+        self.resume = report['resume']
+
+
+class MemoryUpload:
+    """
+    Sends the source data of a sequence of memory load TCs (S6,2). If acknowledgements are requested by the *ack*
+    flags, up to *window* packets are kept in flight and a slot is freed as soon as the TM(1,1) or, if completion is
+    requested, the TM(1,7) of a packet is received. Packets that are rejected (TM(1,2)/(1,8)) or not acknowledged
+    within *timeout* seconds are retransmitted. Otherwise, packets are paced by the period *sleep* only. In both cases,
+    the packet rate can be limited to *rate* packets per second (token bucket).
+    """
+
+    ACK_ACCEPTANCE = 0b0001
+    ACK_COMPLETION = 0b1000
+    PKTIDLEN = 4
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, apid, ack=0b1001, pool_name='LIVE', window=None, rate=None, sleep=0., timeout=None,
+                 retries=None, progress=True, dryrun=False):
+        """
+
+        :param apid:
+        :param ack:
+        :param pool_name:
+        :param window: max. number of unacknowledged packets, 0 to pace by *sleep* only
+        :param rate: max. number of packets per second
+        :param sleep: period between packets if not pacing by acknowledgements
+        :param timeout: seconds to wait for the acknowledgement of a packet before it is retransmitted
+        :param retries: max. number of retransmissions of a packet before the upload is aborted
+        :param progress:
+        :param dryrun: do not send packets
+        """
+        if window is None:
+            window = int(cfg['ccs-misc'].get('upload_window', 8))
+        if timeout is None:
+            timeout = float(cfg['ccs-misc'].get('upload_ack_timeout', 5))
+        if retries is None:
+            retries = int(cfg['ccs-misc'].get('upload_retries', 2))
+
+        self.apid = apid
+        self.ack = ack
+        self.pool_name = pool_name
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.progress = progress
+        self.dryrun = dryrun
+
+        self.pace_acks = window > 0 and bool(ack & (self.ACK_ACCEPTANCE | self.ACK_COMPLETION)) and not dryrun
+        self._ack_sst = 7 if ack & self.ACK_COMPLETION else 1
+
+        if rate is None:
+            if self.pace_acks:
+                rate = cfg['ccs-misc'].get('upload_rate', '')
+                rate = float(rate) if rate else None
+            elif sleep:
+                rate = 1 / sleep
+        self.rate = rate
+        self._burst = max(window, 1) if self.pace_acks else 1
+        self._tokens = self._burst
+        self._tlast = time.time()
+
+        # get permanent pmgr handle to avoid requesting one for each packet
+        self._pmgr = None if dryrun else _get_pmgr_handle(tc_pool=pool_name)
+
+        self.npkts = 0
+        self.nbytes = 0
+        self.retransmissions = 0
+        self.resume = 0
+        self._t0 = None
+
+    @property
+    def elapsed(self):
+        return time.time() - self._t0 if self._t0 is not None else 0.
+
+    @property
+    def throughput(self):
+        """
+        Bytes per second sent on the link, including retransmissions
+        """
+        return self.nbytes / self.elapsed if self.elapsed else 0.
+
+    def report(self):
+        """
+        Statistics of the upload: number of packets and bytes sent (including retransmissions), number of
+        retransmissions, elapsed time, throughput in bytes per second and the index to resume from
+        """
+        return {'packets': self.npkts, 'bytes': self.nbytes, 'retransmissions': self.retransmissions,
+                'time': self.elapsed, 'throughput': self.throughput, 'resume': self.resume}
+
+    def run(self, payloads, start=0, sync_last=False):
+        """
+        Send the TCs with the given source data, starting with *payloads[start]*. If the upload is aborted,
+        UploadAborted is raised and the upload can be resumed from its *resume* index, the first packet not
+        acknowledged.
+
+        :param payloads: list of packet source data
+        :param start:
+        :param sync_last: send the last packet only after all others have been acknowledged
+        :return: statistics of the upload, see report
+        """
+        if self._t0 is None:
+            self._t0 = time.time()
+
+        ntot = len(payloads)
+        nxt = self.resume = start
+        inflight = {}  # packet ID -> (index, time sent, attempts)
+        retry = []
+        acked = set()
+
+        if self.pace_acks:
+            stats = get_pool_stats(self.pool_name)
+            sub = LivePacketSubscription(self.pool_name, after=stats['max_idx'] if stats else 0, st=1)
+
+        try:
+            while self.resume < ntot:
+                while not (self.pace_acks and len(inflight) >= self.window):
+                    if retry:
+                        idx, attempts = retry.pop(0)
+                        self.retransmissions += 1
+                    elif nxt < ntot and not (sync_last and nxt == ntot - 1 and self.resume < nxt):
+                        idx, attempts = nxt, 0
+                        nxt += 1
+                    else:
+                        break
+
+                    pktid = self._send(payloads[idx])
+                    if pktid is None:
+                        msg = 'Upload aborted, resume with start={}'.format(self.resume)
+                        logger.error(msg)
+                        raise UploadAborted(msg, self.report())
+
+                    if self.pace_acks:
+                        inflight[pktid] = (idx, time.time(), attempts)
+                    else:
+                        self.resume = nxt
+
+                    if self.progress and self.pace_acks:
+                        print('{}/{} packets sent, {} acknowledged\r'.format(nxt, ntot, self.resume), end='')
+                    elif self.progress:
+                        print('{}/{} packets sent\r'.format(nxt, ntot), end='')
+
+                if not self.pace_acks:
+                    continue
+
+                for pktid, sst in self._get_acks(sub):
+                    if pktid not in inflight:
+                        continue
+                    if sst in (2, 8):
+                        idx, _, attempts = inflight.pop(pktid)
+                        logger.warning('Packet {} of upload failed TM(1,{}), retransmitting'.format(idx, sst))
+                        retry.append((idx, attempts + 1))
+                    elif sst == self._ack_sst:
+                        acked.add(inflight.pop(pktid)[0])
+
+                now = time.time()
+                for pktid, (idx, tsent, attempts) in list(inflight.items()):
+                    if now - tsent > self.timeout:
+                        del inflight[pktid]
+                        logger.warning('Packet {} of upload not acknowledged, retransmitting'.format(idx))
+                        retry.append((idx, attempts + 1))
+
+                while self.resume in acked:
+                    acked.remove(self.resume)
+                    self.resume += 1
+
+                for idx, attempts in retry:
+                    if attempts > self.retries:
+                        msg = 'Packet {} of upload not acknowledged after {} attempts, aborting. Resume with ' \
+                              'start={}'.format(idx, attempts, self.resume)
+                        logger.error(msg)
+                        raise UploadAborted(msg, self.report())
+
+        finally:
+            if self.pace_acks:
+                sub.close()
+
+        return self.report()
+
+    def _send(self, payload):
+        self._take_token()
+
+        seq_cnt = counters.setdefault(self.apid, 0)
+        puspckt = Tcpack(data=payload, st=6, sst=2, apid=self.apid, sc=seq_cnt, ack=self.ack)
+
+        if len(puspckt) > MAX_PKT_LEN:
+            logger.warning('Packet length ({}) exceeding MAX_PKT_LEN of {} bytes!'.format(len(puspckt), MAX_PKT_LEN))
+
+        if not self.dryrun:
+            if not Tcsend_bytes(puspckt, pool_name=self.pool_name, pmgr_handle=self._pmgr):
+                return
+            counters[self.apid] += 1
+
+        self.npkts += 1
+        self.nbytes += len(puspckt)
+
+        return puspckt[:self.PKTIDLEN]
+
+    def _take_token(self):
+        if self.rate is None:
+            return
+
+        now = time.time()
+        self._tokens = min(self._burst, self._tokens + (now - self._tlast) * self.rate)
+        self._tlast = now
+
+        if self._tokens < 1:
+            wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            self._tokens = 1
+            self._tlast = now + wait
+
+        self._tokens -= 1
+
+    def _get_acks(self, sub):
+        """
+        Get the (packet ID, SST) of the TM(1,x) received since the last call
+
+        :param sub: LivePacketSubscription to service 1
+        :return:
+        """
+        pkts = sub.get(timeout=self.POLL_INTERVAL)
+
+        # no live buffer available, poll the storage DB
+        if pkts is None:
+            rows = filter_rows(get_pool_rows(self.pool_name), st=1, idx_from=sub.after + 1).order_by(DbTelemetry.idx)
+            pkts = [(row.idx, row.raw) for row in rows]
+            if pkts:
+                sub.after = pkts[-1][0]
+            else:
+                time.sleep(self.POLL_INTERVAL)
+
+        header = TMHeader()
+        acks = []
+        for _, raw in pkts:
+            header.bin[:] = raw[:TM_HEADER_LEN]
+            acks.append((raw[TM_HEADER_LEN:TM_HEADER_LEN + self.PKTIDLEN], header.bits.SERV_SUB_TYPE))
+
+        return acks
+
+
 def load_to_memory(data, memid, memaddr, max_pkt_size=MAX_PKT_LEN, sleep=0.125, ack=0b1001, pool_name='LIVE', tcname=None,
-                   progress=True, calc_crc=True, byte_align=4):
+                   progress=True, calc_crc=True, byte_align=4, window=None, rate=None, start=0):
     """
-    Function for loading data to DPU memory. Splits the input _data_ into slices and sequentially sends them
-    to the specified location _memid_, _mempos_ by repeatedly calling the _Tcsend_bytes_ function until
-    all _data_ is transferred. Data is zero-padded if not aligned to _byte_align_ bytes.
+    Function for loading data to DPU memory. Splits the input _data_ into slices and sends them to the specified
+    location _memid_, _mempos_ via MemoryUpload until all _data_ is transferred. Data is zero-padded if not aligned to
+    _byte_align_ bytes.
 
     :param data:
     :param memid:
     :param memaddr:
     :param max_pkt_size:
-    :param sleep:
+    :param sleep: period between packets, if not pacing by acknowledgements
     :param ack:
     :param pool_name:
     :param tcname:
     :param progress:
     :param calc_crc:
     :param byte_align:
-    :return:
+    :param window: max. number of unacknowledged packets, see MemoryUpload
+    :param rate: max. number of packets per second
+    :param start: index of the first packet to send, to resume an aborted upload from UploadAborted.resume
+    :return: length and CRC of the uploaded data, if _calc_crc_. Raises UploadAborted if the upload is aborted.
     """
 
     if not isinstance(data, bytes):
@@ -3759,52 +4933,26 @@ def load_to_memory(data, memid, memaddr, max_pkt_size=MAX_PKT_LEN, sleep=0.125,
 
     memid = get_mem_id(memid, memid_ref)
 
-    # get permanent pmgr handle to avoid requesting one for each packet
-    pmgr = _get_pmgr_handle(tc_pool=pool_name)
-
-    data_size = len(data)
-    startaddr = memaddr
-
-    upload_bytes = b''
-    pcnt = 0
-    ptot = None
-
-    slices = [data[i:i + payload_len] for i in range(0, len(data), payload_len)]
     if (payload_len + pkt_overhead) > MAX_PKT_LEN:
         logger.warning('PKTSIZE > {} bytes, this might not work!'.format(MAX_PKT_LEN))
 
-    for sli in slices:
-        t1 = time.time()
-
-        # create PUS packet
-        packetdata = struct.pack(fmt, memid, startaddr, len(sli)) + sli + endspares
-        seq_cnt = counters.setdefault(apid, 0)
-        puspckt = Tcpack(data=packetdata, st=6, sst=2, apid=apid, sc=seq_cnt, ack=ack)
-
-        if len(puspckt) > MAX_PKT_LEN:
-            logger.warning('Packet length ({}) exceeding MAX_PKT_LEN of {} bytes!'.format(len(puspckt), MAX_PKT_LEN))
-
-        Tcsend_bytes(puspckt, pool_name=pool_name, pmgr_handle=pmgr)
-        # collect all uploaded segments for CRC at the end
-        upload_bytes += sli
-        pcnt += 1
-
-        if progress:
-            if ptot is None:
-                ptot = int(np.ceil(data_size / len(sli)))  # packets needed to transfer data
-            print('{}/{} packets sent\r'.format(pcnt, ptot), end='')
-
-        dt = time.time() - t1
-        time.sleep(max(sleep - dt, 0))
+    payloads = []
+    # CRC over all uploaded slices, computed incrementally
+    data_crc = crc(b'')
+    for i in range(0, len(data), payload_len):
+        sli = data[i:i + payload_len]
+        payloads.append(struct.pack(fmt, memid, memaddr + i, len(sli)) + sli + endspares)
+        data_crc = crc(sli, data_crc)
 
-        startaddr += len(sli)
-        counters[apid] += 1
+    upload = MemoryUpload(apid, ack=ack, pool_name=pool_name, window=window, rate=rate, sleep=sleep, progress=progress)
+    upload.run(payloads, start=start)
 
-    print('\nUpload finished, {} bytes sent in {} packets.'.format(len(upload_bytes), pcnt))
+    print('\nUpload finished, {} bytes sent in {} packets ({} retransmitted), {:.1f} kB/s.'.format(
+        len(data), upload.npkts, upload.retransmissions, upload.throughput / 1e3))
 
     if calc_crc:
         # return total length of uploaded data  and CRC over entire uploaded data
-        return len(upload_bytes), crc(upload_bytes)
+        return len(data), data_crc
 
 
 def get_tc_descr_from_stsst(st, sst):
@@ -3993,42 +5141,40 @@ def srectosrecmod(input_srec, output_srec, imageaddr=0x40180000, linesperpack=61
     source_to_srec('srec_binary_source.TC', output_srec, memaddr=imageaddr)
 
 
-def srec_to_s6(fname, memid, memaddr, segid, tcname=None, linesperpack=50, max_pkt_size=MAX_PKT_LEN, image_crc=True):
-    # get service 6,2 info from MIB
-    apid, memid_ref, fmt, endspares = _get_upload_service_info(tcname)
-    pkt_overhead = TC_HEADER_LEN + struct.calcsize(fmt) + SEG_HEADER_LEN + SEG_SPARE_LEN + SEG_CRC_LEN + len(
-        endspares) + PEC_LEN
-    payload_len = max_pkt_size - pkt_overhead
-
-    memid = get_mem_id(memid, memid_ref)
-
-    pckts = []
+def _srec_to_segments(fname, segid, linesperpack, payload_len):
+    """
+    Pack the data lines of an SREC file into segments (as defined in IWF DPU HW SW ICD) with segment header and CRC.
+    Consecutive lines are combined in a segment of at most _payload_len_ data bytes as long as their addresses are
+    contiguous.
 
+    :param fname:
+    :param segid:
+    :param linesperpack: max. number of lines per segment
+    :param payload_len:
+    :return: list of segments, number of data bytes
+    """
     f = open(fname, 'r').readlines()[1:]
     lines = [p[12:-3] for p in f]
-    data_size = len(''.join(lines)) // 2
     startaddr = int(f[0][4:12], 16)
 
-    upload_bytes = b''
+    segments = []
     linecount = 0
     bcnt = 0
-    pcnt = 0
-    ptot = None
 
     while linecount < len(f) - 1:
 
-        t1 = time.time()
-
         linepacklist = []
+        packlen = 0
         for n in range(linesperpack):
             if linecount >= (len(lines) - 1):
                 break
 
-            if (len(''.join(linepacklist)) + len(lines[linecount])) // 2 > payload_len:  # ensure max_pkt_size
+            linelength = len(lines[linecount]) // 2
+            if packlen + linelength > payload_len:  # ensure max_pkt_size
                 break
 
             linepacklist.append(lines[linecount])
-            linelength = len(lines[linecount]) // 2
+            packlen += linelength
             if int(f[linecount + 1][4:12], 16) != (int(f[linecount][4:12], 16) + linelength):
                 linecount += 1
                 newstartaddr = int(f[linecount][4:12], 16)
@@ -4037,13 +5183,37 @@ def srec_to_s6(fname, memid, memaddr, segid, tcname=None, linesperpack=50, max_p
                 linecount += 1
                 newstartaddr = int(f[linecount][4:12], 16)
 
+        if not linepacklist:
+            raise ValueError('SREC line {} exceeds packet payload of {} bytes'.format(linecount + 2, payload_len))
+
         linepack = bytes.fromhex(''.join(linepacklist))
         dlen = len(linepack)
         bcnt += dlen
         # segment header, see IWF DBS HW SW ICD
         data = struct.pack(SEG_HEADER_FMT, segid, startaddr, dlen // 4) + linepack + bytes(SEG_SPARE_LEN)
-        data = data + crc(data).to_bytes(SEG_CRC_LEN, 'big')
+        segments.append(data + crc(data).to_bytes(SEG_CRC_LEN, 'big'))
+
+        startaddr = newstartaddr
+
+    return segments, bcnt
+
 
+def srec_to_s6(fname, memid, memaddr, segid, tcname=None, linesperpack=50, max_pkt_size=MAX_PKT_LEN, image_crc=True):
+    # get service 6,2 info from MIB
+    apid, memid_ref, fmt, endspares = _get_upload_service_info(tcname)
+    pkt_overhead = TC_HEADER_LEN + struct.calcsize(fmt) + SEG_HEADER_LEN + SEG_SPARE_LEN + SEG_CRC_LEN + len(
+        endspares) + PEC_LEN
+    payload_len = max_pkt_size - pkt_overhead
+
+    memid = get_mem_id(memid, memid_ref)
+
+    segments, _ = _srec_to_segments(fname, segid, linesperpack, payload_len)
+
+    pckts = []
+    upload_len = 0
+    upload_crc = crc(b'')
+
+    for data in segments:
         # create PUS packet
         packetdata = struct.pack(fmt, memid, memaddr, len(data)) + data + endspares
         seq_cnt = counters.setdefault(apid, 0)
@@ -4054,11 +5224,10 @@ def srec_to_s6(fname, memid, memaddr, segid, tcname=None, linesperpack=50, max_p
 
         pckts.append(puspckt)
 
-        # collect all uploaded segments for CRC at the end
-        upload_bytes += data
-        pcnt += 1
+        # CRC over all uploaded segments, computed incrementally
+        upload_len += len(data)
+        upload_crc = crc(data, upload_crc)
 
-        startaddr = newstartaddr
         memaddr += len(data)
         counters[apid] += 1
 
@@ -4069,13 +5238,13 @@ def srec_to_s6(fname, memid, memaddr, segid, tcname=None, linesperpack=50, max_p
 
     if image_crc:
         # return total length of uploaded data (without termination segment) and CRC over entire image, including segment headers
-        return pckts, len(upload_bytes), crc(upload_bytes)
+        return pckts, upload_len, upload_crc
 
     return pckts
 
 
 def upload_srec(fname, memid, memaddr, segid, pool_name='LIVE', tcname=None, linesperpack=50, sleep=0.125,
-                max_pkt_size=MAX_PKT_LEN, progress=True, image_crc=True):
+                max_pkt_size=MAX_PKT_LEN, progress=True, image_crc=True, window=None, rate=None, start=0):
     """
     Upload data from an SREC file to _memid_ via S6,2
 
@@ -4086,10 +5255,14 @@ def upload_srec(fname, memid, memaddr, segid, pool_name='LIVE', tcname=None, lin
     :param pool_name:
     :param tcname:
     :param linesperpack:
-    :param sleep:
+    :param sleep: period between packets, if not pacing by acknowledgements
     :param max_pkt_size:
     :param progress:
     :param image_crc:
+    :param window: max. number of unacknowledged packets, see MemoryUpload
+    :param rate: max. number of packets per second
+    :param start: index of the first packet to send, to resume an aborted upload from UploadAborted.resume
+    :return: length and CRC of the uploaded segments, if _image_crc_. Raises UploadAborted if the upload is aborted.
     """
     # get service 6,2 info from MIB
     apid, memid_ref, fmt, endspares = _get_upload_service_info(tcname)
@@ -4098,85 +5271,32 @@ def upload_srec(fname, memid, memaddr, segid, pool_name='LIVE', tcname=None, lin
 
     memid = get_mem_id(memid, memid_ref)
 
-    # get permanent pmgr handle to avoid requesting one for each packet
-    pmgr = _get_pmgr_handle(tc_pool=pool_name)
-
-    f = open(fname, 'r').readlines()[1:]
-    lines = [p[12:-3] for p in f]
-    data_size = len(''.join(lines)) // 2
-    startaddr = int(f[0][4:12], 16)
-
-    upload_bytes = b''
-    linecount = 0
-    bcnt = 0
-    pcnt = 0
-    ptot = None
-
-    while linecount < len(f) - 1:
-
-        t1 = time.time()
-
-        linepacklist = []
-        for n in range(linesperpack):
-            if linecount >= (len(lines) - 1):
-                break
-
-            if (len(''.join(linepacklist)) + len(lines[linecount])) // 2 > payload_len:  # ensure max_pkt_size
-                break
-
-            linepacklist.append(lines[linecount])
-            linelength = len(lines[linecount]) // 2
-            if int(f[linecount + 1][4:12], 16) != (int(f[linecount][4:12], 16) + linelength):
-                linecount += 1
-                newstartaddr = int(f[linecount][4:12], 16)
-                break
-            else:
-                linecount += 1
-                newstartaddr = int(f[linecount][4:12], 16)
-
-        linepack = bytes.fromhex(''.join(linepacklist))
-        dlen = len(linepack)
-        bcnt += dlen
-        # segment header, see IWF DBS HW SW ICD
-        data = struct.pack(SEG_HEADER_FMT, segid, startaddr, dlen // 4) + linepack + bytes(SEG_SPARE_LEN)
-        data = data + crc(data).to_bytes(SEG_CRC_LEN, 'big')
-
-        # create PUS packet
-        packetdata = struct.pack(fmt, memid, memaddr, len(data)) + data + endspares
-        seq_cnt = counters.setdefault(apid, 0)
-        puspckt = Tcpack(data=packetdata, st=6, sst=2, apid=apid, sc=seq_cnt, ack=0b1001)
-
-        if len(puspckt) > MAX_PKT_LEN:
-            logger.warning('Packet length ({}) exceeding MAX_PKT_LEN of {} bytes!'.format(len(puspckt), MAX_PKT_LEN))
+    segments, bcnt = _srec_to_segments(fname, segid, linesperpack, payload_len)
 
-        Tcsend_bytes(puspckt, pool_name=pool_name, pmgr_handle=pmgr)
-        # collect all uploaded segments for CRC at the end
-        upload_bytes += data
-        pcnt += 1
+    payloads = []
+    upload_len = 0
+    upload_crc = crc(b'')
 
-        if progress:
-            if ptot is None:
-                ptot = int(np.ceil(data_size / dlen))  # packets needed to transfer SREC payload
-            print('{}/{} packets sent\r'.format(pcnt, ptot), end='')
+    for data in segments:
+        payloads.append(struct.pack(fmt, memid, memaddr + upload_len, len(data)) + data + endspares)
 
-        dt = time.time() - t1
-        time.sleep(max(sleep - dt, 0))
+        # CRC over all uploaded segments, computed incrementally
+        upload_len += len(data)
+        upload_crc = crc(data, upload_crc)
 
-        startaddr = newstartaddr
-        memaddr += len(data)
-        counters[apid] += 1
+    # all-zero termination segment of length 12, sent after all other segments have been acknowledged
+    payloads.append(struct.pack(fmt, memid, memaddr + upload_len, 12) + bytes(12) + endspares)
 
-    # send all-zero termination segment of length 12
-    packetdata = struct.pack(fmt, memid, memaddr, 12) + bytes(12) + endspares
-    puspckt = Tcpack(data=packetdata, st=6, sst=2, apid=apid, sc=counters[apid], ack=0b1001)
-    Tcsend_bytes(puspckt, pool_name=pool_name, pmgr_handle=pmgr)
-    counters[apid] += 1
+    upload = MemoryUpload(apid, ack=0b1001, pool_name=pool_name, window=window, rate=rate, sleep=sleep,
+                          progress=progress)
+    upload.run(payloads, start=start, sync_last=True)
 
-    print('\nUpload finished, {} bytes sent in {}(+1) packets.'.format(bcnt, pcnt))
+    print('\nUpload finished, {} bytes sent in {}(+1) packets ({} retransmitted), {:.1f} kB/s.'.format(
+        bcnt, len(segments), upload.retransmissions, upload.throughput / 1e3))
 
     if image_crc:
         # return total length of uploaded data (without termination segment) and CRC over entire image, including segment headers
-        return len(upload_bytes), crc(upload_bytes)
+        return upload_len, upload_crc
 
 
 def segment_data(data, segid, addr, seglen=480):
@@ -4285,7 +5405,7 @@ def source_to_srec(data, outfile, memaddr, header=None, bytes_per_line=32, skip_
 
 
 def srec_direct(fname, memid, pool_name='LIVE', max_pkt_size=MAX_PKT_LEN, tcname=None, sleep=0.125, progress=True,
-                image_crc=True, byte_align=2, ack=0b1001, dryrun=False):
+                image_crc=True, byte_align=2, ack=0b1001, dryrun=False, window=None, rate=None, start=0):
     """
     Upload data from SREC file directly to memory _memid_, no additional segment headers (like for DBS) are added.
 
@@ -4294,13 +5414,17 @@ def srec_direct(fname, memid, pool_name='LIVE', max_pkt_size=MAX_PKT_LEN, tcname
     :param pool_name:
     :param max_pkt_size:
     :param tcname:
-    :param sleep:
+    :param sleep: period between packets, if not pacing by acknowledgements
     :param progress:
     :param image_crc:
     :param byte_align:
     :param ack:
     :param dryrun:
-    :return:
+    :param window: max. number of unacknowledged packets, see MemoryUpload
+    :param rate: max. number of packets per second
+    :param start: index of the first packet to send, to resume an aborted upload from UploadAborted.resume
+    :return: length and CRC of the uploaded data, if _image_crc_. None if the SREC data end prematurely, the packets
+             up to there are uploaded nevertheless. Raises UploadAborted if the upload is aborted.
     """
     if dryrun:
         print('DRYRUN -- NO PACKETS ARE BEING SENT!')
@@ -4312,26 +5436,19 @@ def srec_direct(fname, memid, pool_name='LIVE', max_pkt_size=MAX_PKT_LEN, tcname
 
     memid = get_mem_id(memid, memid_ref)
 
-    # get permanent pmgr handle to avoid requesting one for each packet
-    if not dryrun:
-        pmgr = _get_pmgr_handle(tc_pool=pool_name)
-
-    upload_bytes = b''
-    bcnt = 0
-    pcnt = 0
-    ptot = None
+    payloads = []
+    upload_len = 0
+    upload_crc = crc(b'')
+    data_left = True
 
     f = open(fname, 'r').readlines()[1:-1]  # omit header and footer line
     lines = [p[12:-3] for p in f]
-    data_size = len(''.join(lines)) // 2
     memaddr = int(f[0][4:12], 16)
 
     linecount = 0
     nextlinelength = len(lines[linecount]) // 2
     while linecount < len(f) - 1:
 
-        t1 = time.time()
-
         linepacklist = []
         packlen = 0
         while (packlen + nextlinelength) <= payload_len:
@@ -4352,64 +5469,41 @@ def srec_direct(fname, memid, pool_name='LIVE', max_pkt_size=MAX_PKT_LEN, tcname
 
         data = bytes.fromhex(''.join(linepacklist))
 
-        dlen = len(data)
-        bcnt += dlen
-
-        # create PUS packet
-        packetdata = struct.pack(fmt, memid, memaddr, len(data)) + data + endspares
-        seq_cnt = counters.setdefault(apid, 0)
-        puspckt = Tcpack(data=packetdata, st=6, sst=2, apid=apid, sc=seq_cnt, ack=ack)
-
-        if len(puspckt) > MAX_PKT_LEN:
-            logger.warning('Packet length ({}) exceeding MAX_PKT_LEN of {} bytes!'.format(len(puspckt), MAX_PKT_LEN))
-
-        if not dryrun:
-            Tcsend_bytes(puspckt, pool_name=pool_name, pmgr_handle=pmgr)
-
-        # collect all uploaded segments for CRC at the end
-        upload_bytes += data
-        pcnt += 1
-
-        if progress:
-            if ptot is None:
-                ptot = int(np.ceil(data_size / dlen))  # packets needed to transfer SREC payload
-            print('{}/{} packets sent\r'.format(pcnt, ptot), end='')
+        if data == b'':
+            data_left = False
+            break
 
-        dt = time.time() - t1
-        time.sleep(max(sleep - dt, 0))
+        payloads.append(struct.pack(fmt, memid, memaddr, len(data)) + data + endspares)
 
-        if data == b'':
-            print('No data left, exit upload.')
-            return
+        # CRC over all uploaded data, computed incrementally
+        upload_len += len(data)
+        upload_crc = crc(data, upload_crc)
 
         memaddr = newstartaddr
-        if not dryrun:
-            counters[apid] += 1
 
     # check if entire data is x-byte-aligned
-    if len(upload_bytes) % byte_align:
-        padding = byte_align - (len(upload_bytes) % byte_align)
-        print('\nData is not {}-byte aligned. Sending padding data ({})'.format(byte_align, padding))
+    if data_left and upload_len % byte_align:
+        padding = byte_align - (upload_len % byte_align)
+        print('Data is not {}-byte aligned. Sending padding data ({})'.format(byte_align, padding))
 
-        # create PUS packet
-        packetdata = struct.pack(fmt, memid, memaddr, padding) + bytes(padding) + endspares
-        seq_cnt = counters.setdefault(apid, 0)
-        puspckt = Tcpack(data=packetdata, st=6, sst=2, apid=apid, sc=seq_cnt, ack=ack)
+        payloads.append(struct.pack(fmt, memid, memaddr, padding) + bytes(padding) + endspares)
+        upload_len += padding
+        upload_crc = crc(bytes(padding), upload_crc)
 
-        if not dryrun:
-            Tcsend_bytes(puspckt, pool_name=pool_name, pmgr_handle=pmgr)
-            counters[apid] += 1
+    upload = MemoryUpload(apid, ack=ack, pool_name=pool_name, window=window, rate=rate, sleep=sleep,
+                          progress=progress, dryrun=dryrun)
+    upload.run(payloads, start=start)
 
-        memaddr += padding
-        upload_bytes += bytes(padding)
-        bcnt += padding
-        pcnt += 1
+    if not data_left:
+        print('No data left, exit upload.')
+        return
 
-    print('\nUpload finished, {} bytes sent in {} packets.'.format(bcnt, pcnt))
+    print('\nUpload finished, {} bytes sent in {} packets ({} retransmitted), {:.1f} kB/s.'.format(
+        upload_len, len(payloads), upload.retransmissions, upload.throughput / 1e3))
 
     if image_crc:
         # return total length of uploaded data (without termination segment) and CRC over entire image, including segment headers
-        return len(upload_bytes), crc(upload_bytes)
+        return upload_len, upload_crc
 
 
 def _get_upload_service_info(tcname=None):
@@ -5029,6 +6123,7 @@ def add_tm_decoder(label=None, st=None, sst=None, apid=None, sid=None, parameter
     params = [_parameter_decoding_info(par, check_curtx=True) for par in parameters]
     logger.debug('Created custom TM decoder {} with parameters: {}'.format(label, [x[1] for x in params]))
     user_tm_decoders[tag] = (label, params)
+    reset_decoder_plans()
 
     if not cfg.has_section('ccs-user_defined_packets'):
         cfg.add_section('ccs-user_defined_packets')
@@ -5061,12 +6156,13 @@ def _parameter_decoding_info(param, check_curtx=False):
         dinfo = [param[1], param[0], ptc, pfc, None, csize(fmt) * 8, None, None, None, None, None]
 
     elif param[1] == 'dp_item':
+        dp_luts = get_dp_luts()
         if isinstance(param[0], int):
             dp_id = param[0]
-            dp_descr = DP_IDS_TO_ITEMS[param[0]]
+            dp_descr = dp_luts.ids_to_items[param[0]]
         else:
-            dp_id = DP_ITEMS_TO_IDS[param[0].split(' ')[0]]  # strip IDs in parentheses if present from parameter dialog model
-            dp_descr = DP_IDS_TO_ITEMS[dp_id]
+            dp_id = dp_luts.items_to_ids[param[0].split(' ')[0]]  # strip IDs in parentheses if present from parameter dialog model
+            dp_descr = dp_luts.ids_to_items[dp_id]
 
         if check_curtx:
             try:
@@ -5077,8 +6173,8 @@ def _parameter_decoding_info(param, check_curtx=False):
             except IndexError:
                 logger.debug('PID {} not in MIB.'.format(dp_id))
 
-        ptc, pfc = ptt_reverse(_dp_items[dp_id]['fmt'])
-        dinfo = [param[1], dp_descr, ptc, pfc, None, csize(_dp_items[dp_id]['fmt']) * 8, None, None, None, None, None]
+        ptc, pfc = ptt_reverse(dp_luts.dp_items[dp_id]['fmt'])
+        dinfo = [param[1], dp_descr, ptc, pfc, None, csize(dp_luts.dp_items[dp_id]['fmt']) * 8, None, None, None, None, None]
 
     else:
         logger.warning('Info for parameter "{}" cannot be obtained'.format(param[0]))
@@ -5105,7 +6201,7 @@ def create_hk_decoder(sid, *dp_ids, apid=None):
         apid = int(res[0][0])
 
 
-    sid_off, sid_width = SID_LUT[(3, 25, apid)]
+    sid_off, sid_width = get_sid_lut()[(3, 25, apid)]
 
     que = 'SELECT plf_name, pcf_descr FROM pid left join plf on PLF_SPID=PID_SPID left join pcf on ' \
                 'PCF_NAME=PLF_NAME where PID_TYPE=3 and PID_STYPE=25 and PID_APID={} and plf_offby={}'.format(apid, sid_off)
@@ -5788,175 +6884,233 @@ def collect_13(pool_name, starttime=None, endtime=None, startidx=None, endidx=No
         # if pname:
         #     pool_name = pname
 
-    rows = get_pool_rows(pool_name, check_existence=True)
+    s13 = S13Reassembler(pool_name, starttime=starttime, endtime=endtime, startidx=startidx, endidx=endidx, sdu=sdu,
+                         join=join, consistency_check=consistency_check, check_existence=True)
+    ces = s13.collect(max_transfers=None if collect_all else 1)
 
-    # faster method to collect already completed TM13 transfers
-    tm_bounds = rows.filter(DbTelemetry.stc == 13, DbTelemetry.sst.in_([1, 3, 4])).order_by(DbTelemetry.idx)
+    if verbose:
+        print('Collected {} S13 transfers.'.format(len(ces)))
+        if len(s13.errors) != 0:
+            print('There are inconsistencies in {} transfer(s)!\n{}'.format(len(s13.errors), '\n'.join(s13.errors)))
 
-    if starttime is not None:
-        tm_bounds = tm_bounds.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) >= starttime)
+    if len(ces) == 0:
+        return {None: None}
 
-    if endtime is not None:
-        tm_bounds = tm_bounds.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) <= endtime)
+    return ces
 
-    if startidx is not None:
-        tm_bounds = tm_bounds.filter(DbTelemetry.idx >= startidx)
 
-    if endidx is not None:
-        tm_bounds = tm_bounds.filter(DbTelemetry.idx <= endidx)
+class S13Reassembler:
+    """
+    Incremental reassembly of S13 down transfers from a pool.
 
-    if sdu:
-        tm_bounds = tm_bounds.filter(func.left(DbTelemetry.data, 1) == sdu.to_bytes(SDU_PAR_LENGTH, 'big'))
+    The TM(13,x) packets are read once in idx order and run through the start/intermediate/end/abort state machine in
+    memory. The cursor (last processed idx and the open transfer) is kept between calls to :meth:`collect`, so that
+    repeated calls on a live pool only process the packets received in the meantime.
 
-    # quit if no start packet is found
-    if tm_bounds.filter(DbTelemetry.sst == 1).count() == 0:
-        return {None: None}
+    :param pool_name: name of the pool
+    :param starttime: only consider packets with CUC >= starttime
+    :param endtime: only consider packets with CUC <= endtime
+    :param startidx: only consider packets with idx >= startidx
+    :param endidx: only consider packets with idx <= endidx
+    :param sdu: only consider packets of this SDU
+    :param join: if True, transfers are returned as single bytes object, else as list of per-packet data
+    :param consistency_check: check the number of packets in a transfer against the sequence counter of the TM(13,3)
+    :param check_existence: raise a ValueError if the pool does not exist
+    """
 
-    tm_132 = rows.filter(DbTelemetry.stc == 13, DbTelemetry.sst == 2).order_by(DbTelemetry.idx)
+    def __init__(self, pool_name, starttime=None, endtime=None, startidx=None, endidx=None, sdu=None, join=True,
+                 consistency_check=True, check_existence=False):
+        self.pool_name = pool_name
+        self.starttime = starttime
+        self.endtime = endtime
+        self.startidx = startidx
+        self.endidx = endidx
+        self.sdu = sdu
+        self.join = join
+        self.consistency_check = consistency_check
+        self.check_existence = check_existence
 
-    if starttime is not None:
-        tm_132 = tm_132.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) >= starttime)
+        self.errors = []
+        self.reset()
 
-    if endtime is not None:
-        tm_132 = tm_132.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) <= endtime)
+    def reset(self):
+        """
+        Discard the open transfer and start over from the beginning of the pool
+        """
+        self.last_idx = None
+        self._start = None
+        self._parts = []
 
-    if startidx is not None:
-        tm_132 = tm_132.filter(DbTelemetry.idx >= startidx)
+    @property
+    def cursor(self):
+        """
+        :return: tuple of last processed idx and idx of the start packet of the open transfer (None if there is none)
+        """
+        return self.last_idx, None if self._start is None else self._start[0]
 
-    if endidx is not None:
-        tm_132 = tm_132.filter(DbTelemetry.idx <= endidx)
+    def _query(self):
+        rows = get_pool_rows(self.pool_name, check_existence=self.check_existence)
+        # only check once, the pool does not vanish between calls
+        self.check_existence = False
 
-    if sdu:
-        tm_132 = tm_132.filter(func.left(DbTelemetry.data, 1) == sdu.to_bytes(SDU_PAR_LENGTH, 'big'))
+        rows = rows.filter(DbTelemetry.stc == 13, DbTelemetry.sst.in_([1, 2, 3, 4]))
 
-    # remove incomplete transfers
-    clean_bounds = _check_s13_downlinks(tm_bounds, tm_132)
+        if self.starttime is not None:
+            rows = rows.filter(DbTelemetry.cuc >= self.starttime)
 
-    if len(clean_bounds) == 0:
-        return {None: None}
+        if self.endtime is not None:
+            rows = rows.filter(DbTelemetry.cuc <= self.endtime)
 
-    if not collect_all:
-        clean_bounds = [clean_bounds[0]]
+        if self.last_idx is not None:
+            rows = rows.filter(DbTelemetry.idx > self.last_idx)
+        elif self.startidx is not None:
+            rows = rows.filter(DbTelemetry.idx >= self.startidx)
 
-    ces = _assemble_s13(clean_bounds, tm_132, join=join, consistency_check=consistency_check, verbose=verbose)
+        if self.endidx is not None:
+            rows = rows.filter(DbTelemetry.idx <= self.endidx)
 
-    return ces
+        if self.sdu:
+            rows = rows.filter(func.left(DbTelemetry.data, 1) == self.sdu.to_bytes(get_s13_info().sdu_par_length, 'big'))
 
+        return rows.with_entities(DbTelemetry.idx, DbTelemetry.sst, DbTelemetry.timestamp,
+                                  DbTelemetry.raw).order_by(DbTelemetry.idx)
 
-def _check_s13_downlinks(s13_bounds, s13_intermediate):
-    """
-    Filter out TM13 1 & 3/4 packets from incomplete transfers
+    def collect(self, max_transfers=None):
+        """
+        Process all TM(13,x) packets received since the last call
 
-    :param s13_bounds:
-    :param s13_intermediate:
-    :return:
-    """
+        :param max_transfers: stop after this many completed transfers, the remaining packets are processed by the next call
+        :return: dict of start packet CUC: transfer data of the transfers completed in this call
+        """
+        ces = {}
 
-    tx = False
-    sidx = 0
+        try:
+            for pkt in self._query().yield_per(1000):
+                self.last_idx = pkt.idx
+                ce = self._process(pkt)
 
-    valid_start = None
+                if ce is not None:
+                    ces[ce[0]] = ce[1]
+                    if max_transfers is not None and len(ces) >= max_transfers:
+                        break
+        finally:
+            scoped_session_storage.close()
 
-    clean_transfers = []
+        return ces
 
-    for pkt in s13_bounds:
+    def _process(self, pkt):
+        """
+        Advance the transfer state machine by one packet
 
-        if not tx and pkt.sst == 1:
-            tx = True
-            sidx = pkt.idx
-            valid_start = pkt
+        :param pkt: (idx, sst, timestamp, raw) of a TM(13,x) packet
+        :return: tuple of CUC, data of the transfer completed by this packet, else None
+        """
+        ce = None
 
-        elif pkt.sst == 1:
-            if s13_intermediate.filter(DbTelemetry.idx > sidx, DbTelemetry.idx < pkt.idx).count():
-                logger.warning('incomplete downlink at {}'.format(sidx))
-                sidx = pkt.idx
+        if pkt.sst == 1:
+            if self._start is not None:
+                if self._parts:
+                    logger.warning('incomplete downlink at {}'.format(self._start[0]))
+                else:
+                    logger.debug('single packet downlink at {}'.format(self._start[0]))
+                    ce = self._close(None)
+            self._start = (pkt.idx, pkt.timestamp, pkt.raw)
+            self._parts = []
+
+        elif pkt.sst == 2:
+            if self._start is not None:
+                self._parts.append(pkt.raw[get_s13_info().header_len_total:-PEC_LEN])
+
+        elif pkt.sst == 3:
+            if self._start is not None:
+                ce = self._close(pkt)
             else:
-                clean_transfers.append((valid_start, None))
-                logger.debug('single packet downlink at {}'.format(valid_start.idx))
-            valid_start = pkt
-            tx = True
-
-        elif tx and pkt.sst == 3:
-            clean_transfers.append((valid_start, pkt))
-            valid_start = None
-            tx = False
+                logger.debug('unexpected end-of-transmission packet at {}'.format(pkt.idx))
+            self._start = None
+            self._parts = []
 
-        elif not tx and pkt.sst == 3:
-            tx = False
-            logger.debug('unexpected end-of-transmission packet at {}'.format(pkt.idx))
-
-        elif tx and pkt.sst == 4:
-            tx = False
-            logger.warning('aborted downlink at {}'.format(pkt.idx))
-
-        elif not tx and pkt.sst == 4:
-            tx = False
-            logger.warning('unexpected abort-of-transmission packet at {}'.format(pkt.idx))
+        elif pkt.sst == 4:
+            if self._start is not None:
+                logger.warning('aborted downlink at {}'.format(pkt.idx))
+            else:
+                logger.warning('unexpected abort-of-transmission packet at {}'.format(pkt.idx))
+            self._start = None
+            self._parts = []
 
         else:
             logger.error("I shouldn't be here! ({})".format(pkt.idx))
 
-    return clean_transfers
-
-
-def _assemble_s13(bounds, tm_132, join=True, consistency_check=False, verbose=True):
-    """
-    Assemble payload data from S13 transfers.
-
-    :param bounds:
-    :param tm_132:
-    :param join:
-    :param consistency_check:
-    :param verbose:
-    :return:
-    """
-
-    ces = {}
-    errs = []
+        return ce
 
-    scnt_offset = TM_HEADER_LEN + _s13_info[0][1]
-    scnt_size = _s13_info[1][1]
+    def _close(self, last):
+        """
+        Assemble the payload of the open transfer
 
-    for i, j in bounds:
+        :param last: TM(13,3) packet closing the transfer, None for a single packet transfer
+        :return: tuple of CUC, data
+        """
+        _, timestamp, raw = self._start
+        s13 = get_s13_info()
 
         try:
             # single packet transfer
-            if j is None:
+            if last is None:
                 firstpktdata = b''
                 pkts = []
-                datalen = int.from_bytes(i.raw[S13_DATALEN_PAR_OFFSET:S13_DATALEN_PAR_OFFSET + S13_DATALEN_PAR_SIZE], 'big')
-                lastpktdata = i.raw[S13_HEADER_LEN_TOTAL:S13_HEADER_LEN_TOTAL + datalen]
+                datalen = int.from_bytes(raw[s13.datalen_par_offset:s13.datalen_par_offset + s13.datalen_par_size], 'big')
+                lastpktdata = raw[s13.header_len_total:s13.header_len_total + datalen]
 
             else:
-                firstpktdata = i.raw[S13_HEADER_LEN_TOTAL:-PEC_LEN]
-                pkts = [a.raw[S13_HEADER_LEN_TOTAL:-PEC_LEN] for a in tm_132.filter(DbTelemetry.idx > i.idx, DbTelemetry.idx < j.idx)]
+                firstpktdata = raw[s13.header_len_total:-PEC_LEN]
+                pkts = self._parts
 
                 # check for padding bytes in last packet
-                datalen = int.from_bytes(j.raw[S13_DATALEN_PAR_OFFSET:S13_DATALEN_PAR_OFFSET + S13_DATALEN_PAR_SIZE], 'big')
-                lastpktdata = j.raw[S13_HEADER_LEN_TOTAL:S13_HEADER_LEN_TOTAL + datalen]
+                datalen = int.from_bytes(last.raw[s13.datalen_par_offset:s13.datalen_par_offset + s13.datalen_par_size], 'big')
+                lastpktdata = last.raw[s13.header_len_total:s13.header_len_total + datalen]
 
-                if consistency_check:
+                if self.consistency_check and s13.par_sizes:
                     # check if number of collected packets matches the sequence counter of TM13,3
-                    cnt = int.from_bytes(j.raw[scnt_offset:scnt_offset + scnt_size], 'big')
-                    npkts = len(pkts) + 2
-                    if cnt != npkts:
-                        logger.warning('Inconsistent number of packets in transfer starting at {}'.format(i.timestamp))
-                        errs.append(i.timestamp)
-
-            if join:
-                ces[float(i.timestamp[:-1])] = firstpktdata + b''.join(pkts) + lastpktdata
+                    scnt_offset = TM_HEADER_LEN + s13.par_sizes[0][1]
+                    cnt = int.from_bytes(last.raw[scnt_offset:scnt_offset + s13.par_sizes[1][1]], 'big')
+                    if cnt != len(pkts) + 2:
+                        logger.warning('Inconsistent number of packets in transfer starting at {}'.format(timestamp))
+                        self.errors.append(timestamp)
+
+            if self.join:
+                return float(timestamp[:-1]), firstpktdata + b''.join(pkts) + lastpktdata
             else:
-                ces[float(i.timestamp[:-1])] = [firstpktdata] + pkts + [lastpktdata]
+                return float(timestamp[:-1]), [firstpktdata] + pkts + [lastpktdata]
 
         except Exception as err:
             logger.error(err)
 
-    if verbose:
-        print('Collected {} S13 transfers.'.format(len(ces)))
-        if len(errs) != 0:
-            print('There are inconsistencies in {} transfer(s)!\n{}'.format(len(errs), '\n'.join(errs)))
 
-    return ces
+def write_ce_file(ce, ce_time, outdir=""):
+    """
+    Write the data of a S13 down transfer to a CE file in _outdir_, named after the S13 data header
+
+    :param ce: transfer data
+    :param ce_time: CUC of the transfer start packet
+    :param outdir:
+    :return: path of the written file
+    """
+    try:
+        obsid, ctime, ftime, ctr = s13_unpack_data_header(ce)
+    except NotImplementedError:
+        obsid = int(datetime.datetime.utcnow().strftime('%j'))
+        ctime = int(ce_time)
+        ftime = 0
+        ctr = crc(ce)
+    except ValueError as err:
+        logger.error('Incompatible definition of S13 data header.')
+        raise err
+
+    fname = os.path.join(outdir, "LDT_{:03d}_{:010d}_{:06d}.ce".format(obsid, ctime, ctr))
+
+    with open(fname, "wb") as fdesc:
+        fdesc.write(ce)
+
+    return fname
 
 
 def dump_large_data(pool_name, starttime=0, endtime=None, outdir="", dump_all=False, sdu=None, startidx=None,
@@ -5988,23 +7142,8 @@ def dump_large_data(pool_name, starttime=0, endtime=None, outdir="", dump_all=Fa
         if ldt_dict[buf] is None:
             continue
 
-        try:
-            obsid, ctime, ftime, ctr = s13_unpack_data_header(ldt_dict[buf])
-        except NotImplementedError:
-            obsid = int(datetime.datetime.utcnow().strftime('%j'))
-            ctime = int(buf)
-            ftime = 0
-            ctr = crc(ldt_dict[buf])
-        except ValueError as err:
-            logger.error('Incompatible definition of S13 data header.')
-            raise err
-
-        fname = os.path.join(outdir, "LDT_{:03d}_{:010d}_{:06d}.ce".format(obsid, ctime, ctr))
-
-        with open(fname, "wb") as fdesc:
-            fdesc.write(ldt_dict[buf])
-            filedict[buf] = fdesc.name
-            ldt_cnt += 1
+        filedict[buf] = write_ce_file(ldt_dict[buf], buf, outdir=outdir)
+        ldt_cnt += 1
 
     if ldt_cnt != 0:
         logger.info('Dumped {} CEs to {}'.format(ldt_cnt, outdir))
@@ -6036,6 +7175,391 @@ def get_hk_def_tcs(filename, sid=None, sidoff=TC_HEADER_LEN, sidbs=2):
     return pkts
 
 
+def _lgf_calibrate(x, c):
+    # logarithmic calibration (LGF): y = 1 / (A0 + A1*ln(x) + A2*ln(x)^2 + A3*ln(x)^3 + A4*ln(x)^4)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 / np.polynomial.polynomial.polyval(np.log(x), c)
+
+
+class CalibrationRegistry:
+    """
+    Calibrations of all TM parameters in the MIB, loaded in bulk with one query per table, see
+    get_calibration_registry.
+
+    Numerical calibrations (CAP curves, MCF polynomials and LGF logarithmic functions) are applied with NumPy to
+    scalars or arrays. Textual calibrations (TXP) are held as sorted arrays of raw values and texts per calibration.
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self, pcf, cap, txp, mcf=None, lgf=None):
+        """
+        :param pcf: dict of PCF_NAME and (PTC, PFC, CATEG, CURTX)
+        :param cap: dict of CAP_NUMBR and (raw values, engineering values) arrays, sorted by raw value
+        :param txp: dict of TXP_NUMBR and (raw values, texts) arrays, sorted by raw value
+        :param mcf: dict of MCF_IDENT and polynomial coefficients A0-A4
+        :param lgf: dict of LGF_IDENT and logarithmic coefficients A0-A4
+        """
+        self.pcf = pcf
+        self.cap = cap
+        self.txp = txp
+        self.mcf = mcf or {}
+        self.lgf = lgf or {}
+
+        # curves are referenced by PCF_CURTX, CAP takes precedence if an identifier is used in several tables
+        self._calibrators = {}
+        for ident, coeffs in self.lgf.items():
+            self._calibrators[ident] = functools.partial(_lgf_calibrate, c=coeffs)
+        for ident, coeffs in self.mcf.items():
+            self._calibrators[ident] = functools.partial(np.polynomial.polynomial.polyval, c=coeffs)
+        for numbr, (xvals, yvals) in self.cap.items():
+            # NaN outside the defined calibration range
+            self._calibrators[numbr] = functools.partial(np.interp, xp=xvals, fp=yvals, left=np.nan, right=np.nan)
+
+        self._txp_lut = {numbr: dict(zip(raw.tolist(), texts.tolist())) for numbr, (raw, texts) in self.txp.items()}
+
+    @classmethod
+    def from_mib(cls, dbcon):
+        """
+        Load the calibrations from the MIB, the MCF and LGF tables are optional
+
+        :param dbcon: MIB session
+        :return:
+        """
+        try:
+            pcf = {name: (ptc, pfc, categ, curtx) for name, ptc, pfc, categ, curtx in
+                   dbcon.execute('SELECT pcf_name,pcf_ptc,pcf_pfc,pcf_categ,pcf_curtx FROM pcf').fetchall()}
+
+            points = {}
+            for numbr, xval, yval in dbcon.execute('SELECT cap_numbr,cap_xvals,cap_yvals FROM cap').fetchall():
+                points.setdefault(numbr, []).append((xval, yval))
+
+            texts = {}
+            for numbr, alval, altxt in dbcon.execute('SELECT txp_numbr,txp_from,txp_altxt FROM txp').fetchall():
+                try:
+                    texts.setdefault(numbr, []).append((float(alval), altxt))
+                except (TypeError, ValueError):
+                    logger.error('Invalid TXP raw value {} in {}'.format(alval, numbr))
+
+            mcf = cls._query_coeffs(dbcon, 'SELECT mcf_ident,mcf_pol1,mcf_pol2,mcf_pol3,mcf_pol4,mcf_pol5 FROM mcf')
+            lgf = cls._query_coeffs(dbcon, 'SELECT lgf_ident,lgf_pol1,lgf_pol2,lgf_pol3,lgf_pol4,lgf_pol5 FROM lgf')
+        finally:
+            dbcon.close()
+
+        cap = {}
+        for numbr, xy in points.items():
+            try:
+                xvals, yvals = np.array(xy, dtype=float).T
+            except (TypeError, ValueError):
+                xvals = yvals = np.array([np.nan])
+            if np.isnan(xvals).any() or np.isnan(yvals).any():
+                logger.error('Error in CAP support points for {}'.format(numbr))
+                continue
+            sortidx = xvals.argsort(kind='stable')
+            cap[numbr] = (xvals[sortidx], yvals[sortidx])
+
+        txp = {}
+        for numbr, pairs in texts.items():
+            raw = np.array([pair[0] for pair in pairs])
+            alt = np.array([pair[1] for pair in pairs], dtype=object)
+            raw, uidx = np.unique(raw, return_index=True)  # the first entry is used for duplicate raw values
+            txp[numbr] = (raw, alt[uidx])
+
+        return cls(pcf, cap, txp, mcf=mcf, lgf=lgf)
+
+    @staticmethod
+    def _query_coeffs(dbcon, que):
+        try:
+            rows = dbcon.execute(que).fetchall()
+        except (SQLOperationalError, SQLProgrammingError) as err:
+            dbcon.rollback()
+            logger.debug('No calibration table ({})'.format(err))
+            return {}
+
+        return {row[0]: np.array([float(c or 0) for c in row[1:]]) for row in rows}
+
+    @classmethod
+    def load(cls, fname, key=None):
+        """
+        Load calibrations stored by save, if they match *key*
+
+        :param fname:
+        :param key:
+        :return: CalibrationRegistry or None
+        """
+        try:
+            with open(fname, 'rb') as fd:
+                cache = pickle.load(fd)
+            if cache['version'] == cls.CACHE_VERSION and cache['key'] == key:
+                return cls(*cache['tables'])
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            logger.warning('Failed loading calibration cache {} ({})'.format(fname, err))
+
+        return
+
+    def save(self, fname, key=None):
+        """
+        Store the calibrations for a fast start, together with a *key* identifying the MIB
+
+        :param fname:
+        :param key:
+        :return:
+        """
+        cache = {'version': self.CACHE_VERSION,
+                 'key': key,
+                 'tables': (self.pcf, self.cap, self.txp, self.mcf, self.lgf)}
+
+        tmp = '{}.{}'.format(fname, os.getpid())
+        try:
+            with open(tmp, 'wb') as fd:
+                pickle.dump(cache, fd, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, fname)
+        except OSError as err:
+            logger.warning('Failed writing calibration cache {} ({})'.format(fname, err))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def num_calibrator(self, pcf_name):
+        """
+        Return the numerical calibration function of a parameter, it takes raw values as scalar or array
+
+        :param pcf_name:
+        :return: function or None if the parameter has no numerical calibration
+        """
+        props = self.pcf.get(pcf_name)
+        if props is None or props[3] is None:
+            return
+
+        return self._calibrators.get(props[3])
+
+    def calibrate_num(self, pcf_name, xval):
+        """
+        Apply the numerical calibration of a parameter
+
+        :param pcf_name:
+        :param xval: raw value or array of raw values
+        :return: calibrated value(s), *xval* if there is no calibration
+        """
+        calibrate = self.num_calibrator(pcf_name)
+        return xval if calibrate is None else calibrate(xval)
+
+    def calibrate_text(self, pcf_name, alval):
+        """
+        Apply the textual calibration of a parameter
+
+        :param pcf_name:
+        :param alval: raw value or array of raw values
+        :return: text(s), raw values without a text are returned unchanged
+        """
+        props = self.pcf.get(pcf_name)
+        numbr = None if props is None else props[3]
+        if numbr not in self.txp:
+            return alval
+
+        if isinstance(alval, np.ndarray):
+            raw, texts = self.txp[numbr]
+            idx = np.searchsorted(raw, alval).clip(max=len(raw) - 1)
+            found = raw[idx] == alval
+            altxt = alval.astype(object)
+            altxt[found] = texts[idx[found]]
+            return altxt
+
+        return self._txp_lut[numbr].get(alval if isinstance(alval, (int, float)) else alval[0], alval)
+
+
+class LimitsTable:
+    """
+    Out-of-limits checks (OCF/OCP) of all TM parameters, loaded from the MIB at once, see get_limits_table.
+
+    Numeric range checks (OCP types S and H) are held in arrays of lower and upper limits, with one row per parameter
+    and one column per check. Status consistency checks (type C) are held as sets of the expected values. Values are
+    checked without accessing the MIB, one at a time with check or in bulk with check_array and check_many.
+
+    The states returned are the same as for Tm_limits_check: 0 if in limits, 1 if outside the soft limits and 2 if
+    outside the hard limits.
+    """
+
+    RANGE = 1
+    STATUS = 2
+
+    def __init__(self, rows):
+        """
+        :param rows: tuples of OCF_NAME, PCF_DESCR, OCF_CODIN, OCP_TYPE, OCP_LVALU and OCP_HVALU, ordered by OCF_NAME
+                     and OCP_POS
+        """
+        checks = {}
+        codins = {}
+        self.descr = {}
+        for name, descr, codin, typ, lval, hval in rows:
+            checks.setdefault(name, [])
+            codins[name] = codin
+            if descr is not None:
+                self.descr.setdefault(descr, name)
+            if typ is not None:
+                checks[name].append((typ, lval, hval))
+
+        self.names = list(checks)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        n = len(self.names)
+        k = max([len(c) for c in checks.values()] + [1])
+        self.kind = np.zeros(n, dtype=np.int8)
+        self.numeric = np.zeros(n, dtype=bool)
+        self.integer = np.zeros(n, dtype=bool)
+        self.nchecks = np.zeros(n, dtype=np.int64)
+        self.lo = np.full((n, k), np.nan)
+        self.hi = np.full((n, k), np.nan)
+        self.soft = np.zeros((n, k), dtype=bool)
+
+        self.status = {}
+        self._limits = {}
+        self._defs = {}
+
+        for i, name in enumerate(self.names):
+            codin = codins[name]
+            pchecks = checks[name]
+
+            # the type of the first check decides how all checks of a parameter are evaluated
+            if not pchecks or pchecks[0][0] not in ('C', 'S', 'H'):
+                continue
+
+            if pchecks[0][0] == 'C':
+                self.kind[i] = self.STATUS
+                self.status[name] = frozenset(c[1] for c in pchecks)
+                self._defs[name] = (self.STATUS, self.status[name])
+                continue
+
+            self.kind[i] = self.RANGE
+            bounds = tuple((None if lval is None else str_to_num(lval, codin),
+                            None if hval is None else str_to_num(hval, codin)) for _, lval, hval in pchecks)
+            soft = [typ == 'S' for typ, _, _ in pchecks]
+            self._defs[name] = (self.RANGE, codin, bounds, any(soft))
+
+            if codin in ('I', 'R'):
+                hard = [b for typ, b in zip(soft, bounds) if not typ]
+                softb = [b for typ, b in zip(soft, bounds) if typ]
+                self._limits[name] = (softb[0] if softb else (None, None), hard[0] if hard else (None, None))
+
+                nc = len(bounds)
+                self.numeric[i] = True
+                self.integer[i] = codin == 'I'
+                self.nchecks[i] = nc
+                self.lo[i, :nc] = [-np.inf if lo is None else lo for lo, _ in bounds]
+                self.hi[i, :nc] = [np.inf if hi is None else hi for _, hi in bounds]
+                self.soft[i, :nc] = soft
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._defs
+
+    def check(self, name, val):
+        """
+        Check a single value
+
+        :param name: PCF_NAME of the parameter
+        :param val: calibrated value
+        :return: state
+        """
+        try:
+            pdef = self._defs[name]
+        except KeyError:
+            return 0
+
+        if pdef[0] == self.STATUS:
+            return 2 if val not in pdef[1] else 0
+
+        _, codin, bounds, has_soft = pdef
+        val = str_to_num(val, codin)
+        nin = sum((lo is None or lo <= val) and (hi is None or val <= hi) for lo, hi in bounds)
+
+        return self._state(nin, len(bounds), has_soft)
+
+    def check_array(self, name, values):
+        """
+        Check many values of a single parameter
+
+        :param name: PCF_NAME of the parameter
+        :param values: array-like of calibrated values
+        :return: int8 array of states
+        """
+        values = np.asarray(values)
+        i = self.index.get(name)
+
+        if i is None or self.kind[i] == 0:
+            return np.zeros(len(values), dtype=np.int8)
+
+        if not self.numeric[i]:
+            return np.array([self.check(name, val) for val in values.tolist()], dtype=np.int8)
+
+        return self._check_numeric(np.full(len(values), i), values)
+
+    def check_many(self, names, values):
+        """
+        Check the values of many parameters at once, e.g. the latest values of all monitored parameters
+
+        :param names: PCF_NAMEs of the parameters
+        :param values: calibrated values, one per parameter
+        :return: int8 array of states
+        """
+        idx = np.array([self.index.get(name, -1) for name in names], dtype=np.int64)
+        numeric = idx >= 0
+        numeric[numeric] = self.numeric[idx[numeric]]
+
+        states = np.zeros(len(idx), dtype=np.int8)
+        if numeric.any():
+            states[numeric] = self._check_numeric(idx[numeric], np.asarray(values, dtype=object)[numeric])
+
+        for j in np.flatnonzero(~numeric & (idx >= 0)).tolist():
+            states[j] = self.check(names[j], values[j])
+
+        return states
+
+    def limits(self, name):
+        """
+        Return the soft and hard limits of a parameter with numeric range checks, e.g. to draw them in a plot
+
+        :param name: PCF_NAME of the parameter
+        :return: tuple of (low, high) soft and hard limits, (None, None) if there are no checks of the respective type
+        """
+        return self._limits.get(name, ((None, None), (None, None)))
+
+    def limits_by_descr(self, descr):
+        """
+        Same as limits, for a parameter given by PCF_DESCR
+
+        :param descr:
+        :return:
+        """
+        return self.limits(self.descr.get(descr))
+
+    def _check_numeric(self, idx, values):
+        # evaluate the range checks of parameters idx for the respective values, at once
+        values = np.asarray(values, dtype=float)
+        values = np.where(self.integer[idx], np.trunc(values), values)[:, None]
+
+        valid = np.arange(self.lo.shape[1]) < self.nchecks[idx][:, None]
+        inlim = (self.lo[idx] <= values) & (values <= self.hi[idx]) & valid
+        nin = inlim.sum(axis=1)
+        has_soft = (self.soft[idx] & valid).any(axis=1)
+
+        states = np.ones(len(idx), dtype=np.int8)
+        states[(nin == self.nchecks[idx]) | ~has_soft] = 0
+        states[nin == 0] = 2
+        return states
+
+    @staticmethod
+    def _state(nin, nchecks, has_soft):
+        if nin == 0:
+            return 2
+        elif nin == nchecks or not has_soft:
+            return 0
+        return 1
+
+
 class DbTools:
     """
     SQL database management tools
@@ -6285,7 +7809,7 @@ class DbTools:
                             stc=tm.SERV_TYPE,
                             sst=tm.SERV_SUB_TYPE,
                             destID=tm.DEST_ID if tm.PKT_TYPE == 0 else tm.SOURCE_ID,
-                            timestamp=cuc_time_str(tm),
+                            **cuc_time_columns(tm),
                             data=tmd[1][:MAX_PKT_LEN],
                             raw=tm_raw[:MAX_PKT_LEN])
 
@@ -6326,26 +7850,29 @@ class DbTools:
     @staticmethod
     def db_bulk_insert(filename, processor, bulk_insert_size=1000, brute=False, checkcrc=True, protocol='PUS', pecmode='warn'):
 
-        with open(filename, 'rb') as buf:
+        pcktcount = 0
 
-            pcktcount = 0
+        new_session = scoped_session_storage()
+        new_session.execute('set unique_checks=0,foreign_key_checks=0')
 
-            new_session = scoped_session_storage()
-            new_session.execute('set unique_checks=0,foreign_key_checks=0')
+        if protocol == 'PUS':
+            # the dump is memory-mapped and only the packets of the current batch are copied
+            if brute:
+                pckts = PusStream(filename, validate=True, sync=packet_sync())
+                checkcrc = False  # CRC already performed during brute_search
 
-            if protocol == 'PUS':
-                buf = buf.read()
-                if brute:
-                    pckts = extract_pus_brute_search(buf, filename=filename)
-                    checkcrc = False  # CRC already performed during brute_search
+            else:
+                pckts = PusStream(filename, partial=True)
 
-                else:
-                    pckts = extract_pus(buf)
+            with pckts:
+                if checkcrc:
+                    crc_ok = pckts.crc_valid()
 
                 pcktdicts = []
-                for pckt in pckts:
+                for i, pckt in enumerate(pckts):
+                    pckt = bytes(pckt)
                     if checkcrc:
-                        if crc_check(pckt):
+                        if not crc_ok[i]:
                             if pecmode == 'warn':
                                 if len(pckt) > 7:
                                     logger.info('db_bulk_insert: [CRC error]: packet with seq nr ' + str(
@@ -6376,36 +7903,194 @@ class DbTools:
 
                 new_session.execute(DbTelemetry.__table__.insert(), pcktdicts)
 
-            elif protocol == 'SPW':
+        elif protocol == 'SPW':
+            with open(filename, 'rb') as buf:
                 headers, pckts, remainder = extract_spw(buf)
 
-                pcktdicts_rmap = []
-                pcktdicts_feedata = []
+            pcktdicts_rmap = []
+            pcktdicts_feedata = []
 
-                for head, pckt in zip(headers, pckts):
+            for head, pckt in zip(headers, pckts):
 
-                    if SPW_PROTOCOL_IDS_R[head.bits.PROTOCOL_ID] == 'RMAP':
-                        pcktdicts_rmap.append(processor(head, pckt))
-                    elif SPW_PROTOCOL_IDS_R[head.bits.PROTOCOL_ID] == 'FEEDATA':
-                        pcktdicts_feedata.append(processor(head, pckt))
+                if SPW_PROTOCOL_IDS_R[head.bits.PROTOCOL_ID] == 'RMAP':
+                    pcktdicts_rmap.append(processor(head, pckt))
+                elif SPW_PROTOCOL_IDS_R[head.bits.PROTOCOL_ID] == 'FEEDATA':
+                    pcktdicts_feedata.append(processor(head, pckt))
 
-                    pcktcount += 1
-                    if pcktcount % bulk_insert_size == 0:
-                        if len(pcktdicts_rmap) > 0:
-                            new_session.execute(RMapTelemetry.__table__.insert(), pcktdicts_rmap)
-                            pcktdicts_rmap = []
-                        if len(pcktdicts_feedata) > 0:
-                            new_session.execute(FEEDataTelemetry.__table__.insert(), pcktdicts_feedata)
-                            pcktdicts_feedata = []
-
-                if len(pcktdicts_rmap) > 0:
-                    new_session.execute(RMapTelemetry.__table__.insert(), pcktdicts_rmap)
-                if len(pcktdicts_feedata) > 0:
-                    new_session.execute(FEEDataTelemetry.__table__.insert(), pcktdicts_feedata)
-
-            new_session.execute('set unique_checks=1, foreign_key_checks=1')
-            new_session.commit()
-            new_session.close()
+                pcktcount += 1
+                if pcktcount % bulk_insert_size == 0:
+                    if len(pcktdicts_rmap) > 0:
+                        new_session.execute(RMapTelemetry.__table__.insert(), pcktdicts_rmap)
+                        pcktdicts_rmap = []
+                    if len(pcktdicts_feedata) > 0:
+                        new_session.execute(FEEDataTelemetry.__table__.insert(), pcktdicts_feedata)
+                        pcktdicts_feedata = []
+
+            if len(pcktdicts_rmap) > 0:
+                new_session.execute(RMapTelemetry.__table__.insert(), pcktdicts_rmap)
+            if len(pcktdicts_feedata) > 0:
+                new_session.execute(FEEDataTelemetry.__table__.insert(), pcktdicts_feedata)
+
+        new_session.execute('set unique_checks=1, foreign_key_checks=1')
+        new_session.commit()
+        new_session.close()
+
+
+class LivePacketSubscription:
+    """
+    Subscription to the packets recorded in a pool after a given index, served from the in-memory live packet buffer
+    of the pool manager without DB access. Packets that have already been dropped from the buffer are read from the
+    storage DB instead.
+    """
+
+    def __init__(self, pool_name, after=0, st=None, sst=None, apid=None, tmtc=None, path=LIVE_RING_SOCKET):
+        """
+
+        :param pool_name:
+        :param after: only packets with a pool index larger than this are returned
+        :param st:
+        :param sst:
+        :param apid:
+        :param tmtc: 0 for TM, 1 for TC
+        :param path: socket the pool manager serves the live buffers on
+        """
+        self.pool_name = pool_name
+        self.after = after
+        self.filters = {'st': st, 'sst': sst, 'apid': apid, 'tmtc': tmtc}
+        self.path = path
+
+        self._sock = None
+        self._rfile = None
+
+    def _connect(self):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(self.path)
+        self._rfile = self._sock.makefile('rb')
+
+    def _recv(self, size):
+        data = self._rfile.read(size)
+        if len(data) < size:
+            raise ConnectionError('Live packet buffer connection closed')
+        return data
+
+    def get(self, timeout=0.):
+        """
+        Get the matching packets recorded since the last call, wait up to *timeout* seconds if there are none yet
+
+        :param timeout:
+        :return: list of (idx, raw) tuples, None if no live buffer is available for the pool
+        """
+        req = dict(pool=self.pool_name, after=self.after, timeout=timeout, **self.filters)
+        try:
+            if self._sock is None:
+                self._connect()
+            self._sock.sendall(json.dumps(req).encode() + b'\n')
+
+            status, last_idx, npkts = struct.unpack(LIVE_RESP_FMT, self._recv(struct.calcsize(LIVE_RESP_FMT)))
+            pkts = []
+            for _ in range(npkts):
+                idx, pktlen = struct.unpack(LIVE_PKT_FMT, self._recv(struct.calcsize(LIVE_PKT_FMT)))
+                pkts.append((idx, self._recv(pktlen)))
+        except OSError as err:
+            logger.debug('Live packet buffer not available ({})'.format(err))
+            self.close()
+            return
+
+        if status == LIVE_NO_POOL:
+            return
+
+        if last_idx < self.after:
+            # pool has been restarted
+            self.after = 0
+            return []
+
+        if status == LIVE_GAP:
+            idx_to = pkts[0][0] - 1 if pkts else last_idx
+            rows = filter_rows(get_pool_rows(self.pool_name), idx_from=self.after + 1, idx_to=idx_to,
+                               **self.filters).order_by(DbTelemetry.idx)
+            pkts = [(row.idx, row.raw) for row in rows] + pkts
+
+        # all packets up to last_idx have been checked against the filters
+        self.after = max(last_idx, pkts[-1][0]) if pkts else last_idx
+
+        return pkts
+
+    def close(self):
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+        self._sock = None
+        self._rfile = None
+
+
+def query_pool_stats(pool_name):
+    """
+    Aggregate the statistics of a pool from the storage DB, see get_pool_stats
+
+    :param pool_name:
+    :return:
+    """
+    session = scoped_session_storage
+    try:
+        pool = session.query(DbTelemetryPool.iid).filter(DbTelemetryPool.pool_name == pool_name).first()
+        if pool is None:
+            return
+
+        max_idx, nrows, first_cuc, last_cuc = session.query(
+            func.max(DbTelemetry.idx), func.count(DbTelemetry.idx), func.min(DbTelemetry.cuc),
+            func.max(DbTelemetry.cuc)).filter(DbTelemetry.pool_id == pool.iid).one()
+        types = session.query(DbTelemetry.stc, DbTelemetry.sst, DbTelemetry.apid, func.count(DbTelemetry.idx)).filter(
+            DbTelemetry.pool_id == pool.iid).group_by(DbTelemetry.stc, DbTelemetry.sst, DbTelemetry.apid).all()
+    finally:
+        session.close()
+
+    return {'max_idx': max_idx or 0, 'rows': nrows, 'types': {(st, sst, apid): n for st, sst, apid, n in types},
+            'first_cuc': first_cuc, 'last_cuc': last_cuc, 'trashbytes': None}
+
+
+def get_pool_stats(pool_name, from_db=True, path=LIVE_RING_SOCKET):
+    """
+    Get the statistics of a pool: highest pool index (*max_idx*), number of rows, number of packets per (ST, SST, APID)
+    (*types*), earliest and latest CUC time and number of discarded bytes (*trashbytes*). For pools recorded by the
+    pool manager these are maintained incrementally and returned without DB access, otherwise they are aggregated from
+    the storage DB.
+
+    :param pool_name:
+    :param from_db: if *False*, return None instead of querying the DB if the pool manager has no stats for the pool
+    :param path: socket the pool manager serves the live buffers on
+    :return: dict or None
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps({'pool': pool_name, 'stats': True}).encode() + b'\n')
+            rfile = sock.makefile('rb')
+            status, _, size = struct.unpack(LIVE_RESP_FMT, rfile.read(struct.calcsize(LIVE_RESP_FMT)))
+            payload = rfile.read(size)
+            rfile.close()
+        if status == LIVE_OK:
+            stats = json.loads(payload)
+            stats['types'] = {tuple(key): n for *key, n in stats['types']}
+            return stats
+    except (OSError, struct.error, ValueError) as err:
+        logger.debug('Pool stats not available from pool manager ({})'.format(err))
+
+    if from_db:
+        return query_pool_stats(pool_name)
+
+
+def count_pool_packets(stats, st=None, sst=None, apid=None):
+    """
+    Number of packets of the given type in a pool, from the stats returned by get_pool_stats
+
+    :param stats:
+    :param st:
+    :param sst:
+    :param apid:
+    :return:
+    """
+    return sum(n for (pst, psst, papid), n in stats['types'].items() if (st is None or pst == st) and
+               (sst is None or psst == sst) and (apid is None or papid == apid))
 
 
 class Verification:
@@ -7035,8 +8720,9 @@ class TmDecoderDialog(Gtk.Dialog):
 
         # add data pool items
         self.useriter = parameter_model.append(None, ['Data pool', None])
-        for dp in _dp_items:
-            dp_item = '{} ({})'.format(_dp_items[dp]['descr'], dp)
+        dp_items = get_dp_luts().dp_items
+        for dp in dp_items:
+            dp_item = '{} ({})'.format(dp_items[dp]['descr'], dp)
             parameter_model.append(self.useriter, [dp_item, 'dp_item'])
 
         # add user defined PARAMETERS with positional info
@@ -7541,38 +9227,3 @@ class ProjectDialog(Gtk.Dialog):
             self.close()
             sys.exit()
 
-
-# some default variable definitions that require functions defined above
-
-# create local look-up tables for data pool items from MIB
-try:
-    DP_ITEMS_SRC_FILE = cfg.get('database', 'datapool-items')
-    if DP_ITEMS_SRC_FILE:
-        # get DP from file
-        _dp_items = get_data_pool_items(src_file=DP_ITEMS_SRC_FILE, as_dict=True)
-    else:
-        raise ValueError
-except (FileNotFoundError, ValueError, confignator.config.configparser.NoOptionError):
-    if 'DP_ITEMS_SRC_FILE' not in locals():
-        DP_ITEMS_SRC_FILE = None
-    logger.warning('Could not load data pool from file: {} Using MIB instead.'.format(DP_ITEMS_SRC_FILE))
-    _dp_items = get_data_pool_items(as_dict=True)
-finally:
-    # DP_IDS_TO_ITEMS = {int(k[0]): k[1] for k in _dp_items}
-    DP_IDS_TO_ITEMS = {k: _dp_items[k]['descr'] for k in _dp_items}
-    DP_ITEMS_TO_IDS = {_dp_items[k]['descr']: k for k in _dp_items}
-
-# S13 header/offset info
-try:
-    _s13_info = get_tm_parameter_sizes(13, 1)
-    SDU_PAR_LENGTH = _s13_info[0][-1]
-    # length of PUS + source header in S13 packets (i.e. data to be removed when collecting S13)
-    S13_HEADER_LEN_TOTAL = TM_HEADER_LEN + sum([p[-1] for p in _s13_info])
-    S13_DATALEN_PAR_OFFSET, S13_DATALEN_PAR_SIZE = TM_HEADER_LEN + sum([x[1] for x in _s13_info[:-1]]), _s13_info[-1][1]
-except (SQLOperationalError, NotImplementedError, IndexError):
-    logger.warning('Could not get S13 info from MIB, using default values')
-    SDU_PAR_LENGTH = 1
-    S13_HEADER_LEN_TOTAL = 21
-    S13_DATALEN_PAR_OFFSET = 19
-    S13_DATALEN_PAR_SIZE = 2
-
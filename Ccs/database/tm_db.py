@@ -7,8 +7,8 @@ import sys
 
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import (
-    Column, Integer, Boolean, Unicode, Index, UniqueConstraint, ForeignKey, create_engine, engine)
-from sqlalchemy.dialects.mysql import VARBINARY
+    Column, Integer, Boolean, Unicode, Index, UniqueConstraint, ForeignKey, create_engine, engine, inspect)
+from sqlalchemy.dialects.mysql import VARBINARY, DOUBLE
 from sqlalchemy.orm import sessionmaker, relationship, scoped_session
 from sqlalchemy.sql import text
 # from sqlalchemy.orm.session import Session
@@ -66,6 +66,10 @@ class DbTelemetry(DB_BASE):  # type: ignore
     __table_args__ = (
         UniqueConstraint('pool_id', 'idx', name='uniq_pool_id_and_idx'),
         Index('pool_id_and_idx', 'idx', 'pool_id'),
+        Index('pool_id_and_cuc', 'pool_id', 'cuc'),
+        # serve "latest packet of type" and "latest TM/TC" look-ups by a backward index scan
+        Index('pool_id_type_and_idx', 'pool_id', 'stc', 'sst', 'apid', 'idx'),
+        Index('pool_id_tmtc_and_idx', 'pool_id', 'is_tm', 'idx'),
     )
 
     # PK, invisible to usercode
@@ -86,6 +90,9 @@ class DbTelemetry(DB_BASE):  # type: ignore
     destID = Column(Integer, nullable=False)
     timestamp = Column(Unicode(250, collation='utf8_general_ci'), nullable=True,
                        index=True)  # Should this be TIMESTAMP?
+    # numerical CUC time and sync flag, NULL for packets without time (TCs, no secondary header)
+    cuc = Column(DOUBLE, nullable=True)
+    tsync = Column(Boolean, nullable=True)
     data = Column(VARBINARY(1024), nullable=False)  # Much faster than BLOB
     raw = Column(VARBINARY(1024), nullable=False)  # Much faster than BLOB
 
@@ -261,6 +268,51 @@ def create_storage_db(protocol='PUS', force=False):
         print('...DONE')
 
 
+def migrate_storage_db(chunk_size=100000):
+    """
+    Add the numerical CUC time columns and any missing indices to an existing PUS storage table and backfill the time
+    columns from the timestamp strings. Can be run repeatedly, already converted rows are skipped.
+
+    :param chunk_size: number of rows updated per transaction
+    """
+    tm_table = DbTelemetry.__tablename__
+
+    print('Migrating table "{}" in schema "{}"...'.format(tm_table, config_db.storage_schema_name))
+    _engine = create_engine(gen_mysql_conn_str(schema=config_db.storage_schema_name), echo="-v" in sys.argv)
+    insp = inspect(_engine)
+
+    if not insp.has_table(tm_table):
+        print('Table "{}" does not exist, use create_storage_db instead.'.format(tm_table))
+        _engine.dispose()
+        return
+
+    columns = [col['name'] for col in insp.get_columns(tm_table)]
+    if 'cuc' not in columns:
+        _engine.execute(text('ALTER TABLE {} ADD COLUMN cuc DOUBLE NULL AFTER timestamp'.format(tm_table)))
+    if 'tsync' not in columns:
+        _engine.execute(text('ALTER TABLE {} ADD COLUMN tsync BOOL NULL AFTER cuc'.format(tm_table)))
+
+    maxiid = _engine.execute(text('SELECT MAX(iid) FROM {}'.format(tm_table))).scalar() or 0
+    update = text("UPDATE {} SET cuc=LEFT(timestamp, LENGTH(timestamp) - 1) + 0, tsync=(RIGHT(timestamp, 1)='S') "
+                  "WHERE iid > :lo AND iid <= :hi AND cuc IS NULL AND "
+                  "timestamp REGEXP '^[0-9]+(\\\\.[0-9]+)?[A-Z]$'".format(tm_table))
+
+    n_rows = 0
+    for lo in range(0, maxiid, chunk_size):
+        with _engine.begin() as conn:
+            n_rows += conn.execute(update, lo=lo, hi=lo + chunk_size).rowcount
+
+    # create indices after the backfill, so they do not have to be updated row by row
+    indices = [idx['name'] for idx in insp.get_indexes(tm_table)]
+    for index in DbTelemetry.__table__.indexes:
+        if index.name not in indices:
+            print('Creating index {}...'.format(index.name))
+            index.create(_engine)
+
+    _engine.dispose()
+    print('...DONE ({} rows updated)'.format(n_rows))
+
+
 def scoped_session_maker(db_schema, idb_version=None):
     """Create a scoped session maker, returning thread-local sessions
     :param db_schema: either IDB or STORAGE
@@ -307,7 +359,10 @@ if __name__ == "__main__":
     #     from ipdb import set_trace  # NOQA pragma: nocover pylint: disable=C0413,C0411
     #     set_trace()  # pragma: no cover
     # from .test_db import add_example_data  # pragma: no cover
-    create_storage_db(force=True, protocol='ALL')  # pragma: no cover
+    if "--migrate" in sys.argv:
+        migrate_storage_db()  # pragma: no cover
+    else:
+        create_storage_db(force=True, protocol='ALL')  # pragma: no cover
     # add_example_data(sess)  # pragma: no cover
 
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -1,3 +1,4 @@
+import concurrent.futures
 import logging
 import numpy as np
 import os
@@ -15,6 +16,8 @@ logger = cfl.start_logging('Decompression')
 
 CE_COLLECT_TIMEOUT = 1
 LDT_MINIMUM_CE_GAP = 0.001
+CE_DECOMPRESS_WORKERS = int(cfg['ccs-misc'].get('ce_workers', os.cpu_count() or 1))
+CE_DECOMPRESS_TIMEOUT = int(cfg['ccs-misc'].get('ce_timeout', 300))
 
 ce_decompressors = {}
 
@@ -125,6 +128,9 @@ class CeDecompress:
         self.last_ce_time = 0
         self.ce_collect_timeout = CE_COLLECT_TIMEOUT
         self.ldt_minimum_ce_gap = LDT_MINIMUM_CE_GAP
+        self.ce_workers = CE_DECOMPRESS_WORKERS
+        self.ce_timeout = CE_DECOMPRESS_TIMEOUT
+        self.s13 = None
 
     def _ce_decompress(self):
         checkdir = os.path.abspath(self.outdir)
@@ -154,44 +160,56 @@ class CeDecompress:
             if os.path.isfile(fitspath):
                 subprocess.run(["rm", fitspath])
             with open(cefile[:-2] + 'log', 'w') as logfd:
-                subprocess.run([self.ce_exec, cefile, fitspath], stdout=logfd, stderr=logfd)
+                try:
+                    subprocess.run([self.ce_exec, cefile, fitspath], stdout=logfd, stderr=logfd, timeout=self.ce_timeout)
+                except subprocess.TimeoutExpired:
+                    logger.error('Decompression of {} timed out after {} s'.format(cefile, self.ce_timeout))
+
+        # decompressions run in parallel, the CEs are submitted in order of their timestamps
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.ce_workers,
+                                                     thread_name_prefix='CeDecompression_{}'.format(self.init_time))
+        ndone = 0
+        t0 = time.time()
+
+        def done(fut):
+            nonlocal ndone
+            ndone += 1
+            if fut.exception() is not None:
+                logger.error(fut.exception())
+            dt = time.time() - t0
+            logger.debug('{} CEs decompressed in {:.1f} s ({:.2f} CEs/s)'.format(ndone, dt, ndone / dt if dt else 0))
+
+        # the reassembler keeps its cursor between calls, so only newly received TM13s are processed
+        while self.ce_decompression_on:
+            try:
+                if self.s13 is None:
+                    self.s13 = cfl.S13Reassembler(self.pool_name, starttime=self.last_ce_time, endtime=self.endtime,
+                                                  startidx=self.startidx, endidx=self.endidx, sdu=self.sdu,
+                                                  consistency_check=self.check_s13_consistency, check_existence=True)
+                s13 = self.s13
+                ces = s13.collect()
+            except (ValueError, TypeError, AttributeError) as err:
+                pool.shutdown(wait=False)
+                ce_decompressors.pop(self.init_time)
+                raise err
 
-        # first, get all TM13s already complete in pool
-        try:
-            filedict = cfl.dump_large_data(pool_name=self.pool_name, starttime=self.last_ce_time, endtime=self.endtime,
-                                           outdir=self.outdir, dump_all=True, sdu=self.sdu, startidx=self.startidx,
-                                           endidx=self.endidx, consistency_check=self.check_s13_consistency,
-                                           verbose=self.verbose)
-            for ce in filedict:
-                decompress(filedict[ce])
-                self.last_ce_time = ce
-
-            self.last_ce_time += self.ldt_minimum_ce_gap
-
-        except (ValueError, TypeError, AttributeError) as err:
-            ce_decompressors.pop(self.init_time)
-            raise err
+            if self.verbose and ces:
+                print('Collected {} S13 transfers.'.format(len(ces)))
 
-        while self.ce_decompression_on:
-            filedict = cfl.dump_large_data(pool_name=self.pool_name, starttime=self.last_ce_time, endtime=self.endtime,
-                                           outdir=self.outdir, dump_all=True, sdu=self.sdu, startidx=self.startidx,
-                                           endidx=self.endidx, consistency_check=self.check_s13_consistency,
-                                           verbose=self.verbose)
-            if len(filedict) == 0:
-                time.sleep(self.ce_collect_timeout)
-                continue
-
-            for ce in filedict:
-                self.last_ce_time, cefile = ce, filedict[ce]
-                decompress(cefile)
+            for ce in sorted(ces):
+                if ces[ce] is None:
+                    continue
+                cefile = cfl.write_ce_file(ces[ce], ce, outdir=self.outdir)
+                self.last_ce_time = ce + self.ldt_minimum_ce_gap
+                pool.submit(decompress, cefile).add_done_callback(done)
 
                 if not self.ce_decompression_on:
                     break
 
-            # self.last_ce_time, cefile = list(filedict.items())[0]
-            # decompress(cefile)
-            self.last_ce_time += self.ldt_minimum_ce_gap
             time.sleep(self.ce_collect_timeout)
+
+        # let decompressions in progress finish
+        pool.shutdown(wait=True)
         logger.info('CeDecompress stopped [{}].'.format(self.init_time))
         ce_decompressors.pop(self.init_time)
 
@@ -206,3 +224,5 @@ class CeDecompress:
 
     def reset(self, timestamp=0):
         self.last_ce_time = timestamp
+        # restart reassembly from the new start time
+        self.s13 = None
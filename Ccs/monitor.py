@@ -385,12 +385,16 @@ class ParameterMonitor(Gtk.Window):
             self.logger.debug('No rows in pool yet')
             return
 
+        # fetch the latest packet of all monitored types in one go
+        pktkeys = {pktid: self.get_pkt_key(pktid) for pktid in self.monitored_pkts}
+        latest = cfl.get_latest_packets(self.pool_name, pktkeys.values())
+
         for pktid in self.monitored_pkts:
-            pktinfo = self.get_last_pkt_with_id(rows, pktid)
-            if pktinfo is None:
+            row = latest[pktkeys[pktid]]
+            if row is None:
                 continue
 
-            pkttime, pkt = pktinfo
+            pkttime, pkt = float(row.timestamp[:-1]), row.raw
             if pkttime != self.monitored_pkts[pktid]['pkttime']:
                 self.monitored_pkts[pktid]['reftime'] = time.time()
                 self.monitored_pkts[pktid]['pkttime'] = pkttime
@@ -409,6 +413,7 @@ class ParameterMonitor(Gtk.Window):
                         continue
 
         checktime = time.time()
+        mib_checks = []
         for pname in self.parameters:
 
             pktid = self.parameters[pname]['pktid']
@@ -429,13 +434,20 @@ class ParameterMonitor(Gtk.Window):
             else:
                 if self.pdescr.get(pname) in self.user_limits:
                     user_limit = self.user_limits[self.pdescr[pname]]
+                    limit_color = self.limit_colors[cfl.Tm_limits_check(pname, calval, user_limit)]
                 else:
-                    user_limit = None
-                limit_color = self.limit_colors[cfl.Tm_limits_check(pname, calval, user_limit)]
+                    # checked against the MIB limits below, all at once
+                    mib_checks.append((pname, calval))
+                    limit_color = None
 
             self.parameters[pname]['value'] = rawval, calval
             self.parameters[pname]['alarm'] = limit_color
 
+        if mib_checks:
+            pnames, calvals = zip(*mib_checks)
+            for pname, state in zip(pnames, cfl.get_limits_table().check_many(pnames, calvals).tolist()):
+                self.parameters[pname]['alarm'] = self.limit_colors[state]
+
         GLib.idle_add(self.updt_buf)
 
         if self.evt_check_enabled:
@@ -496,6 +508,20 @@ class ParameterMonitor(Gtk.Window):
 
                 buf.insert_markup(buf.get_start_iter(), txt, -1)
 
+    @staticmethod
+    def get_pkt_key(pktid):
+        """
+        Get (ST, SST, APID, SID) key as used by cfl.get_latest_packets from packet ID tuple
+
+        :param pktid:
+        :return:
+        """
+        spid, st, sst, apid, pi1, pi1off, pi1wid = pktid
+        if pi1off != -1:
+            return st, sst, apid, pi1
+        else:
+            return st, sst, apid, None
+
     @staticmethod
     def get_last_pkt_with_id(rows, pktid, pidx=0):
         spid, st, sst, apid, pi1, pi1off, pi1wid = pktid
@@ -568,10 +594,15 @@ class ParameterMonitor(Gtk.Window):
                                   'red' if self.events[evt][1] > self.evt_reset_values[evt] else 'black',
                                   self.events[evt][1]), -1)
 
+        # packet counts maintained by the pool manager, if the pool is recorded
+        stats = cfl.get_pool_stats(self.pool_name, from_db=False)
+
         for event in self.evt_cnt.get_children()[:3]:
             evt = event.get_children()[0].get_text()
 
-            if incremental:
+            if stats is not None:
+                self.events[evt][1] = cfl.count_pool_packets(stats, *self.events[evt][0])
+            elif incremental:
                 self.events[evt][1] += self.pckt_counter(rows, *self.events[evt][0], pidx=self.evt_pkt_idx_last)
             else:
                 self.events[evt][1] = self.pckt_counter(rows, *self.events[evt][0])
@@ -580,7 +611,10 @@ class ParameterMonitor(Gtk.Window):
 
             GLib.idle_add(updt_buf, buf, evt)
 
-        self.evt_pkt_idx_last = rows.order_by(DbTelemetry.idx.desc()).first().idx
+        if stats is not None:
+            self.evt_pkt_idx_last = stats['max_idx']
+        else:
+            self.evt_pkt_idx_last = rows.order_by(DbTelemetry.idx.desc()).first().idx
 
         # def updt_bg_color():
         #     if self.events['Error HIGH'][1] > self.evt_reset_values['Error HIGH']:
@@ -0,0 +1,209 @@
+"""
+Sample buffers and level-of-detail pyramids of the series drawn by the parameter plotter
+
+This module only depends on NumPy, so that it can be used and tested without the GUI.
+"""
+
+import threading
+
+import numpy as np
+
+LOD_FACTOR = 4  # number of buckets of one pyramid level that are merged into one bucket of the next level
+BUFFER_MIN_CAPACITY = 1024
+
+
+class GrowableArray:
+    """
+    1-D numpy array that can be appended to in amortised O(1) per element, by doubling its capacity when full. The
+    filled part is accessible as a view without copying.
+    """
+
+    def __init__(self, values=(), dtype=float, capacity=BUFFER_MIN_CAPACITY):
+        self._data = np.empty(max(capacity, len(values)), dtype=dtype)
+        self._n = 0
+        self.extend(values)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def values(self):
+        return self._data[:self._n]
+
+    def extend(self, values):
+        n = self._n + len(values)
+        if n > len(self._data):
+            data = np.empty(max(n, 2 * len(self._data)), dtype=self._data.dtype)
+            data[:self._n] = self._data[:self._n]
+            self._data = data
+        self._data[self._n:n] = values
+        self._n = n
+
+    def truncate(self, n):
+        self._n = min(n, self._n)
+
+
+class SeriesBuffer:
+    """
+    Append-only columnar float64 store of the (time, value) samples of a plotted parameter. The stored samples are
+    accessible as a (2, n) view without copying, existing samples are never modified.
+    """
+
+    def __init__(self, x=(), y=(), capacity=BUFFER_MIN_CAPACITY):
+        self._data = np.empty((2, max(capacity, len(x))), dtype=float)
+        self._n = 0
+        self.extend(x, y)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def data(self):
+        return self._data[:, :self._n]
+
+    @property
+    def x(self):
+        return self._data[0, :self._n]
+
+    @property
+    def y(self):
+        return self._data[1, :self._n]
+
+    def extend(self, x, y):
+        n = self._n + len(x)
+        if n > self._data.shape[1]:
+            data = np.empty((2, max(n, 2 * self._data.shape[1])), dtype=float)
+            data[:, :self._n] = self._data[:, :self._n]
+            self._data = data
+        self._data[0, self._n:n] = x
+        self._data[1, self._n:n] = y
+        self._n = n
+
+
+class MinMaxLOD:
+    """
+    Multi-resolution representation of a plotted series. Level k splits the samples into buckets of LOD_FACTOR**k
+    consecutive samples and stores the positions of the minimum and maximum of each bucket, so every level preserves
+    spikes. Drawing picks the level that yields about one bucket per pixel of the visible range.
+    """
+
+    def __init__(self, series):
+        """
+
+        :param series: SeriesBuffer holding the samples, call update after appending to it
+        """
+        self.series = series
+        self.n = 0  # number of samples included in the pyramid
+        self.imin = []
+        self.imax = []
+        self.monotonic = True
+        self.lock = threading.Lock()
+        self.update()
+
+    def __len__(self):
+        return self.n
+
+    def update(self):
+        """
+        Include the samples appended to the series since the last update, only the incomplete tail buckets of all
+        levels are recomputed
+        """
+        with self.lock:
+            n_old, n = self.n, len(self.series)
+            if n == n_old:
+                return
+
+            x = self.series.x[max(0, n_old - 1):n]
+            if np.any(np.diff(x) < 0):
+                self.monotonic = False
+
+            level = 1
+            imin = imax = None  # level 0 are the samples themselves
+            nprev = n
+            while nprev > LOD_FACTOR:
+                # recompute only from the first bucket that was incomplete before, a new level is built entirely
+                start = n_old // LOD_FACTOR ** level if len(self.imin) >= level else 0
+                if imin is None:
+                    sub_min = sub_max = np.arange(start * LOD_FACTOR, n)
+                else:
+                    sub_min, sub_max = imin[start * LOD_FACTOR:], imax[start * LOD_FACTOR:]
+                nfull = len(sub_min) // LOD_FACTOR * LOD_FACTOR
+
+                new_min = sub_min[:nfull].reshape(-1, LOD_FACTOR)
+                new_max = sub_max[:nfull].reshape(-1, LOD_FACTOR)
+                new_min = new_min[np.arange(len(new_min)), self._argmin(new_min, axis=1)]
+                new_max = new_max[np.arange(len(new_max)), self._argmax(new_max, axis=1)]
+                if nfull < len(sub_min):
+                    new_min = np.append(new_min, sub_min[nfull:][self._argmin(sub_min[nfull:])])
+                    new_max = np.append(new_max, sub_max[nfull:][self._argmax(sub_max[nfull:])])
+
+                if len(self.imin) < level:
+                    self.imin.append(GrowableArray(dtype=np.int64))
+                    self.imax.append(GrowableArray(dtype=np.int64))
+                self.imin[level - 1].truncate(start)
+                self.imin[level - 1].extend(new_min)
+                self.imax[level - 1].truncate(start)
+                self.imax[level - 1].extend(new_max)
+
+                imin, imax = self.imin[level - 1].values, self.imax[level - 1].values
+                nprev = len(imin)
+                level += 1
+
+            self.n = n
+
+    def _argmin(self, idx, axis=None):
+        # NaN must be neither minimum nor maximum
+        y = self.series.y[idx]
+        return np.argmin(np.where(np.isnan(y), np.inf, y), axis=axis)
+
+    def _argmax(self, idx, axis=None):
+        y = self.series.y[idx]
+        return np.argmax(np.where(np.isnan(y), -np.inf, y), axis=axis)
+
+    def get(self, xmin=None, xmax=None, npix=1000):
+        """
+        Get the samples to draw for the given x range
+
+        :param xmin: start of the visible range, *None* for the whole series
+        :param xmax: end of the visible range, *None* for the whole series
+        :param npix: width of the visible range in pixels
+        :return: x and y arrays with at most about 2 * *npix* points
+        """
+        with self.lock:
+            return self._get(xmin, xmax, npix)
+
+    def _get(self, xmin, xmax, npix):
+        x, y = self.series.x[:self.n], self.series.y[:self.n]
+
+        i0, i1 = 0, self.n
+        if self.monotonic and xmin is not None and xmax is not None:
+            # include one sample beyond each edge, so lines leave the axes correctly
+            i0 = max(0, np.searchsorted(x, xmin, side='left') - 1)
+            i1 = min(self.n, np.searchsorted(x, xmax, side='right') + 1)
+
+        n = i1 - i0
+        if n <= 2 * npix:
+            return x[i0:i1], y[i0:i1]
+
+        level = min(len(self.imin), max(1, int(np.ceil(np.log(n / npix) / np.log(LOD_FACTOR)))))
+        size = LOD_FACTOR ** level
+        b0, b1 = i0 // size, -(-i1 // size)
+        idx = np.sort(np.stack([self.imin[level - 1].values[b0:b1], self.imax[level - 1].values[b0:b1]], -1),
+                      axis=1).ravel()
+
+        return x[idx], y[idx]
+
+
+def extend_diff(series, ylast, xnew, ynew):
+    """
+    Append the differences of new samples to the series of a plot in DIFF mode, which holds the difference of each
+    sample to the previous one. The first new sample has no predecessor if the plotted series was empty.
+
+    :param series: SeriesBuffer of the differences
+    :param ylast: last value of the plotted series before _ynew_, empty if there is none
+    :param xnew: times of the new samples
+    :param ynew: values of the new samples
+    """
+    if len(ylast) == 0:
+        xnew = xnew[1:]
+    series.extend(xnew, np.diff(np.append(ylast, ynew)))
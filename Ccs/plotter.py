@@ -28,6 +28,7 @@ from matplotlib.backends.backend_gtk3 import NavigationToolbar2GTK3 as Navigatio
 import numpy as np
 
 from database.tm_db import DbTelemetryPool, DbTelemetry, scoped_session_maker
+from plot_series import SeriesBuffer, MinMaxLOD, extend_diff
 # from sqlalchemy.sql.expression import func
 # from sqlalchemy.orm import load_only
 
@@ -73,12 +74,12 @@ class PlotViewer(Gtk.Window):
 
         self.data_dict = {}
         self.data_dict_info = {}  # row idx of last data point in data_dict
+        self.data_lod = {}  # min/max pyramids of the plotted series, by data_dict key and DIFF mode
         self.max_datapoints = 0
         self.data_min_idx = None
         self.data_max_idx = None
         self.pi1_lut = {}
 
-        self._pkt_buffer = {}  # local store for TM packets extracted from SQL DB, for speedup
 
         self.cfg = confignator.get_config()
 
@@ -233,6 +234,7 @@ class PlotViewer(Gtk.Window):
         self.subplot.grid()
         self.subplot.set_xlabel('CUC time [s]')
         self.subplot.callbacks.connect('xlim_changed', self._update_plot_xlimit_values)
+        self.subplot.callbacks.connect('xlim_changed', self._on_xlim_changed)
         self.subplot.callbacks.connect('ylim_changed', self._update_plot_ylimit_values)
 
         canvas = FigureCanvas(fig)
@@ -618,21 +620,12 @@ class PlotViewer(Gtk.Window):
             # rows = rows.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) > 2.)
 
         try:
-            # TODO: speedup?
-            if hk in self._pkt_buffer:
-                bufidx, pkts = self._pkt_buffer[hk]
-
-                rows = cfl.filter_rows(rows, idx_from=bufidx+1)
-                if rows.first() is not None:
-                    bufidx = rows.order_by(DbTelemetry.idx.desc()).first().idx
-                    pkts += [row.raw for row in rows.yield_per(1000)]
-                    self._pkt_buffer[hk] = (bufidx, pkts)
-
-            else:
-                pkts = [row.raw for row in rows.yield_per(1000)]
-                if len(pkts) > 0:
-                    bufidx = rows.order_by(DbTelemetry.idx.desc()).first().idx
-                    self._pkt_buffer[hk] = (bufidx, pkts)
+            # only the last processed idx is kept, the raw packets are discarded after decoding
+            bufidx = 0
+            pkts = []
+            for row in rows.order_by(DbTelemetry.idx).yield_per(1000):
+                pkts.append(row.raw)
+                bufidx = row.idx
 
             xy, (descr, unit) = cfl.get_param_values(tmlist=pkts, hk=hk, param=parameter,
                                                      numerical=True, tmfilter=False, nocal=nocal)
@@ -646,7 +639,9 @@ class PlotViewer(Gtk.Window):
             return
 
         # store packet info for update worker
-        self.data_dict[hk + ':' + descr] = xy
+        self.data_dict[hk + ':' + descr] = SeriesBuffer(*xy)
+        self.data_lod.pop((hk + ':' + descr, False), None)
+        self.data_lod.pop((hk + ':' + descr, True), None)
         self.data_dict_info[hk + ':' + descr] = {}
         self.data_dict_info[hk + ':' + descr]['idx_last'] = bufidx
         # self.data_dict_info[hk + ':' + descr]['idx_last'] = rows.order_by(DbTelemetry.idx.desc()).first().idx
@@ -661,13 +656,8 @@ class PlotViewer(Gtk.Window):
         self.subplot.autoscale(enable=not self.scaley.get_active(), axis='y')
 
         try:
-            if self.plot_diff.get_active():
-                x, y = xy
-                x1 = x[1:]
-                dy = np.diff(y)
-                line = self.subplot.plot(x1, dy, marker='.', label=descr, gid=hk)
-            else:
-                line = self.subplot.plot(*xy, marker='.', label=descr, gid=hk)
+            xlim = None if self.subplot.get_autoscalex_on() else self.subplot.get_xlim()
+            line = self.subplot.plot(*self.get_lod_data(hk + ':' + descr, xlim), marker='.', label=descr, gid=hk)
         except TypeError:
             self.logger.error("Can't plot data of type {}".format(xy.dtype[1]))
             return
@@ -675,37 +665,27 @@ class PlotViewer(Gtk.Window):
         self.reduce_datapoints(self.subplot.get_xlim(), self.subplot.get_ylim(), fulldata=False)
 
         # draw limits if available
-        dbres = dbcon.execute('SELECT pcf.pcf_name, pcf.pcf_descr, pcf.pcf_categ, pcf.pcf_unit, ocf.ocf_nbool,\
-                                            ocp.ocp_lvalu, ocp.ocp_hvalu from pcf left join ocf on\
-                                            pcf.pcf_name=ocf.ocf_name left join ocp on ocf_name=ocp_name\
-                                            where pcf.pcf_descr="{}"'.format(parameter))
-        limits = dbres.fetchall()
         dbcon.close()
-
-        try:
-            nlims = limits[0][-3]
-            if nlims is not None:
-                if nlims == 1:
-                    param_id, plabel, fmt, unit, _, lolim, hilim = limits[0]
-                    hardlim = (float(lolim), float(hilim))
-                    softlim = (None, None)
-                else:
-                    param_id, plabel, fmt, unit = limits[0][:4]
-                    softlim, hardlim = [(float(x[-2]), float(x[-1])) for x in limits]
-                show_limits = self.show_limits.get_active()
-                if softlim != (None, None):
-                    for pos, y in zip(('lo', 'hi'), softlim):
-                        limitline = self.subplot.axhline(y, color=line[0].get_color(), alpha=0.5, ls=':',
-                                                         label='_lim_soft_{}_{}'.format(pos, parameter))
-                        limitline.set_visible(show_limits)
-                        self.parameter_limits.add(limitline)
-                for pos, y in zip(('lo', 'hi'), hardlim):
-                    limitline = self.subplot.axhline(y, color=line[0].get_color(), alpha=0.5, ls='--',
-                                                     label='_lim_hard_{}_{}'.format(pos, parameter))
+        softlim, hardlim = cfl.get_limits_table().limits_by_descr(parameter)
+        if softlim == (None, None) and hardlim == (None, None):
+            self.logger.info('Parameter {} does not have limits to plot'.format(parameter))
+        else:
+            show_limits = self.show_limits.get_active()
+            if softlim != (None, None):
+                for pos, y in zip(('lo', 'hi'), softlim):
+                    if y is None:
+                        continue
+                    limitline = self.subplot.axhline(y, color=line[0].get_color(), alpha=0.5, ls=':',
+                                                     label='_lim_soft_{}_{}'.format(pos, parameter))
                     limitline.set_visible(show_limits)
                     self.parameter_limits.add(limitline)
-        except IndexError:
-            self.logger.info('Parameter {} does not have limits to plot'.format(parameter))
+            for pos, y in zip(('lo', 'hi'), hardlim):
+                if y is None:
+                    continue
+                limitline = self.subplot.axhline(y, color=line[0].get_color(), alpha=0.5, ls='--',
+                                                 label='_lim_hard_{}_{}'.format(pos, parameter))
+                limitline.set_visible(show_limits)
+                self.parameter_limits.add(limitline)
 
         # self.subplot.fill_between([-1e9,1e9],[1,1],[2,2],facecolor='orange',alpha=0.5,hatch='/')
         # self.subplot.fill_between([-1e9,1e9],2,10,facecolor='red',alpha=0.5)
@@ -722,7 +702,6 @@ class PlotViewer(Gtk.Window):
             new_min_idx = int(self.min_idx.get_text())
             if new_min_idx != self.data_min_idx:
                 self.data_min_idx = new_min_idx
-                self._pkt_buffer = {}
             rows = rows.filter(DbTelemetry.idx >= self.data_min_idx)
         except (TypeError, ValueError):
             self.data_min_idx = None
@@ -730,7 +709,6 @@ class PlotViewer(Gtk.Window):
             new_max_idx = int(self.max_idx.get_text())
             if new_max_idx != self.data_max_idx:
                 self.data_max_idx = new_max_idx
-                self._pkt_buffer = {}
             rows = rows.filter(DbTelemetry.idx <= self.data_max_idx)
         except (TypeError, ValueError):
             self.data_max_idx = None
@@ -767,35 +745,62 @@ class PlotViewer(Gtk.Window):
     #     self.max_datapoints = n
 
     def reduce_datapoints(self, xlim, ylim, fulldata=True):
+        """
+        Set the data of all parameter lines to the min/max level of detail matching the visible x range and the width
+        of the axes in pixels
 
+        :param xlim:
+        :param ylim:
+        :param fulldata: not used, the full data is shown whenever the x axis is autoscaled
+        :return:
+        """
         ax = self.canvas.figure.get_axes()[0]
 
-        if self.max_datapoints > 0:
-            n_datapoints = self.count_datapoints(xlim, ylim)
-            if n_datapoints > self.max_datapoints:
-                red_fac = n_datapoints // self.max_datapoints + 1
-                for line in ax.lines:
-                    if not line.get_label().startswith('_lim_'):
-                        x, y = self.data_dict[line.get_gid() + ':' + line.get_label()]
-                        if self.plot_diff.get_active():
-                            x = x[1:]
-                            y = np.diff(y)
-                        line.set_xdata(x[::red_fac])
-                        line.set_ydata(y[::red_fac])
-        elif fulldata:
-            for line in ax.lines:
-                if not line.get_label().startswith('_lim_'):
-                    x, y = self.data_dict[line.get_gid() + ':' + line.get_label()]
-                    if self.plot_diff.get_active():
-                        x = x[1:]
-                        y = np.diff(y)
-                    line.set_xdata(x)
-                    line.set_ydata(y)
+        # lines span the whole series while autoscaling, so that relim covers all data
+        if ax.get_autoscalex_on():
+            xlim = None
+
+        for line in ax.lines:
+            if not line.get_label().startswith('_lim_'):
+                line.set_data(*self.get_lod_data(line.get_gid() + ':' + line.get_label(), xlim))
+
+    def get_lod_data(self, key, xlim=None):
+        """
+        Get the points of a stored series to be drawn for the given x range
+
+        :param key: data_dict key of the series
+        :param xlim: visible x range, *None* for the whole series
+        :return:
+        """
+        diff = self.plot_diff.get_active()
+        if (key, diff) not in self.data_lod:
+            series = self.data_dict[key]
+            if diff:
+                series = SeriesBuffer(series.x[1:], np.diff(series.y))
+            self.data_lod[(key, diff)] = MinMaxLOD(series)
+
+        npix = max(1, int(self.subplot.bbox.width))
+        if xlim is None:
+            return self.data_lod[(key, diff)].get(npix=npix)
+        return self.data_lod[(key, diff)].get(*xlim, npix=npix)
+
+    def _extend_lod(self, key, ylast, xnew, ynew):
+        if (key, False) in self.data_lod:
+            self.data_lod[(key, False)].update()
+        if (key, True) in self.data_lod:
+            lod = self.data_lod[(key, True)]
+            extend_diff(lod.series, ylast, xnew, ynew)
+            lod.update()
+
+    def _on_xlim_changed(self, axes=None):
+        if self.data_lod:
+            self.reduce_datapoints(self.subplot.get_xlim(), self.subplot.get_ylim())
+            self.canvas.draw_idle()
 
     def count_datapoints(self, xlim, ylim):
         try:
             n = sum([len(np.where((xlim[0] < x) & (x < xlim[1]) & (ylim[0] < y) & (y < ylim[1]))[0]) for x, y in
-                     self.data_dict.values()])
+                     (series.data for series in self.data_dict.values())])
         except ValueError:
             n = 0
         # self.max_data.set_tooltip_text('{} datapoints'.format(n))
@@ -804,11 +809,13 @@ class PlotViewer(Gtk.Window):
     def clear_parameter(self, widget):
         self.data_dict.clear()
         self.data_dict_info.clear()
+        self.data_lod.clear()
         self.parameter_limits.clear()
         self.subplot.clear()
         self.subplot.grid()
         self.subplot.set_xlabel('CUC Time [s]')
         self.subplot.callbacks.connect('xlim_changed', self._update_plot_xlimit_values)
+        self.subplot.callbacks.connect('xlim_changed', self._on_xlim_changed)
         self.subplot.callbacks.connect('ylim_changed', self._update_plot_ylimit_values)
         self._update_plot_xlimit_values()
         self._update_plot_ylimit_values()
@@ -828,22 +835,31 @@ class PlotViewer(Gtk.Window):
             if not parameter.startswith('_lim_'):
                 hk = line.get_gid()
 
-                xold, yold = self.data_dict[hk + ':' + parameter]
+                series = self.data_dict[hk + ':' + parameter]
                 # time_last = round(float(xold[-1]), 6)  # np.float64 not properly understood in sql comparison below
                 # new_rows = rows.filter(func.left(DbTelemetry.timestamp, func.length(DbTelemetry.timestamp) - 1) > time_last)
                 pinfo = self.data_dict_info[hk + ':' + parameter]
                 new_rows = cfl.filter_rows(rows, st=pinfo['st'], sst=pinfo['sst'], apid=pinfo['apid'],
                                            sid=pinfo['sid'], idx_from=pinfo['idx_last'] + 1)
 
+                pkts = []
+                idx_new = None
+                for row in new_rows.order_by(DbTelemetry.idx).yield_per(1000):
+                    pkts.append(row.raw)
+                    idx_new = row.idx
+
+                if idx_new is None:
+                    continue
+
                 try:
                     # xnew, ynew = cfl.get_param_values([row.raw for row in new_rows], hk, parameter, numerical=True)[0]
-                    xnew, ynew = cfl.get_param_values(tmlist=[row.raw for row in new_rows], hk=hk, param=parameter, numerical=True, tmfilter=False, nocal=nocal)[0]
-                    idx_new = new_rows.order_by(DbTelemetry.idx.desc()).first().idx
+                    xnew, ynew = cfl.get_param_values(tmlist=pkts, hk=hk, param=parameter, numerical=True, tmfilter=False, nocal=nocal)[0]
                 except ValueError:
                     continue
 
-                xy = np.stack([np.append(xold, xnew), np.append(yold, ynew)], -1).T
-                self.data_dict[hk + ':' + parameter] = xy
+                ylast = series.y[-1:]
+                series.extend(xnew, ynew)
+                self._extend_lod(hk + ':' + parameter, ylast, xnew, ynew)
                 self.data_dict_info[hk + ':' + parameter]['idx_last'] = idx_new
 
         self.reduce_datapoints(self.subplot.get_xlim(), self.subplot.get_ylim())
@@ -933,9 +949,9 @@ class PlotViewer(Gtk.Window):
             for parameter in self.data_dict:
                 hk, param = parameter.split(':')
                 try:
-                    d[hk][param] = self.data_dict[parameter].T
+                    d[hk][param] = self.data_dict[parameter].data.T
                 except KeyError:
-                    d.setdefault(hk, {param: self.data_dict[parameter].T})
+                    d.setdefault(hk, {param: self.data_dict[parameter].data.T})
 
             hkblocks = []
             for n in d:
@@ -974,9 +990,9 @@ class PlotViewer(Gtk.Window):
         for parameter in self.data_dict:
             hk, param = parameter.split(':')
             try:
-                d[hk][param] = self.data_dict[parameter].T
+                d[hk][param] = self.data_dict[parameter].data.T
             except KeyError:
-                d.setdefault(hk, {param: self.data_dict[parameter].T})
+                d.setdefault(hk, {param: self.data_dict[parameter].data.T})
 
         hkblocks = []
         text = ''
@@ -1,7 +1,9 @@
+import collections
 import io
 import os
 import importlib
 import json
+import queue
 import struct
 import threading
 import subprocess
@@ -33,6 +35,7 @@ from event_storm_squasher import delayed
 # from matplotlib.backends.backend_gtk3 import NavigationToolbar2GTK3 as NavigationToolbar
 
 # from sqlalchemy.sql.expression import func, distinct
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import load_only
 from database.tm_db import DbTelemetryPool, DbTelemetry, RMapTelemetry, FEEDataTelemetry, scoped_session_maker
 
@@ -47,6 +50,251 @@ TM_HEADER_LEN, TC_HEADER_LEN, PEC_LEN = [packet_config.TM_HEADER_LEN, packet_con
 Telemetry = {'PUS': DbTelemetry, 'RMAP': RMapTelemetry, 'FEE': FEEDataTelemetry}
 
 
+class PoolRowSource:
+    """
+    Keyset-paginated page cache of formatted pool rows for the TMPoolView treeview.
+
+    Pages hold *page_size* consecutive rows in display order and are keyed by the (sort value, idx) key of the row
+    preceding them, so neighbouring pages are fetched with an index seek instead of OFFSET. Pages above and below the
+    viewport are prefetched in a worker thread and handed back to the GTK main loop via GLib.idle_add, the cache itself
+    is only touched from the main loop.
+    """
+
+    def __init__(self, view, page_size=200, max_pages=50, logger=None):
+        """
+
+        :param view: the TMPoolView the rows are fetched for
+        :param page_size: number of rows per page
+        :param max_pages: maximum number of pages held in the LRU cache
+        :param logger:
+        """
+        self.view = view
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.logger = logger
+
+        self.pages = collections.OrderedDict()
+        self.anchors = {0: None}
+        self.signature = None
+        self.n_rows = None
+        self.generation = 0
+
+        self.prefetch_queue = queue.Queue()
+        self.prefetch_pending = set()
+        self.prefetch_thread = threading.Thread(target=self._prefetch_worker, name='PoolRowPrefetch')
+        self.prefetch_thread.daemon = True
+        self.prefetch_thread.start()
+
+    def invalidate(self):
+        self.pages.clear()
+        self.anchors = {0: None}
+        self.prefetch_pending.clear()
+        self.generation += 1
+
+    def get_rows(self, offset, limit, signature, n_rows):
+        """
+        Get the formatted rows to be shown in the treeview
+
+        :param offset: row number of the first row if sorted, else idx of the row preceding the first row
+        :param limit: number of rows
+        :param signature: state of the view (pool, decoding type, sort order, filters); cache is dropped on change
+        :param n_rows: current size of the pool
+        :return: list of formatted rows
+        """
+        if signature != self.signature:
+            self.signature = signature
+            self.n_rows = n_rows
+            self.invalidate()
+        elif n_rows != self.n_rows:
+            self._pool_grown(n_rows)
+
+        order = self.view.get_sort_order()
+        offset = max(0, int(offset))
+        limit = int(limit)
+
+        if order is None:
+            # unsorted view: position is an idx, so the first page anchor is known without a query
+            pageno = None
+            anchor = (offset // self.page_size) * self.page_size
+            page = self._get_page(anchor, order)
+            rows = [row for key, row in page if key > offset]
+        else:
+            pageno = offset // self.page_size
+            anchor, page = self._get_numbered_page(pageno, order)
+            rows = [row for key, row in page[offset % self.page_size:]]
+
+        first_anchor = anchor
+        while len(rows) < limit and len(page) == self.page_size:
+            anchor = page[-1][0]
+            if pageno is not None:
+                pageno += 1
+                self.anchors[pageno] = anchor
+            page = self._get_page(anchor, order)
+            rows += [row for key, row in page]
+
+        if len(page) == self.page_size:
+            self._request_prefetch(page[-1][0], order, pageno + 1 if pageno is not None else None)
+        self._request_prefetch_before(first_anchor, order, offset)
+
+        return rows[:limit]
+
+    def _pool_grown(self, n_rows):
+        # rows are only ever appended, so in idx order just the incomplete tail pages are outdated
+        if self.view.get_sort_order() is None and self.n_rows is not None and n_rows > self.n_rows:
+            for anchor in [a for a, p in self.pages.items() if len(p) < self.page_size]:
+                del self.pages[anchor]
+            self.prefetch_pending.clear()
+            self.generation += 1
+        else:
+            self.invalidate()
+        self.n_rows = n_rows
+
+    def _get_page(self, anchor, order):
+        if anchor in self.pages:
+            self.pages.move_to_end(anchor)
+            return self.pages[anchor]
+
+        page = self._fetch_page(anchor, order)
+        self._store_page(anchor, page)
+        return page
+
+    def _get_numbered_page(self, pageno, order):
+        if pageno in self.anchors:
+            anchor = self.anchors[pageno]
+            return anchor, self._get_page(anchor, order)
+
+        # no seek key known for this page (e.g. scrollbar jump), use OFFSET relative to the closest known page once
+        known = max(n for n in self.anchors if n < pageno)
+        skip = (pageno - known) * self.page_size - 1
+        rows = self._query(self.anchors[known], order).offset(skip).limit(self.page_size + 1).all()
+        if not rows:
+            return None, []
+
+        anchor = self._row_key(rows[0], order)
+        page = self._format(rows[1:], order)
+        self.anchors[pageno] = anchor
+        self._store_page(anchor, page)
+        return anchor, page
+
+    def _store_page(self, anchor, page, generation=None, pageno=None):
+        if generation is not None:
+            self.prefetch_pending.discard((generation, anchor))
+            if generation != self.generation:
+                return False
+
+        self.pages[anchor] = page
+        self.pages.move_to_end(anchor)
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+        if pageno is not None:
+            self.anchors[pageno] = anchor
+        return False
+
+    def _request_prefetch(self, anchor, order, pageno=None):
+        if anchor in self.pages or (self.generation, anchor) in self.prefetch_pending:
+            return
+        self.prefetch_pending.add((self.generation, anchor))
+        self.prefetch_queue.put((self.generation, anchor, order, pageno, False))
+
+    def _request_prefetch_before(self, anchor, order, offset):
+        if anchor is None:
+            return
+
+        if order is None:
+            if anchor >= self.page_size:
+                self._request_prefetch(anchor - self.page_size, order)
+            return
+
+        pageno = offset // self.page_size
+        if pageno - 1 in self.anchors:
+            self._request_prefetch(self.anchors[pageno - 1], order, pageno - 1)
+        elif (self.generation, ('before', anchor)) not in self.prefetch_pending:
+            self.prefetch_pending.add((self.generation, ('before', anchor)))
+            self.prefetch_queue.put((self.generation, anchor, order, pageno - 1, True))
+
+    def _prefetch_worker(self):
+        while True:
+            generation, anchor, order, pageno, before = self.prefetch_queue.get()
+            if generation != self.generation:
+                continue
+            try:
+                if before:
+                    # read the preceding page backwards, the extra row is the seek key of that page
+                    rows = self._query(anchor, order, reverse=True).limit(self.page_size + 1).all()[::-1]
+                    if len(rows) > self.page_size:
+                        prev_anchor = self._row_key(rows[0], order)
+                        rows = rows[1:]
+                    else:
+                        prev_anchor = None
+                    if prev_anchor is not None or pageno == 0:
+                        GLib.idle_add(self._store_page, prev_anchor, self._format(rows, order), generation, pageno)
+                    GLib.idle_add(self.prefetch_pending.discard, (generation, ('before', anchor)))
+                else:
+                    page = self._fetch_page(anchor, order)
+                    GLib.idle_add(self._store_page, anchor, page, generation, pageno)
+            except Exception as err:
+                if self.logger:
+                    self.logger.warning('Row prefetch failed: {}'.format(err))
+                GLib.idle_add(self.prefetch_pending.discard, (generation, anchor))
+            finally:
+                self.view.session_factory_storage.close()
+
+    def _fetch_page(self, anchor, order):
+        rows = self._query(anchor, order).limit(self.page_size).all()
+        return self._format(rows, order)
+
+    def _query(self, anchor, order, reverse=False):
+        """
+        Filtered pool query in display order, starting after (or, if reverse, going backwards from and including)
+        the row with key *anchor*
+        """
+        tm = Telemetry[self.view.decoding_type]
+        rows = self.view.get_current_pool_rows()
+        if self.view.filter_rules_active:
+            rows = self.view._filter_rows(rows)
+
+        if order is None:
+            if reverse:
+                rows = rows.filter(tm.idx <= anchor).order_by(tm.idx.desc())
+            else:
+                if anchor is not None:
+                    rows = rows.filter(tm.idx > anchor)
+                rows = rows.order_by(tm.idx)
+            return rows
+
+        col, desc = order
+        if anchor is not None:
+            val, idx = anchor
+            if reverse:
+                rows = rows.filter(or_(self._seek_after(col, tm.idx, val, idx, not desc), tm.idx == idx))
+            else:
+                rows = rows.filter(self._seek_after(col, tm.idx, val, idx, desc))
+
+        if desc != reverse:
+            return rows.order_by(col.desc(), tm.idx.desc())
+        return rows.order_by(col, tm.idx)
+
+    @staticmethod
+    def _seek_after(col, idx_col, val, idx, desc):
+        # MySQL sorts NULL first in ascending and last in descending order
+        if desc:
+            if val is None:
+                return and_(col.is_(None), idx_col < idx)
+            return or_(col < val, and_(col == val, idx_col < idx), col.is_(None))
+        if val is None:
+            return or_(col.isnot(None), and_(col.is_(None), idx_col > idx))
+        return or_(col > val, and_(col == val, idx_col > idx))
+
+    def _row_key(self, row, order):
+        if order is None:
+            return row.idx
+        return getattr(row, order[0].key), row.idx
+
+    def _format(self, rows, order):
+        return list(zip([self._row_key(row, order) for row in rows], map(tuple, self.view.format_loaded_rows(rows))))
+
+
 class TMPoolView(Gtk.Window):
     # (label, data column alignment)
 
@@ -99,6 +347,8 @@ class TMPoolView(Gtk.Window):
     only_scroll = False
 
     CELLPAD_MAGIC = float(cfg['ccs-misc']['viewer_cell_pad'])
+    ROW_PAGE_SIZE = int(cfg['ccs-misc'].get('viewer_page_size', 200))
+    ROW_CACHE_PAGES = int(cfg['ccs-misc'].get('viewer_cache_pages', 50))
 
     def __init__(self, cfg=cfg, pool_name=None, cfilters='default', standalone=False):
         Gtk.Window.__init__(self, title="Pool View", default_height=800, default_width=1100)
@@ -173,6 +423,9 @@ class TMPoolView(Gtk.Window):
         # Set up the logging module
         self.logger = cfl.start_logging('Poolviewer')
 
+        self.row_source = PoolRowSource(self, page_size=self.ROW_PAGE_SIZE, max_pages=self.ROW_CACHE_PAGES,
+                                        logger=self.logger)
+
         if pool_name is not None:
             self.set_pool(pool_name)
 
@@ -651,6 +904,12 @@ class TMPoolView(Gtk.Window):
         if self.active_pool_info is None:
             return 0
 
+        # recorded pools: use the stats maintained by the pool manager
+        if self.active_pool_info.live:
+            stats = cfl.get_pool_stats(self.active_pool_info.filename, from_db=False)
+            if stats is not None:
+                return stats['max_idx']
+
         new_session = self.session_factory_storage
         rows = new_session.query(
             Telemetry[self.decoding_type]
@@ -711,29 +970,19 @@ class TMPoolView(Gtk.Window):
         @param sort: If the packages are sorted in any way
         @param order: In which order the packages should be displayed
         @param buffer: How many packages should be loaded but are not shown
-        @param rows: Show these rows if given
+        @param rows: Show these rows if given, bypasses the page cache
         @param scrolled: True if view is scrolled
         @param force_import: Import all rows again from the Database
-        @return: -
+        @return: formatted rows
         """
 
         if self.active_pool_info is None:
-            return
+            return []
 
         limit = self.adj.get_page_size() if not limit else limit  # Check if a limit is given
 
         if rows is None:
-            # Combine the Storage Tables and filter only the packages for the given pool
-            new_session = self.session_factory_storage
-            rows = new_session.query(
-                Telemetry[self.decoding_type]
-            ).join(
-                DbTelemetryPool,
-                Telemetry[self.decoding_type].pool_id == DbTelemetryPool.iid
-            ).filter(
-                DbTelemetryPool.pool_name == self.active_pool_info.filename
-            )
-            new_session.close()
+            return self.row_source.get_rows(offset, limit, self._row_source_signature(), int(self.adj.get_upper()))
 
         sorted = False
         # Check if the rows should be shown in any specific order
@@ -753,7 +1002,31 @@ class TMPoolView(Gtk.Window):
             rows = rows.options(load_only()).yield_per(1000).offset(offset).limit(limit)
         else:
             rows = rows.filter(Telemetry[self.decoding_type].idx > offset).limit(limit)
-        return rows
+        return self.format_loaded_rows(rows)
+
+    def get_sort_order(self):
+        """
+        Column the pool is currently sorted by
+
+        @return: (column, descending) or None if sorted by idx only
+        """
+        for col, state, _ in self.tm_columns[self.decoding_type].values():
+            if state == 1:
+                return col, False
+            elif state == 2:
+                return col, True
+
+    def _row_source_signature(self):
+        order = self.get_sort_order()
+        if order is not None:
+            order = (str(order[0]), order[1])
+
+        if self.filter_rules_active:
+            rules = tuple((str(rule[0]), *rule[1:]) for rule in self.filter_rules.values())
+        else:
+            rules = None
+
+        return self.active_pool_info.filename, self.decoding_type, order, rules
 
     def _filter_rows(self, rows):
 
@@ -797,7 +1070,7 @@ class TMPoolView(Gtk.Window):
     def feed_lines_to_view(self, rows):
         """
         Updates the shown packages from the buffer
-        @param shown_diff: how many lines has been scrolled
+        @param rows: formatted rows as returned by fetch_lines_from_db
         @return: -
         """
 
@@ -808,9 +1081,9 @@ class TMPoolView(Gtk.Window):
 
         # self.treeview.freeze_child_notify()
 
-        for tm in rows:
-            self.pool_liststore.append([tm.idx, self.tmtc[tm.is_tm], tm.apid, tm.seq, tm.len_7, tm.stc, tm.sst,
-                                        tm.destID, str(tm.timestamp), tm.data.hex()])
+        # rows come formatted from the row source page cache
+        for row in rows:
+            self.pool_liststore.append(row)
 
         # self.treeview.thaw_child_notify()
 
@@ -2224,6 +2497,8 @@ class TMPoolView(Gtk.Window):
                                                           sst=row.sst,
                                                           destID=row.destID,
                                                           timestamp=row.timestamp,
+                                                          cuc=row.cuc,
+                                                          tsync=row.tsync,
                                                           data=row.data,
                                                           raw=row.raw))
 
@@ -2787,13 +3062,17 @@ class TMPoolView(Gtk.Window):
             return False
 
         if self.active_pool_info.live:
-            rows = self.get_current_pool_rows()
-            if rows.first() is None:
-                cnt = 0
+            stats = cfl.get_pool_stats(self.active_pool_info.filename, from_db=False)
+            if stats is not None:
+                cnt = stats['max_idx']
             else:
-                cnt = rows.order_by(Telemetry[self.decoding_type].idx.desc()).first().idx
+                rows = self.get_current_pool_rows()
+                if rows.first() is None:
+                    cnt = 0
+                else:
+                    cnt = rows.order_by(Telemetry[self.decoding_type].idx.desc()).first().idx
             if cnt != self.n_pool_rows:
-                self.scroll_to_bottom(n_pool_rows=cnt, rows=rows)
+                self.scroll_to_bottom(n_pool_rows=cnt)
                 self.n_pool_rows = cnt
                 return True
             else:
@@ -142,7 +142,8 @@ class PortSplitter:
         while sockfd.fileno() >= 0 and sockfd in self.incoming_connections:
             try:
                 buf, tail = self.poolmgr.receive_from_socket(sockfd, pkt_size_stream=tail)
-                self.tm_pool.put(buf)
+                if buf:
+                    self.tm_pool.put(buf)
             except socket.timeout:
                 continue
             except socket.error:
@@ -4,6 +4,7 @@ import time
 import os
 import datetime
 import socket
+import socketserver
 import crcmod
 import struct
 import DBus_Basic
@@ -11,6 +12,7 @@ import dbus
 import dbus.service
 from dbus.mainloop.glib import DBusGMainLoop
 import confignator
+import numpy as np
 import gi
 
 gi.require_version('Gdk', '3.0')
@@ -26,9 +28,11 @@ import ccs_function_lib as cfl
 
 import threading
 import json
+import weakref
 from typing import NamedTuple
-from collections import deque
+from collections import Counter, deque
 from database.tm_db import DbTelemetryPool, DbTelemetry, scoped_session_maker, FEEDataTelemetry, RMapTelemetry
+from pus_framing import PacketFramer, PusStream
 import importlib
 from sqlalchemy.exc import OperationalError as SQLOperationalError
 
@@ -59,6 +63,12 @@ PLM_PKT_PREFIX_TC_SEND = packet_config.PLM_PKT_PREFIX_TC_SEND
 PLM_PKT_SUFFIX = packet_config.PLM_PKT_SUFFIX
 
 SOCK_TO_LIMIT = 900  # number of tm_recv socket timeouts before SQL session reconnect
+INGEST_RATE_WINDOW = 5  # time window in seconds over which the DB insertion rate is calculated
+LIVE_MAX_WAIT = 60  # maximum time in seconds a live buffer request may block
+LIVE_GAP_WAIT = 10  # maximum time in seconds to wait for pending DB rows before answering a live buffer gap
+TC_COMMIT_WAIT = 5  # maximum time in seconds tc_send waits for a sent TC to be committed to the DB
+RECV_CHUNK = 4096  # maximum number of bytes read from a PUS TM socket at once
+SYNC_GAP_HISTORY = 100  # number of gaps in the PUS stream kept per connection
 
 PROTOCOLS = ['PUS', 'PLMSIM', 'SPW']
 
@@ -78,6 +88,406 @@ def get_scoped_session_factory():
     return scoped_session_maker()
 
 
+class DbIngestor:
+    """
+    Decouples the DB insertion of received packets from the socket readers. Rows are collected in a bounded buffer and
+    written in multi-row INSERT batches by a separate thread, whenever *batch_size* rows are pending or *flush_interval*
+    seconds after the first pending row was queued. If the buffer is full, producers are blocked until there is space
+    again (back-pressure), which is accounted for in the statistics. *on_commit* is called with the list of
+    (table, row) tuples of every committed batch.
+    """
+
+    def __init__(self, session_factory, batch_size=1000, flush_interval=0.05, maxlen=100000, on_commit=None,
+                 logger=None):
+
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maxlen = maxlen
+        self.on_commit = on_commit
+        self.logger = logger if logger is not None else cfl.logger
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._flush_requested = False
+        # number of rows queued and number of rows committed or discarded so far, for wait_written
+        self._nqueued = 0
+        self._ndone = 0
+        self._running = True
+        self._rate_window = deque()
+
+        self.stats = {'rows_total': 0, 'batches': 0, 'batch_latency': 0., 'batch_latency_max': 0., 'queue_max': 0,
+                      'blocked': 0, 'blocked_time': 0., 'errors': 0}
+
+        self._thread = threading.Thread(target=self._worker, name='db_ingestor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, table, row):
+        """
+        Queue a row for insertion
+
+        :param table: SQLAlchemy table the row is inserted into
+        :param row: dict of column values
+        """
+        with self._cond:
+            if len(self._buffer) >= self.maxlen:
+                t1 = time.time()
+                self.stats['blocked'] += 1
+                while len(self._buffer) >= self.maxlen and self._running:
+                    self._cond.wait(0.1)
+                self.stats['blocked_time'] += time.time() - t1
+
+            self._buffer.append((table, row))
+            self._nqueued += 1
+
+            if len(self._buffer) > self.stats['queue_max']:
+                self.stats['queue_max'] = len(self._buffer)
+
+            if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Write all pending rows immediately and wait until they are committed
+
+        :param timeout:
+        :return: *True* if all rows have been written, *False* if the timeout was hit
+        """
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._buffer and not self._in_flight, timeout=timeout)
+
+    def wait_written(self, timeout=None):
+        """
+        Write pending rows immediately and wait until all rows queued before the call are committed. Unlike
+        :meth:`flush`, rows queued in the meantime are not waited for, so this returns in time under continuous load.
+
+        :param timeout:
+        :return: *True* if the rows have been written, *False* if the timeout was hit
+        """
+        with self._cond:
+            target = self._nqueued
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._ndone >= target, timeout=timeout)
+
+    def stop(self, timeout=5):
+        """
+        Flush pending rows and stop the ingestion thread
+
+        :param timeout:
+        """
+        self.flush(timeout=timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def get_stats(self):
+        """
+        Return ingestion statistics: current and maximum queue depth, rows inserted in total and per second (over the
+        last INGEST_RATE_WINDOW seconds), number of batches, last and maximum batch latency [s], number of times and
+        total time [s] producers were blocked by a full buffer, and failed insertion attempts
+
+        :return:
+        """
+        with self._cond:
+            now = time.time()
+            rate = sum(n for t, n in self._rate_window if now - t < INGEST_RATE_WINDOW) / INGEST_RATE_WINDOW
+            return {**self.stats, 'queue_depth': len(self._buffer), 'rows_per_s': rate}
+
+    def _worker(self):
+        session = self.session_factory()
+
+        while True:
+            with self._cond:
+                while not self._buffer and self._running and not self._flush_requested:
+                    self._cond.wait()
+
+                deadline = time.time() + self.flush_interval
+                while len(self._buffer) < self.batch_size and self._running and not self._flush_requested:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                if not self._buffer:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    if self._running:
+                        continue
+                    break
+
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._in_flight = len(batch)
+                # wake up producers blocked by a full buffer
+                self._cond.notify_all()
+
+            t1 = time.time()
+            try:
+                # one multi-row INSERT per table
+                tables = {}
+                for table, row in batch:
+                    tables.setdefault(table, []).append(row)
+                for table in tables:
+                    session.execute(table.insert(), tables[table])
+                session.commit()
+            except SQLOperationalError as err:
+                # connection problem, put rows back and try again
+                self.logger.warning('DB insertion of {} rows failed, retrying ({})'.format(len(batch), err))
+                session.rollback()
+                session.close()
+                with self._cond:
+                    self._buffer.extendleft(reversed(batch))
+                    self._in_flight = 0
+                    self.stats['errors'] += 1
+                time.sleep(1)
+                continue
+            except Exception as err:
+                self.logger.error('DB insertion of {} rows failed, rows discarded'.format(len(batch)))
+                self.logger.exception(err)
+                session.rollback()
+                with self._cond:
+                    self._in_flight = 0
+                    self._ndone += len(batch)
+                    self.stats['errors'] += 1
+                    self._cond.notify_all()
+                continue
+
+            t2 = time.time()
+            if self.on_commit is not None:
+                try:
+                    self.on_commit(batch)
+                except Exception as err:
+                    self.logger.error('Commit callback failed: {}'.format(err))
+
+            with self._cond:
+                self._in_flight = 0
+                self._ndone += len(batch)
+                self.stats['rows_total'] += len(batch)
+                self.stats['batches'] += 1
+                self.stats['batch_latency'] = t2 - t1
+                self.stats['batch_latency_max'] = max(self.stats['batch_latency_max'], t2 - t1)
+                self._rate_window.append((t2, len(batch)))
+                while self._rate_window and t2 - self._rate_window[0][0] > INGEST_RATE_WINDOW:
+                    self._rate_window.popleft()
+                self._cond.notify_all()
+
+        session.close()
+
+
+class PacketRing:
+    """
+    Bounded in-memory buffer of the most recently recorded packets of a pool. Index, header info and raw data are kept
+    in preallocated numpy arrays that are overwritten cyclically, so appending never allocates and selections by
+    index and packet type are vectorised.
+    """
+
+    def __init__(self, size, pkt_size=MAX_PKT_LEN):
+
+        self.size = size
+        self.idx = np.zeros(size, dtype=np.int64)
+        self.is_tm = np.zeros(size, dtype=np.uint8)
+        self.stc = np.zeros(size, dtype=np.uint8)
+        self.sst = np.zeros(size, dtype=np.uint8)
+        self.apid = np.zeros(size, dtype=np.uint16)
+        self.length = np.zeros(size, dtype=np.uint16)
+        self.raw = np.zeros((size, pkt_size), dtype=np.uint8)
+
+        self.count = 0  # total number of packets appended
+        self._cond = threading.Condition()
+
+    @property
+    def last_idx(self):
+        return self.idx[(self.count - 1) % self.size] if self.count else -1
+
+    @property
+    def first_idx(self):
+        return self.idx[self.count % self.size if self.count > self.size else 0] if self.count else -1
+
+    def append(self, idx, head, raw):
+        """
+        Add packet to the buffer and wake up waiting readers
+
+        :param idx: pool index of the packet
+        :param head: decoded header as returned by unpack_pus
+        :param raw:
+        """
+        raw = raw[:self.raw.shape[1]]
+        with self._cond:
+            pos = self.count % self.size
+            self.idx[pos] = idx
+            self.is_tm[pos] = head.PKT_TYPE
+            self.stc[pos] = head.SERV_TYPE
+            self.sst[pos] = head.SERV_SUB_TYPE
+            self.apid[pos] = head.APID
+            self.length[pos] = len(raw)
+            self.raw[pos, :len(raw)] = np.frombuffer(raw, dtype=np.uint8)
+            self.count += 1
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self.count = 0
+            self._cond.notify_all()
+
+    def get_after(self, idx, st=None, sst=None, apid=None, tmtc=None, timeout=0.):
+        """
+        Get all buffered packets with pool index > *idx* that match the given filters. If there are none, wait up to
+        *timeout* seconds for matching packets to arrive.
+
+        :param idx:
+        :param st:
+        :param sst:
+        :param apid:
+        :param tmtc: 0 for TM, 1 for TC
+        :param timeout:
+        :return: status (LIVE_GAP if packets after *idx* have already been dropped from the buffer), last index in the
+                 buffer and list of (idx, raw) tuples
+        """
+        deadline = time.time() + min(timeout, LIVE_MAX_WAIT)
+        with self._cond:
+            status = cfl.LIVE_GAP if self.count > self.size and idx < self.first_idx - 1 else cfl.LIVE_OK
+            while True:
+                n = min(self.count, self.size)
+                sel = self.idx[:n] > idx
+                if st is not None:
+                    sel &= self.stc[:n] == st
+                if sst is not None:
+                    sel &= self.sst[:n] == sst
+                if apid is not None:
+                    sel &= self.apid[:n] == apid
+                if tmtc is not None:
+                    sel &= self.is_tm[:n] == tmtc
+                pos = np.nonzero(sel)[0]
+
+                remaining = deadline - time.time()
+                if len(pos) or remaining <= 0:
+                    break
+
+                # nothing matching yet, only look at packets arriving from now on
+                idx = max(idx, self.last_idx)
+                self._cond.wait(remaining)
+
+            pos = pos[np.argsort(self.idx[pos], kind='stable')]
+            pkts = [(int(self.idx[i]), self.raw[i, :self.length[i]].tobytes()) for i in pos]
+            return status, int(self.last_idx), pkts
+
+
+class PoolStats:
+    """
+    Statistics of a pool, updated incrementally with every batch of rows committed to the storage DB: highest pool
+    index, number of rows, number of packets per (ST, SST, APID) and earliest/latest CUC time
+    """
+
+    def __init__(self, seed=None):
+        """
+
+        :param seed: stats of the rows already in the DB, as returned by cfl.query_pool_stats
+        """
+        self.lock = threading.Lock()
+        self.max_idx = 0
+        self.rows = 0
+        self.types = Counter()
+        self.first_cuc = None
+        self.last_cuc = None
+
+        if seed is not None:
+            self.max_idx = seed['max_idx']
+            self.rows = seed['rows']
+            self.types.update(seed['types'])
+            self.first_cuc = seed['first_cuc']
+            self.last_cuc = seed['last_cuc']
+
+    def add(self, rows):
+        """
+        Account for committed rows
+
+        :param rows: list of row dicts as passed to the ingestor
+        """
+        with self.lock:
+            for row in rows:
+                self.rows += 1
+                if row['idx'] > self.max_idx:
+                    self.max_idx = row['idx']
+                if 'stc' in row:
+                    self.types[(row['stc'], row['sst'], row['apid'])] += 1
+                cuc = row.get('cuc')
+                if cuc is not None:
+                    if self.first_cuc is None or cuc < self.first_cuc:
+                        self.first_cuc = cuc
+                    if self.last_cuc is None or cuc > self.last_cuc:
+                        self.last_cuc = cuc
+
+    def to_dict(self):
+        with self.lock:
+            return {'max_idx': self.max_idx, 'rows': self.rows,
+                    'types': [[st, sst, apid, n] for (st, sst, apid), n in self.types.items()],
+                    'first_cuc': self.first_cuc, 'last_cuc': self.last_cuc}
+
+
+class LiveRingRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serve requests for recent packets from the live packet buffers. Each request is a JSON line with the keys *pool*,
+    *after* and optionally *st*, *sst*, *apid*, *tmtc* and *timeout*, which is answered with a LIVE_RESP_FMT header
+    followed by the packets, each preceded by LIVE_PKT_FMT. A connection can be kept open for any number of requests.
+    Requests with *stats* set are answered with a LIVE_RESP_FMT header followed by the JSON encoded pool statistics
+    instead, the third header field giving the length of the JSON data.
+    If packets requested have already left the buffer (LIVE_GAP), the response is delayed until the rows queued for DB
+    insertion are committed, since the client falls back to the DB for the missing range.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                if req.get('stats'):
+                    stats = self.server.get_stats(req['pool'])
+                    if stats is None:
+                        self.wfile.write(struct.pack(cfl.LIVE_RESP_FMT, cfl.LIVE_NO_POOL, -1, 0))
+                    else:
+                        payload = json.dumps(stats).encode()
+                        self.wfile.write(struct.pack(cfl.LIVE_RESP_FMT, cfl.LIVE_OK, stats['max_idx'], len(payload)))
+                        self.wfile.write(payload)
+                    continue
+
+                ring = self.server.rings.get(req['pool'])
+                if ring is None:
+                    self.wfile.write(struct.pack(cfl.LIVE_RESP_FMT, cfl.LIVE_NO_POOL, -1, 0))
+                    continue
+
+                status, last_idx, pkts = ring.get_after(req['after'], st=req.get('st'), sst=req.get('sst'),
+                                                        apid=req.get('apid'), tmtc=req.get('tmtc'),
+                                                        timeout=req.get('timeout', 0.))
+                if status == cfl.LIVE_GAP and not self.server.wait_written(timeout=LIVE_GAP_WAIT):
+                    self.server.logger.warning('Pending rows of pool {} not committed within {} s, DB fallback may '
+                                               'miss packets'.format(req['pool'], LIVE_GAP_WAIT))
+                resp = [struct.pack(cfl.LIVE_RESP_FMT, status, last_idx, len(pkts))]
+                for idx, raw in pkts:
+                    resp.append(struct.pack(cfl.LIVE_PKT_FMT, idx, len(raw)))
+                    resp.append(raw)
+                self.wfile.write(b''.join(resp))
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as err:
+                self.server.logger.error('Invalid live buffer request {}: {}'.format(line[:200], err))
+                return
+
+
+class LiveRingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, rings, logger, get_stats=lambda pool_name: None, wait_written=lambda timeout: True):
+        self.rings = rings
+        self.logger = logger
+        self.get_stats = get_stats
+        self.wait_written = wait_written
+        super(LiveRingServer, self).__init__(path, LiveRingRequestHandler)
+
+
 class DatapoolManager:
     # pecmodes = ['ignore', 'warn', 'discard']
 
@@ -123,12 +533,30 @@ class DatapoolManager:
         self.session_factory_idb = scoped_session_maker('idb')
         self.session_factory_storage = scoped_session_maker('storage')
 
+        # batched DB insertion of received packets
+        self.ingestor = DbIngestor(self.session_factory_storage,
+                                   batch_size=int(self.cfg['ccs-database'].get('ingest_batch_size', 1000)),
+                                   flush_interval=self.commit_interval,
+                                   maxlen=int(self.cfg['ccs-database'].get('ingest_queue_size', 100000)),
+                                   on_commit=self._update_pool_stats,
+                                   logger=self.logger)
+
+        # incrementally maintained pool statistics, by pool ID and pool ID by pool name
+        self.pool_stats = {}
+        self.pool_stats_ids = {}
+
+        # in-memory buffers of recently recorded packets per pool, served to other processes over a local socket
+        self.live_ring_size = int(self.cfg['ccs-database'].get('live_ring_size', 50000))
+        self.live_rings = {}
+        self.live_server = self._start_live_server(cfl.LIVE_RING_SOCKET)
+
         self.storage = {'PUS': DbTelemetry,
                         'FEE': FEEDataTelemetry,
                         'RMAP': RMapTelemetry}
 
         self.connections = {}
         self.tc_connections = {}
+        self.socket_framers = weakref.WeakKeyDictionary()  # framing state of the sockets read by receive_from_socket
 
         self.loaded_pools = {}
         self.pool_rows = {}  # entries in MySQL "tm_pool" table
@@ -700,59 +1128,46 @@ class DatapoolManager:
             new_session.commit()
             self.trashbytes[pool_name] = 0
             self.state[pool_name] = 1
-            self.last_commit_time = time.time()
+            live_ring = self._get_live_ring(pool_name, reset=True)
+            self._get_pool_stats(pool_row, reset=True)
 
         else:
             pool_row = new_session.query(DbTelemetryPool).filter(DbTelemetryPool.pool_name == pool_name).first()
+            live_ring = self._get_live_ring(pool_name)
+            self._get_pool_stats(pool_row)
 
         if pckt_filter is not None:
             self.filtered_pckts[pool_name] = deque()
 
         def process_tm(tmd, tm_raw):
             tm = tmd[0]
-
-            # truncate if data exceeds max packet length
-            if len(tm_raw) > MAX_PKT_LEN:
-                self.logger.warning("Packet [{},{}] exceeds MAX_PKT_LEN of {} ({}). Truncating data!".format(
-                    tm.APID, tm.PKT_SEQ_CNT, MAX_PKT_LEN, len(tm_raw)))
-                tm_raw = tm_raw[:MAX_PKT_LEN]
-                tmd = list(tmd)
-                tmd[1] = tmd[1][:MAX_PKT_LEN]
-
-            newTmRow = DbTelemetry(
-                pool_id=pool_row.iid,
-                idx=self.state[pool_row.pool_name],
-                is_tm=tm.PKT_TYPE,
-                apid=tm.APID,
-                seq=tm.PKT_SEQ_CNT,
-                len_7=tm.PKT_LEN,
-                stc=tm.SERV_TYPE,
-                sst=tm.SERV_SUB_TYPE,
-                destID=tm.DEST_ID if tm.PKT_TYPE == 0 else tm.SOURCE_ID,
-                timestamp=self.cuc_time_str(tm),
-                data=tmd[1],
-                raw=tm_raw)
+            self.ingestor.put(DbTelemetry.__table__,
+                              self._mk_pus_row(pool_row.iid, self.state[pool_row.pool_name], tmd, tm_raw))
+            live_ring.append(self.state[pool_row.pool_name], tm, tm_raw)
             self._add_to_colour_list({'TM/TC': self.tmtc[tm.PKT_TYPE], 'ST': tm.SERV_TYPE, 'SST': tm.SERV_SUB_TYPE,
                                       'APID': tm.APID, 'LEN': tm.PKT_LEN})
-            new_session.add(newTmRow)
             self.state[pool_row.pool_name] += 1
-            now = time.time()
-            if (now - self.last_commit_time) > self.commit_interval:
-                # new_session.bulk_save_objects(self.rows_to_add)
-                new_session.commit()
-                self.last_commit_time = now
 
         # set short timeout to commit last packet, in case no further one is received
         sockfd.settimeout(1.)
 
         checkcrc = True if self.pecmode in ('warn', 'discard') else False
-        pkt_size_stream = b''
+
+        def log_gap(start, end):
+            self.logger.warning('{}: skipped {} bytes of corrupt data at stream offset {}-{}'.format(
+                pool_name, end - start, start, end))
+
+        # packets are framed along their length fields, after corrupt data the stream is resynchronised at the next
+        # plausible header with valid CRC; CRC errors of packets in sync are handled according to the PEC mode
+        framer = PacketFramer(cfl.packet_sync(on_gap=log_gap, max_gaps=SYNC_GAP_HISTORY))
+        self.connections[pool_name]['gaps'] = framer.sync.gaps
+
         while self.connections[pool_name]['recording']:
             if sockfd.fileno() < 0:
                 break
             try:
                 if self.connections[pool_name]['paused']:
-                    new_session.commit()
+                    self.ingestor.flush()
                     new_session.close()
                     self.logger.info('Paused recording from ' + str(host) + ':' + str(port))
                     return
@@ -787,50 +1202,17 @@ class DatapoolManager:
 
                 # pure PUS datastream
                 elif protocol.upper() == "PUS":
-                    while len(pkt_size_stream) < 6:
-                        data = sockfd.recv(6 - len(pkt_size_stream))
-                        if not data:
-                            break
-                        pkt_size_stream += data
-                    pkt_len = struct.unpack('>4xH', pkt_size_stream[:6])[0] + 7  # PUS len+7
-                    while pkt_len > MAX_PKT_LEN:
-                        pkt_size_stream = pkt_size_stream[1:]
-                        self.trashbytes[pool_name] += 1
-                        if len(pkt_size_stream) < 6:
-                            pkt_size_stream += sockfd.recv(1)
-                        pkt_len = struct.unpack('>4xH', pkt_size_stream[:6])[0] + 7
-                    if len(pkt_size_stream) < pkt_len:
-                        buf = pkt_size_stream + sockfd.recv(pkt_len - len(pkt_size_stream))
-                        tail = b''
-                    else:
-                        buf = pkt_size_stream[:pkt_len]
-                        tail = pkt_size_stream[pkt_len:]
-                    while len(buf) < pkt_len:
-                        d = sockfd.recv(pkt_len - len(buf))
-                        if not d:
-                            break
-                        buf += d
-
-                    # if self.pecmode == 'discard':
-                    # process if wrong CRC?
-                    # while self.crc_check(buf):
-                    #     buf = buf[1:] + tail
-                    #     self.trashbytes[pool_name] += 1
-                    #     while len(buf) < 6:
-                    #         buf += sockfd.recv(6 - len(buf))
-                    #     pkt_len = struct.unpack('>4xH', buf[:6])[0] + 7
-                    #     if pkt_len > MAX_PKT_LEN:
-                    #         tail = b''
-                    #         continue
-                    #     while pkt_len > len(buf):
-                    #         buf += sockfd.recv(pkt_len - len(buf))
-                    #     if pkt_len < len(buf):
-                    #         tail = buf[pkt_len:]
-                    #         buf = buf[:pkt_len]
-                    #     else:
-                    #         tail = b''
-
-                    pkt_size_stream = tail
+                    data = sockfd.recv(RECV_CHUNK)
+                    skipped = framer.skipped
+                    if not data:
+                        # connection closed, an incomplete packet left in the buffer is lost
+                        framer.flush()
+                        self.trashbytes[pool_name] += framer.skipped - skipped
+                        break
+                    buf = b''.join(framer.feed(data))
+                    self.trashbytes[pool_name] += framer.skipped - skipped
+                    if not buf:
+                        continue
 
                 if not buf:
                     break
@@ -868,7 +1250,8 @@ class DatapoolManager:
                 new_session.close()
                 pool_row = new_session.query(DbTelemetryPool).filter(DbTelemetryPool.pool_name == pool_name,
                                                                      DbTelemetryPool.modification_time == creation_time).first()
-                pkt_size_stream = buf + pkt_size_stream  # re-read buffer in next loop since DB insertion has failed
+                if protocol.upper() == "PUS":
+                    framer.push_back(buf)  # re-read buffer in next loop since DB insertion has failed
             except socket.error as e:
                 self.logger.error('Socket error ({}:{})'.format(host, port))
                 self.logger.exception(e)
@@ -881,7 +1264,7 @@ class DatapoolManager:
                 self.logger.exception(e)
                 break
 
-        new_session.commit()
+        self.ingestor.flush()
         new_session.close()
         self.connections[pool_name]['recording'] = False
         self.logger.warning('Disconnected from ' + str(host) + ':' + str(port))
@@ -928,49 +1311,46 @@ class DatapoolManager:
         new_session.close()
 
     def receive_from_socket(self, sockfd, pool_name=None, pkt_size_stream=b''):
-        while len(pkt_size_stream) < 6:
-            data = sockfd.recv(6 - len(pkt_size_stream))
-            if not data:
-                break
-            pkt_size_stream += data
-        pkt_len = struct.unpack('>4xH', pkt_size_stream[:6])[0] + 7  # PUS len+7
-        while pkt_len > MAX_PKT_LEN:
-            pkt_size_stream = pkt_size_stream[1:]
-            if pool_name is not None:
-                self.trashbytes[pool_name] += 1
-            if len(pkt_size_stream) < 6:
-                pkt_size_stream += sockfd.recv(1)
-            pkt_len = struct.unpack('>4xH', pkt_size_stream[:6])[0] + 7
-        if len(pkt_size_stream) < pkt_len:
-            buf = pkt_size_stream + sockfd.recv(pkt_len - len(pkt_size_stream))
-            tail = b''
-        else:
-            buf = pkt_size_stream[:pkt_len]
-            tail = pkt_size_stream[pkt_len:]
-        while len(buf) < pkt_len:
-            d = sockfd.recv(pkt_len - len(buf))
-            if not d:
-                break
-            buf += d
+        """
+        Receive the next PUS packet with valid CRC from a socket. Corrupt data are skipped, the stream is resynchronised
+        at the next plausible packet header. The framer is set up on the first call for a socket and kept, together
+        with the data received after the returned packet, until the connection is closed.
+
+        :param sockfd: socket to receive from
+        :param pool_name: pool whose trashbytes counter is increased by the number of bytes skipped
+        :param pkt_size_stream: data to be framed before the data received from the socket
+        :return: tuple of the packet and the data to be passed to the next call, which are always empty as the
+                 remaining data are kept with the socket. The packet is empty if the socket timed out while data were
+                 buffered.
+        """
+        if sockfd not in self.socket_framers:
+            def log_gap(start, end):
+                self.logger.debug('{}: skipped {} bytes of corrupt data'.format(pool_name, end - start))
+
+            self.socket_framers[sockfd] = (PacketFramer(cfl.packet_sync(on_gap=log_gap, max_gaps=0), strict=True),
+                                           deque())
 
-        while self.crc_check(buf):
-            buf = buf[1:] + tail
+        framer, pckts = self.socket_framers[sockfd]
+        skipped = framer.skipped
+        pckts.extend(framer.feed(pkt_size_stream))
+        try:
+            while not pckts:
+                data = sockfd.recv(RECV_CHUNK)
+                if not data:
+                    framer.flush()
+                    del self.socket_framers[sockfd]
+                    raise ConnectionError('Connection closed by peer')
+                pckts.extend(framer.feed(data))
+        except socket.timeout:
+            # the data received so far are kept for the next call
+            if not len(framer):
+                raise
+            return b'', b''
+        finally:
             if pool_name is not None:
-                self.trashbytes[pool_name] += 1
-            while len(buf) < 6:
-                buf += sockfd.recv(6 - len(buf))
-            pkt_len = struct.unpack('>4xH', buf[:6])[0] + 7
-            if pkt_len > MAX_PKT_LEN:
-                tail = b''
-                continue
-            while pkt_len > len(buf):
-                buf += sockfd.recv(pkt_len - len(buf))
-            if pkt_len < len(buf):
-                tail = buf[pkt_len:]
-                buf = buf[:pkt_len]
-            else:
-                tail = b''
-        return buf, tail
+                self.trashbytes[pool_name] += framer.skipped - skipped
+
+        return pckts.popleft(), b''
 
     def tc_receiver(self, sockfd, protocol='PUS'):
         host, port = sockfd.getpeername()
@@ -1065,14 +1445,19 @@ class DatapoolManager:
 
             self.trashbytes[pool_name] = 0
             self.state[pool_name] = 1
-            self.last_commit_time = time.time()
+            self._get_live_ring(pool_name, reset=True)
+            self._get_pool_stats(pool_row, reset=True)
 
         # If the pool name already exists but witout any entries just start from row 1 and delete all other entries
         elif not self.state[pool_name]:
 
             self.trashbytes[pool_name] = 0
             self.state[pool_name] = 1
-            self.last_commit_time = time.time()
+            self._get_live_ring(pool_name, reset=True)
+            self._get_pool_stats(pool_row, reset=True)
+
+        live_ring = self._get_live_ring(pool_name)
+        self._get_pool_stats(pool_row)
 
         try:
             self.tc_connections[pool_name]['socket'].send(buf_to_send)
@@ -1088,33 +1473,11 @@ class DatapoolManager:
             self.tc_databuflen += len(buf_to_send)
 
         def process_tm(tmd, tm_raw):
-            tm = tmd[0]
-
-            # truncate if data exceeds max packet length
-            if len(tm_raw) > MAX_PKT_LEN:
-                self.logger.warning("Packet [{},{}] exceeds MAX_PKT_LEN of {} ({}). Truncating data!".format(
-                    tm.APID, tm.PKT_SEQ_CNT, MAX_PKT_LEN, len(tm_raw)))
-                tm_raw = tm_raw[:MAX_PKT_LEN]
-                tmd = list(tmd)
-                tmd[1] = tmd[1][:MAX_PKT_LEN]
-
-            newTmRow = DbTelemetry(
-                pool_id=pool_row.iid,
-                idx=self.state[pool_row.pool_name],
-                is_tm=tm.PKT_TYPE,
-                apid=tm.APID,
-                seq=tm.PKT_SEQ_CNT,
-                len_7=tm.PKT_LEN,
-                stc=tm.SERV_TYPE,
-                sst=tm.SERV_SUB_TYPE,
-                destID=tm.DEST_ID if tm.PKT_TYPE == 0 else tm.SOURCE_ID,
-                timestamp=self.cuc_time_str(tm),
-                data=tmd[1],
-                raw=tm_raw)
-            new_session.add(newTmRow)
+            self.ingestor.put(DbTelemetry.__table__,
+                              self._mk_pus_row(pool_row.iid, self.state[pool_row.pool_name], tmd, tm_raw))
+            live_ring.append(self.state[pool_row.pool_name], tmd[0], tm_raw)
             # self.logger.debug("Recorded %d rows in %s..." % (self.state[0], pool_name))
             self.state[pool_row.pool_name] += 1
-            new_session.commit()
 
         if self.tc_connections[pool_name]['protocol'].upper() in ('PUS', 'PLMSIM'):
             checkcrc = True
@@ -1128,8 +1491,141 @@ class DatapoolManager:
                 self.process_rmap(header, pkt, pool_name, pool_row=pool_row)
         else:
             self.logger.warning('Unknown TC protocol, cannot store {} in DB'.format(buf))
+
+        # make sure the TC is in the DB when returning, for subsequent acknowledgement checks, without waiting for TM
+        # queued in the meantime
+        if not self.ingestor.wait_written(timeout=TC_COMMIT_WAIT):
+            self.logger.warning('TC sent to {} not committed to the DB within {} s'.format(pool_name, TC_COMMIT_WAIT))
         new_session.close()
 
+    def _mk_pus_row(self, pool_id, idx, tmd, tm_raw):
+        """
+        Create the DB row of a PUS packet for the ingestor
+
+        :param pool_id:
+        :param idx:
+        :param tmd: unpacked packet as returned by unpack_pus
+        :param tm_raw:
+        :return:
+        """
+        tm = tmd[0]
+        data = tmd[1]
+
+        # truncate if data exceeds max packet length
+        if len(tm_raw) > MAX_PKT_LEN:
+            self.logger.warning("Packet [{},{}] exceeds MAX_PKT_LEN of {} ({}). Truncating data!".format(
+                tm.APID, tm.PKT_SEQ_CNT, MAX_PKT_LEN, len(tm_raw)))
+            tm_raw = tm_raw[:MAX_PKT_LEN]
+            data = data[:MAX_PKT_LEN]
+
+        return dict(pool_id=pool_id,
+                    idx=idx,
+                    is_tm=tm.PKT_TYPE,
+                    apid=tm.APID,
+                    seq=tm.PKT_SEQ_CNT,
+                    len_7=tm.PKT_LEN,
+                    stc=tm.SERV_TYPE,
+                    sst=tm.SERV_SUB_TYPE,
+                    destID=tm.DEST_ID if tm.PKT_TYPE == 0 else tm.SOURCE_ID,
+                    **cfl.cuc_time_columns(tm, logger=self.logger),
+                    data=data,
+                    raw=tm_raw)
+
+    def _get_live_ring(self, pool_name, reset=False):
+        """
+        Get the live packet buffer of a pool, create it if necessary
+
+        :param pool_name:
+        :param reset: discard buffered packets, e.g. if the pool is restarted
+        :return:
+        """
+        if pool_name not in self.live_rings:
+            self.live_rings[pool_name] = PacketRing(self.live_ring_size)
+        elif reset:
+            self.live_rings[pool_name].clear()
+        return self.live_rings[pool_name]
+
+    def _get_pool_stats(self, pool_row, reset=False):
+        """
+        Get the statistics of a pool, create them if necessary. The stats of a pool that already has rows in the DB
+        are initialised from the DB.
+
+        :param pool_row: DbTelemetryPool entry of the pool
+        :param reset: start from zero, e.g. if the pool is restarted
+        :return:
+        """
+        if reset or pool_row.iid not in self.pool_stats:
+            self.pool_stats[pool_row.iid] = PoolStats(seed=None if reset else cfl.query_pool_stats(pool_row.pool_name))
+        self.pool_stats_ids[pool_row.pool_name] = pool_row.iid
+        return self.pool_stats[pool_row.iid]
+
+    def _update_pool_stats(self, batch):
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(row.get('pool_id'), []).append(row)
+        for pool_id in rows:
+            if pool_id in self.pool_stats:
+                self.pool_stats[pool_id].add(rows[pool_id])
+
+    def get_pool_stats(self, pool_name):
+        """
+        Return the incrementally maintained statistics of a recorded pool, see cfl.get_pool_stats
+
+        :param pool_name:
+        :return: dict, or None if there are no stats for the pool
+        """
+        pool_id = self.pool_stats_ids.get(pool_name)
+        if pool_id not in self.pool_stats:
+            return
+        return {**self.pool_stats[pool_id].to_dict(), 'trashbytes': self.trashbytes.get(pool_name, 0)}
+
+    def _start_live_server(self, path):
+        """
+        Serve the live packet buffers on a Unix domain socket
+
+        :param path: socket path
+        :return:
+        """
+        if os.path.exists(path):
+            # remove stale socket, unless another pool manager is serving on it
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(path)
+                self.logger.warning('Live packet buffer socket {} already in use, not serving live data'.format(path))
+                return
+            except OSError:
+                os.remove(path)
+
+        try:
+            server = LiveRingServer(path, self.live_rings, self.logger, get_stats=self.get_pool_stats,
+                                    wait_written=self.ingestor.wait_written)
+        except OSError as err:
+            self.logger.error('Could not serve live packet buffers on {} ({})'.format(path, err))
+            return
+
+        thread = threading.Thread(target=server.serve_forever, name='live_ring_server')
+        thread.daemon = True
+        thread.start()
+        self.logger.info('Serving live packet buffers on {}'.format(path))
+        return server
+
+    def get_live_stats(self):
+        """
+        Return number of buffered packets and index range of the live packet buffer of each pool
+
+        :return:
+        """
+        return {pool_name: {'buffered': min(ring.count, ring.size), 'first_idx': int(ring.first_idx),
+                            'last_idx': int(ring.last_idx)} for pool_name, ring in self.live_rings.items()}
+
+    def get_ingest_stats(self):
+        """
+        Return statistics of the batched DB insertion of received packets
+
+        :return:
+        """
+        return self.ingestor.get_stats()
+
     def crc_check(self, pckt):
         return cfl.crc_check(pckt)
 
@@ -1178,9 +1674,15 @@ class DatapoolManager:
         return cfl.cuc_time_str(head, logger=self.logger)
 
     def decode_tmdump_and_process_packets(self, filename, processor, brute=False):
-        buf = open(filename, 'rb').read()
         self.trashbytes[filename] = 0
-        self.decode_tmdump_and_process_packets_internal(buf, processor, brute=brute, filename=filename)
+        if brute:
+            pckts = PusStream(filename, validate=True, sync=cfl.packet_sync())
+            self.trashbytes[filename] += pckts.skipped
+        else:
+            pckts = PusStream(filename, partial=True)
+
+        with pckts:
+            self.decode_tmdump_and_process_packets_internal(pckts, processor, brute=brute, filename=filename)
 
     def decode_tmdump_and_process_packets_internal(self, buf, processor, brute=False, checkcrc=True, filename=None,
                                                    pckt_decoded=None):
@@ -1188,30 +1690,39 @@ class DatapoolManager:
             processor(pckt_decoded, buf)
             return
 
-        if brute:
+        if isinstance(buf, PusStream):
+            # already framed, e.g. a memory-mapped dump
+            pckts = buf
+            if brute:
+                checkcrc = False  # CRC already performed during framing
+        elif brute:
             pckts = self.extract_pus_brute_search(buf, filename=filename)
             checkcrc = False  # CRC already performed during brute_search
         else:
-            pckts = self.extract_pus(buf)
+            pckts = PusStream(buf, partial=True)
 
-        for pckt in pckts:
+        if checkcrc:
+            # verify the CRCs of all packets at once
+            crc_ok = pckts.crc_valid()
+
+        for i, pckt in enumerate(pckts):
+            pckt = bytes(pckt)
             # this CRC only works for PUS packets
-            if checkcrc:
+            if checkcrc and not crc_ok[i]:
                 calc = cfl.crc(pckt)
-                if calc:
-                    chk = int.from_bytes(pckt[-PEC_LEN:], 'big')
-                    if self.pecmode == 'warn':
-                        if len(pckt) > 7:
-                            self.logger.warning('[CRC error]: is {:0{plen}X}, calc {:0{plen}X} [{}...]'.format(chk, calc, pckt[:6].hex().upper(), plen=PEC_LEN * 2))
-                        else:
-                            self.logger.warning('INVALID packet -- too short: {}'.format(pckt.hex().upper()))
-                    elif self.pecmode == 'discard':
-                        if len(pckt) > 7:
-                            self.logger.warning('[CRC error]: is {:0{plen}X}, calc {:0{plen}X}'.format(chk, calc, plen=PEC_LEN*2))
-                            self.logger.warning('[CRC error]: packet discarded: {}'.format(pckt.hex().upper()))
-                        else:
-                            self.logger.warning('INVALID packet -- too short: {}'.format(pckt.hex().upper()))
-                        continue
+                chk = int.from_bytes(pckt[-PEC_LEN:], 'big')
+                if self.pecmode == 'warn':
+                    if len(pckt) > 7:
+                        self.logger.warning('[CRC error]: is {:0{plen}X}, calc {:0{plen}X} [{}...]'.format(chk, calc, pckt[:6].hex().upper(), plen=PEC_LEN * 2))
+                    else:
+                        self.logger.warning('INVALID packet -- too short: {}'.format(pckt.hex().upper()))
+                elif self.pecmode == 'discard':
+                    if len(pckt) > 7:
+                        self.logger.warning('[CRC error]: is {:0{plen}X}, calc {:0{plen}X}'.format(chk, calc, plen=PEC_LEN*2))
+                        self.logger.warning('[CRC error]: packet discarded: {}'.format(pckt.hex().upper()))
+                    else:
+                        self.logger.warning('INVALID packet -- too short: {}'.format(pckt.hex().upper()))
+                    continue
 
             pckt_decoded = self.unpack_pus(pckt)
             if pckt_decoded == (None, None, None):
@@ -1224,7 +1735,6 @@ class DatapoolManager:
             processor(pckt_decoded, pckt)
 
     def db_bulk_insert(self, filename, processor, bulk_insert_size=1000, brute=False, checkcrc=True, protocol='PUS'):
-        buf = open(filename, 'rb')
         self.trashbytes[filename] = 0
 
         pcktcount = 0
@@ -1233,44 +1743,51 @@ class DatapoolManager:
         new_session.execute('set unique_checks=0,foreign_key_checks=0')
 
         if protocol == 'PUS':
-            buf = buf.read()
+            # the dump is memory-mapped and only the packets of the current batch are copied
             if brute:
-                pckts = self.extract_pus_brute_search(buf, filename=filename)
+                pckts = PusStream(filename, validate=True, sync=cfl.packet_sync())
+                self.trashbytes[filename] += pckts.skipped
                 checkcrc = False  # CRC already performed during brute_search
 
             else:
-                pckts = self.extract_pus(buf)
+                pckts = PusStream(filename, partial=True)
 
-            pcktdicts = []
-            for pckt in pckts:
+            with pckts:
                 if checkcrc:
-                    if self.crc_check(pckt):
-                        if self.pecmode == 'warn':
-                            if len(pckt) > 7:
-                                self.logger.info('db_bulk_insert: [CRC error]: packet with seq nr ' + str(
-                                    int(pckt[5:7].hex(), 16)) + '\n')
-                            else:
-                                self.logger.info('INVALID packet -- too short' + '\n')
-                        elif self.pecmode == 'discard':
-                            if len(pckt) > 7:
-                                self.logger.info(
-                                    '[CRC error]: packet with seq nr ' + str(
-                                        int(pckt[5:7].hex(), 16)) + ' (discarded)\n')
-                            else:
-                                self.logger.info('INVALID packet -- too short' + '\n')
-                            continue
+                    crc_ok = pckts.crc_valid()
+
+                pcktdicts = []
+                for i, pckt in enumerate(pckts):
+                    pckt = bytes(pckt)
+                    if checkcrc:
+                        if not crc_ok[i]:
+                            if self.pecmode == 'warn':
+                                if len(pckt) > 7:
+                                    self.logger.info('db_bulk_insert: [CRC error]: packet with seq nr ' + str(
+                                        int(pckt[5:7].hex(), 16)) + '\n')
+                                else:
+                                    self.logger.info('INVALID packet -- too short' + '\n')
+                            elif self.pecmode == 'discard':
+                                if len(pckt) > 7:
+                                    self.logger.info(
+                                        '[CRC error]: packet with seq nr ' + str(
+                                            int(pckt[5:7].hex(), 16)) + ' (discarded)\n')
+                                else:
+                                    self.logger.info('INVALID packet -- too short' + '\n')
+                                continue
 
-                pcktdicts.append(processor(self.unpack_pus(pckt), pckt))
-                pcktcount += 1
-                if pcktcount % bulk_insert_size == 0:
-                    new_session.execute(DbTelemetry.__table__.insert(), pcktdicts)
-                    # new_session.bulk_insert_mappings(DbTelemetry, pcktdicts)
-                    pcktdicts = []
+                    pcktdicts.append(processor(self.unpack_pus(pckt), pckt))
+                    pcktcount += 1
+                    if pcktcount % bulk_insert_size == 0:
+                        new_session.execute(DbTelemetry.__table__.insert(), pcktdicts)
+                        # new_session.bulk_insert_mappings(DbTelemetry, pcktdicts)
+                        pcktdicts = []
 
-            new_session.execute(DbTelemetry.__table__.insert(), pcktdicts)
+                new_session.execute(DbTelemetry.__table__.insert(), pcktdicts)
 
         elif protocol == 'SPW':
-            headers, pckts, remainder = self.extract_spw(buf)
+            with open(filename, 'rb') as buf:
+                headers, pckts, remainder = self.extract_spw(buf)
 
             pcktdicts_rmap = []
             pcktdicts_feedata = []
@@ -1493,7 +2010,7 @@ class DatapoolManager:
                             stc=tm.SERV_TYPE,
                             sst=tm.SERV_SUB_TYPE,
                             destID=tm.DEST_ID if tm.PKT_TYPE == 0 else tm.SOURCE_ID,
-                            timestamp=self.cuc_time_str(tm),
+                            **cfl.cuc_time_columns(tm, logger=self.logger),
                             data=tmd[1][:MAX_PKT_LEN],
                             raw=tm_raw[:MAX_PKT_LEN])
 
@@ -1633,7 +2150,7 @@ class DatapoolManager:
         new_session.commit()
         self.trashbytes[pool_name] = 0
         self.state[pool_name] = 1
-        self.last_commit_time = time.time()
+        self._get_pool_stats(self.pool_rows[pool_name], reset=True)
 
         pkt_size_stream = b''
         while True:
@@ -1641,7 +2158,7 @@ class DatapoolManager:
                 break
             try:
                 if self.connections[pool_name]['paused']:
-                    new_session.commit()
+                    self.ingestor.flush()
                     new_session.close()
                     self.logger.info('Paused recording from ' + str(host) + ':' + str(port))
                     return
@@ -1667,7 +2184,6 @@ class DatapoolManager:
 
             except socket.timeout as e:
                 self.logger.info('Socket timeout')
-                new_session.commit()
                 continue
             except socket.error as e:
                 self.logger.error('Socket error: ' + str(e))
@@ -1679,7 +2195,7 @@ class DatapoolManager:
                 self.logger.error('Lost connection...')
                 self.connections[pool_name]['recording'] = False
                 break
-        self.session_factory_storage.commit()
+        self.ingestor.flush()
 
     def read_spw_from_socket(self, sockfd, pkt_size_stream):
         while len(pkt_size_stream) < 2:
@@ -1739,13 +2255,12 @@ class DatapoolManager:
         return pid, header, buf, pkt_size_stream
 
     def process_rmap(self, header, raw, pool_name, pool_row=None, db_insert=True):
-        dbsession = self.session_factory_storage
         pkt = header.bits
         if pool_row is not None:
             pool_id = pool_row.iid
         else:
             pool_id = self.pool_rows[pool_name].iid
-        newdbrow = RMapTelemetry(
+        newdbrow = dict(
             pool_id=pool_id,
             idx=self.state[pool_name],
             cmd=pkt.PKT_TYPE,
@@ -1761,19 +2276,15 @@ class DatapoolManager:
 
         if not db_insert:
             self.state[pool_name] += 1
-            return newdbrow
+            return RMapTelemetry(**newdbrow)
 
-        dbsession.add(newdbrow)
+        self.ingestor.put(RMapTelemetry.__table__, newdbrow)
         self.state[pool_name] += 1
-        self.logger.debug('feed: {}'.format(newdbrow.raw.hex()))
-        now = time.time()
-        if (now - self.last_commit_time) > self.commit_interval:
-            dbsession.commit()
-            self.last_commit_time = now
+        self.logger.debug('feed: {}'.format(raw.hex()))
 
     def process_feedata(self, header, raw, pool_name):
         pkt = header.bits
-        newdbrow = FEEDataTelemetry(
+        newdbrow = dict(
             pool_id=self.pool_rows[pool_name].iid,
             idx=self.state[pool_name],
             pktlen=pkt.DATA_LEN,
@@ -1782,12 +2293,8 @@ class DatapoolManager:
             seqcnt=pkt.SEQ_CNT,
             raw=raw)
 
-        self.session_factory_storage.add(newdbrow)
+        self.ingestor.put(FEEDataTelemetry.__table__, newdbrow)
         self.state[pool_name] += 1
-        now = time.time()
-        if (now - self.last_commit_time) > self.commit_interval:
-            self.session_factory_storage.commit()
-            self.last_commit_time = now
 
     def crc_check_rmap(self, pckt):
         # if isinstance(pckt, (BitArray, BitStream, Bits, ConstBitStream)):
@@ -1913,6 +2420,14 @@ class DatapoolManager:
         #if cfl.is_open('poolviewer', cfl.communication['poolviewer']):
         #    self.small_refresh_function()
 
+        # write any pending rows before quitting
+        self.ingestor.stop()
+
+        if self.live_server is not None:
+            self.live_server.shutdown()
+            self.live_server.server_close()
+            os.remove(cfl.LIVE_RING_SOCKET)
+
         try:
             self.update_all_connections_quit()
         except:
@@ -2155,6 +2670,8 @@ class PUSDatapoolManagerGUI(Gtk.ApplicationWindow):
 
         self.model_in = Gtk.ListStore(str, object)
         tree_in.set_model(self.model_in)
+        tree_in.set_has_tooltip(True)
+        tree_in.connect('query-tooltip', self._connection_tooltip)
         box.pack_start(scrolled_view, 1, 1, 0)
 
         connect_in.connect('clicked', self.connect_incoming, labelbox, tmbut, hostbox, portbox, optionbox)
@@ -2231,6 +2748,21 @@ class PUSDatapoolManagerGUI(Gtk.ApplicationWindow):
     def get_active_pool_name(self):
         return self.pool_selector.get_active_text()
 
+    def _connection_tooltip(self, widget, x, y, keyboard_mode, tooltip):
+        is_row, x, y, model, path, treeiter = widget.get_tooltip_context(x, y, keyboard_mode)
+        if not is_row:
+            return False
+
+        pool_name = model[treeiter][0].split(' [')[0]
+        stats = self.pm.get_pool_stats(pool_name)
+        if stats is None:
+            return False
+
+        tooltip.set_text('Packets: {} | Last idx: {} | Trash: {} B'.format(stats['rows'], stats['max_idx'],
+                                                                          stats['trashbytes']))
+        widget.set_tooltip_row(tooltip, path)
+        return True
+
     def connect_incoming(self, widget, labelbox, tmbut, hostbox, portbox, optionbox):
         try:
             tmcon = tmbut.get_active()
@@ -0,0 +1,613 @@
+"""
+Framing of PUS packet streams
+
+The packet length fields of a stream are walked once to build an index of packet offsets and lengths. Dump files are
+memory-mapped and packets are handed out as memoryview slices of the mapped data, so nothing is copied and memory use
+does not depend on the size of the dump.
+
+Packet error control is verified in bulk with :func:`crc_valid`. Streams with corrupt data can be indexed with
+:func:`index_packets_crc`, which only tries to resynchronise at offsets with a plausible packet header, as defined by a
+:class:`PacketSync`. The same criteria are used by :class:`PacketFramer` to frame streams received from a socket. While
+a stream is in sync, packets are only checked for their length and CRC, so that valid packets with e.g. an APID unknown
+to the :class:`PacketSync` are not discarded.
+
+This module only depends on the standard library and NumPy, so it can be used by the stand-alone tools as well.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from binascii import crc_hqx
+from collections import deque
+
+import numpy as np
+
+PUS_HEADER_LEN = 6
+PKT_LEN_OFFSET = 4
+PUS_MAX_PKT_LEN = PUS_HEADER_LEN + 65536
+IDLE_APID = 0x7FF
+CRC_INIT = 0xFFFF  # CRC-16/CCITT-FALSE, as used for the PUS packet error control
+RESYNC_WINDOW = 65536  # number of bytes searched for plausible headers at once
+WALK_CHUNK = 1 << 22  # maximum number of bytes walked and verified at once
+
+_pkt_len = struct.Struct('>H')
+
+
+def index_packets(buf, start=0, end=None, check=None, partial=False):
+    """
+    Walk the packet length fields of a PUS stream and return the offsets and lengths of the packets in it
+
+    :param buf: bytes-like object holding the stream
+    :param start: offset of the first packet in _buf_
+    :param end: end of the stream in _buf_, defaults to the end of _buf_
+    :param check: function called with each packet (as memoryview), a true return value marks the packet as corrupt
+                  (e.g. *crc_check*), in which case the search continues at the next byte
+    :param partial: include an incomplete packet at the end of the stream, truncated to the available data. With
+                    _check_, the remainder is included if it passes the check.
+    :return: tuple of offsets, lengths (int64 arrays) and the number of bytes skipped because of failed checks
+    """
+    buf = memoryview(buf)
+    if end is None:
+        end = len(buf)
+
+    offsets = array('q')
+    lengths = array('q')
+    unpack = _pkt_len.unpack_from
+    skipped = 0
+    pos = start
+
+    while pos < end:
+        if pos + PUS_HEADER_LEN <= end:
+            # packet size is header size (6) + pus size field + 1
+            size = unpack(buf, pos + PKT_LEN_OFFSET)[0] + 7
+        else:
+            size = end - pos + 1
+
+        if pos + size > end:
+            if check is not None:
+                # the truncated remainder is only accepted if it passes the check
+                if check(buf[pos:end]):
+                    pos += 1
+                    skipped += 1
+                    continue
+                partial = True
+            if partial:
+                offsets.append(pos)
+                lengths.append(end - pos)
+            break
+
+        if check is not None and check(buf[pos:pos + size]):
+            pos += 1
+            skipped += 1
+            continue
+
+        offsets.append(pos)
+        lengths.append(size)
+        pos += size
+
+    return np.frombuffer(offsets, dtype=np.int64), np.frombuffer(lengths, dtype=np.int64), skipped
+
+
+def crc_valid(buf, offsets, lengths):
+    """
+    Verify the CRC-16/CCITT-FALSE packet error control of many packets at once
+
+    The CRC is computed over each packet including its PEC with the table-driven routine of the standard library,
+    packets are valid if the result is zero.
+
+    :param buf: bytes-like object holding the packets
+    :param offsets: packet offsets in _buf_
+    :param lengths: packet lengths
+    :return: boolean array, True for packets with valid CRC
+    """
+    buf = memoryview(buf)
+    return np.fromiter((not crc_hqx(buf[off:off + size], CRC_INIT) for off, size in zip(offsets.tolist(), lengths.tolist())),
+                       dtype=bool, count=len(offsets))
+
+
+def plausible_headers(buf, start=0, end=None, apids=None, max_len=PUS_MAX_PKT_LEN, min_len=None, pkt_types=None,
+                      fit=True):
+    """
+    Find the offsets at which a plausible PUS packet starts: version number 0, APID in _apids_, packet type in
+    _pkt_types_ and a packet length between _min_len_ and _max_len_ that does not exceed the end of the stream
+
+    :param buf: bytes-like object holding the stream
+    :param start: first offset to consider
+    :param end: end of the stream in _buf_, defaults to the end of _buf_
+    :param apids: collection of valid APIDs, any APID is accepted if None
+    :param max_len: maximum packet length in bytes
+    :param min_len: minimum packet length in bytes, not checked if None
+    :param pkt_types: collection of valid packet types (0: TM, 1: TC), both are accepted if None
+    :param fit: only return packets that end within the stream
+    :return: array of offsets in _buf_
+    """
+    if end is None:
+        end = len(buf)
+
+    n = end - start - PUS_HEADER_LEN + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    data = np.frombuffer(buf, dtype=np.uint8, count=end - start, offset=start)
+    pktlen = ((data[PKT_LEN_OFFSET:PKT_LEN_OFFSET + n].astype(np.int64) << 8) | data[PKT_LEN_OFFSET + 1:PKT_LEN_OFFSET + 1 + n]) + 7
+
+    ok = (data[:n] >> 5) == 0
+    ok &= pktlen <= max_len
+    if min_len is not None:
+        ok &= pktlen >= min_len
+    if fit:
+        ok &= np.arange(n) + pktlen <= end - start
+
+    if pkt_types is not None:
+        ok &= np.isin((data[:n] >> 4) & 1, np.asarray(list(pkt_types), dtype=np.uint8))
+
+    if apids is not None:
+        apid = ((data[:n].astype(np.int64) & 0x7) << 8) | data[1:n + 1]
+        ok &= np.isin(apid, np.asarray(list(apids), dtype=np.int64))
+
+    return np.flatnonzero(ok) + start
+
+
+class PacketSync:
+    """
+    Criteria for plausible PUS packet headers, used to resynchronise a stream after corrupt data. Resynchronisation
+    only considers offsets with a plausible header (see :func:`plausible_headers`), instead of trying every byte. While
+    in sync, packets are only checked against _max_len_ (see :meth:`length_ok`).
+
+    Gaps in the stream, i.e. the ranges of bytes that have been skipped, are recorded in :attr:`gaps` as (start, end)
+    tuples, _on_gap_ is called with start and end of every gap.
+
+    :param apids: collection of valid APIDs, e.g. the APIDs defined in the MIB, any APID is accepted if None
+    :param max_len: maximum packet length in bytes
+    :param min_len: minimum packet length in bytes, not checked if None
+    :param pkt_types: collection of valid packet types (0: TM, 1: TC), both are accepted if None
+    :param check_crc: a packet found when resynchronising must have a valid CRC
+    :param check_next: a packet found when resynchronising must be followed by a plausible header or the end of the
+                       stream
+    :param on_gap: function called with start and end offset of each gap
+    :param max_gaps: number of gaps kept in :attr:`gaps`, all if None
+    """
+
+    def __init__(self, apids=None, max_len=PUS_MAX_PKT_LEN, min_len=None, pkt_types=None, check_crc=True,
+                 check_next=False, on_gap=None, max_gaps=None):
+        self.apids = None if apids is None else np.asarray(sorted(apids), dtype=np.int64)
+        self.max_len = max_len
+        self.min_len = min_len
+        self.pkt_types = None if pkt_types is None else np.asarray(list(pkt_types), dtype=np.uint8)
+        self.check_crc = check_crc
+        self.check_next = check_next
+        self.on_gap = on_gap
+        self.gaps = deque(maxlen=max_gaps)
+
+        self._apid_set = None if apids is None else set(self.apids.tolist())
+        self._type_set = None if pkt_types is None else set(self.pkt_types.tolist())
+
+    def length_ok(self, buf, pos):
+        """
+        Check the packet length at _pos_, which is all that is checked (besides the CRC) while the stream is in sync
+
+        :param buf: bytes-like object holding the stream
+        :param pos: offset of the header, there must be at least PUS_HEADER_LEN bytes available
+        :return: packet length if it does not exceed _max_len_, else 0
+        """
+        size = _pkt_len.unpack_from(buf, pos + PKT_LEN_OFFSET)[0] + 7
+        return size if size <= self.max_len else 0
+
+    def lengths_ok(self, lengths):
+        """
+        Vectorised version of :meth:`length_ok` for indexed packets
+
+        :param lengths: packet lengths
+        :return: boolean array, True for packets not exceeding _max_len_
+        """
+        return lengths <= self.max_len
+
+    def header_ok(self, buf, pos):
+        """
+        Check whether the packet header at _pos_ is plausible
+
+        :param buf: bytes-like object holding the stream
+        :param pos: offset of the header, there must be at least PUS_HEADER_LEN bytes available
+        :return: packet length if the header is plausible, else 0
+        """
+        b0 = buf[pos]
+        if b0 >> 5:
+            return 0
+        if self._type_set is not None and (b0 >> 4) & 1 not in self._type_set:
+            return 0
+        if self._apid_set is not None and ((b0 & 0x7) << 8) | buf[pos + 1] not in self._apid_set:
+            return 0
+        size = _pkt_len.unpack_from(buf, pos + PKT_LEN_OFFSET)[0] + 7
+        if size > self.max_len or (self.min_len is not None and size < self.min_len):
+            return 0
+        return size
+
+    def headers_ok(self, buf, offsets, lengths):
+        """
+        Vectorised version of :meth:`header_ok` for indexed packets
+
+        :param buf: bytes-like object holding the stream
+        :param offsets: packet offsets in _buf_
+        :param lengths: packet lengths
+        :return: boolean array, True for packets with plausible header
+        """
+        data = np.frombuffer(buf, dtype=np.uint8)
+        b0 = data[offsets]
+        ok = (b0 >> 5) == 0
+        ok &= lengths <= self.max_len
+        if self.min_len is not None:
+            ok &= lengths >= self.min_len
+        if self.pkt_types is not None:
+            ok &= np.isin((b0 >> 4) & 1, self.pkt_types)
+        if self.apids is not None:
+            ok &= np.isin(((b0.astype(np.int64) & 0x7) << 8) | data[offsets + 1], self.apids)
+        return ok
+
+    def candidates(self, buf, start, end, fit=True):
+        """
+        Offsets with a plausible header in _buf_[_start_:_end_], see :func:`plausible_headers`
+
+        :return: array of offsets in _buf_
+        """
+        return plausible_headers(buf, start, end, apids=self.apids, max_len=self.max_len, min_len=self.min_len,
+                                 pkt_types=self.pkt_types, fit=fit)
+
+    def find(self, buf, start, end, final=True):
+        """
+        Find the offset at which the stream continues after corrupt data, i.e. the next plausible header that also passes
+        the CRC and next-header checks, if enabled
+
+        If not _final_, more data may follow _end_. A candidate that cannot be verified yet is then returned as
+        incomplete, so that the search can be repeated once more data are available.
+
+        :param buf: bytes-like object holding the stream
+        :param start: first offset to consider
+        :param end: end of the available data in _buf_
+        :param final: no more data follow _end_
+        :return: tuple of the offset up to which the data can be discarded and whether a verified packet starts there.
+                 If the search is exhausted, the offset is _end_ if _final_, else the last offset at which a header may
+                 still start.
+        """
+        buf = memoryview(buf)
+        pos = start
+
+        while pos < end:
+            # if final, the window is extended by max_len so that packets starting in it are not discarded as
+            # incomplete
+            wend = min(pos + RESYNC_WINDOW + PUS_HEADER_LEN + (self.max_len if final else 0), end)
+            for cand in self.candidates(buf, pos, wend, fit=final).tolist():
+                if cand >= pos + RESYNC_WINDOW:
+                    break
+                size = _pkt_len.unpack_from(buf, cand + PKT_LEN_OFFSET)[0] + 7
+                nxt = cand + size
+                if nxt > end:
+                    # only possible if not final
+                    return cand, False
+                if self.check_crc and crc_hqx(buf[cand:nxt], CRC_INIT):
+                    continue
+                if self.check_next:
+                    if nxt + PUS_HEADER_LEN <= end:
+                        if not self.header_ok(buf, nxt):
+                            continue
+                    elif not final:
+                        return cand, False
+                return cand, True
+            pos += RESYNC_WINDOW
+
+        if final:
+            return end, True
+        return max(start, end - PUS_HEADER_LEN + 1), False
+
+    def add_gap(self, start, end):
+        """
+        Record a gap in the stream
+
+        :param start: offset of the first skipped byte
+        :param end: offset of the first byte after the gap
+        """
+        self.gaps.append((start, end))
+        if self.on_gap is not None:
+            self.on_gap(start, end)
+
+
+def index_packets_crc(buf, start=0, end=None, apids=None, max_len=PUS_MAX_PKT_LEN, sync=None):
+    """
+    Index a PUS stream, keeping only packets that pass the CRC check and do not exceed the maximum length. The stream is
+    walked along the length fields and verified in bulk; after corrupt data, the walk resumes where
+    :meth:`PacketSync.find` resynchronises at a plausible header. The skipped ranges are recorded as gaps of _sync_.
+
+    :param buf: bytes-like object holding the stream
+    :param start: offset of the first packet in _buf_
+    :param end: end of the stream in _buf_, defaults to the end of _buf_
+    :param apids: collection of valid APIDs, any APID is accepted if None; ignored if _sync_ is given
+    :param max_len: maximum packet length in bytes; ignored if _sync_ is given
+    :param sync: :class:`PacketSync` with the header criteria
+    :return: tuple of offsets, lengths (int64 arrays) and the number of bytes skipped
+    """
+    buf = memoryview(buf)
+    if end is None:
+        end = len(buf)
+
+    if sync is None:
+        sync = PacketSync(apids=apids, max_len=max_len)
+
+    offsets = []
+    lengths = []
+    skipped = 0
+    pos = start
+
+    # walk and verify the stream in chunks, which grow while the data are clean, so that corrupt data only cause
+    # a small part of the stream to be verified again
+    min_chunk = 2 * max(sync.max_len, RESYNC_WINDOW)
+    chunk = min_chunk
+
+    while pos < end:
+        chunk_end = min(pos + chunk, end)
+        offs, lens, _ = index_packets(buf, start=pos, end=chunk_end)
+
+        if len(offs):
+            ok = crc_valid(buf, offs, lens)
+            ok &= sync.lengths_ok(lens)
+            nvalid = len(ok) if ok.all() else int(np.argmin(ok))
+        else:
+            nvalid = 0
+
+        offsets.append(offs[:nvalid])
+        lengths.append(lens[:nvalid])
+
+        if nvalid == len(offs):
+            pos = pos if nvalid == 0 else int(offs[-1] + lens[-1])
+            if chunk_end < end or pos == end:
+                chunk = min(2 * chunk, max(WALK_CHUNK, 2 * PUS_MAX_PKT_LEN))
+                continue
+            # the packet at pos exceeds the end of the stream
+            bad = pos
+        else:
+            bad = int(offs[nvalid])
+
+        resume, _ = sync.find(buf, bad + 1, end)
+        sync.add_gap(bad, resume)
+        skipped += resume - bad
+        pos = resume
+        chunk = min_chunk
+
+    return np.concatenate(offsets or [np.zeros(0, dtype=np.int64)]), \
+        np.concatenate(lengths or [np.zeros(0, dtype=np.int64)]), skipped
+
+
+class PacketFramer:
+    """
+    Incremental framing of a PUS stream that arrives in arbitrary chunks, e.g. from a socket
+
+    While in sync, packets are framed along their length fields and only their length is checked. If _strict_, their
+    CRC must be valid as well. On a failed check, the framer resynchronises with :meth:`PacketSync.find`, buffering only
+    as much data as needed to verify a candidate packet. Gap offsets are counted from the start of the stream.
+
+    :param sync: :class:`PacketSync` with the header criteria
+    :param strict: verify the CRC of every packet
+    """
+
+    def __init__(self, sync=None, strict=False):
+        self.sync = sync if sync is not None else PacketSync()
+        self.strict = strict
+        self.skipped = 0
+
+        self._buf = bytearray()
+        self._offset = 0  # stream offset of _buf[0]
+        self._gap_start = None  # stream offset at which the current gap started, None while in sync
+        self._counted = 0  # stream offset up to which skipped bytes have been counted
+
+    def __len__(self):
+        """
+        Number of buffered bytes not yet returned as packets
+        """
+        return len(self._buf)
+
+    @property
+    def in_sync(self):
+        """
+        False while searching for the next packet after corrupt data
+        """
+        return self._gap_start is None
+
+    @property
+    def buffered(self):
+        """
+        Data not yet returned as packets
+        """
+        return bytes(self._buf)
+
+    def feed(self, data):
+        """
+        Add data to the stream and return the packets completed by it
+
+        :param data: bytes-like object
+        :return: list of packets (bytes)
+        """
+        self._buf += data
+        buf = self._buf
+        end = len(buf)
+        pos = 0
+        pckts = []
+
+        while end - pos >= PUS_HEADER_LEN:
+            if self._gap_start is None:
+                size = self.sync.length_ok(buf, pos)
+                if size:
+                    if pos + size > end:
+                        break
+                    if not (self.strict and crc_hqx(buf[pos:pos + size], CRC_INIT)):
+                        pckts.append(bytes(buf[pos:pos + size]))
+                        pos += size
+                        continue
+                self._gap_start = self._offset + pos
+                pos += 1
+
+            resume, found = self.sync.find(buf, pos, end, final=False)
+            pos = resume
+            if not found:
+                break
+            self._close_gap(pos)
+
+        if self._gap_start is not None:
+            self._count_skipped(pos)
+        del buf[:pos]
+        self._offset += pos
+        return pckts
+
+    def push_back(self, data):
+        """
+        Put data in front of the buffered stream, e.g. packets that could not be processed and have to be returned by
+        the next call of :meth:`feed` again
+
+        :param data: bytes-like object
+        """
+        self._buf[:0] = data
+        self._offset -= len(data)
+
+    def flush(self):
+        """
+        Discard the buffered data, e.g. when the connection is closed, and close an open gap
+
+        :return: number of bytes discarded
+        """
+        n = len(self._buf)
+        if n and self._gap_start is None:
+            self._gap_start = self._offset
+        if self._gap_start is not None:
+            self._close_gap(n)
+        del self._buf[:]
+        self._offset += n
+        return n
+
+    def _count_skipped(self, pos):
+        # count the bytes of the current gap up to pos, which have not been counted yet
+        stop = self._offset + pos
+        self.skipped += stop - max(self._gap_start, self._counted)
+        self._counted = stop
+
+    def _close_gap(self, pos):
+        self._count_skipped(pos)
+        self.sync.add_gap(self._gap_start, self._offset + pos)
+        self._gap_start = None
+
+
+class PusStream:
+    """
+    Indexed PUS packet stream
+
+    Indexing and iteration return memoryview slices of the underlying data, which stay valid as long as they are
+    referenced, even after the stream has been closed.
+
+    :param source: path of a dump file, which is memory-mapped, or a bytes-like object
+    :param check: see :func:`index_packets`
+    :param partial: see :func:`index_packets`
+    :param validate: only index packets with plausible header and valid CRC, see :func:`index_packets_crc`
+    :param apids: valid APIDs if _validate_ is set
+    :param max_len: maximum packet length if _validate_ is set
+    :param sync: :class:`PacketSync` used if _validate_ is set, instead of one made from _apids_ and _max_len_
+    """
+
+    def __init__(self, source, check=None, partial=False, validate=False, apids=None, max_len=PUS_MAX_PKT_LEN,
+                 sync=None):
+        self._mmap = None
+
+        if isinstance(source, (str, os.PathLike)):
+            self.filename = source
+            with open(source, 'rb') as fd:
+                # empty files cannot be mapped
+                if os.fstat(fd.fileno()).st_size:
+                    self._mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buf = memoryview(self._mmap if self._mmap is not None else b'')
+        else:
+            self.filename = None
+            self.buf = memoryview(source)
+
+        if validate:
+            self.sync = sync if sync is not None else PacketSync(apids=apids, max_len=max_len)
+            self.offsets, self.lengths, self.skipped = index_packets_crc(self.buf, sync=self.sync)
+        else:
+            self.sync = None
+            self.offsets, self.lengths, self.skipped = index_packets(self.buf, check=check, partial=partial)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        off = int(self.offsets[i])
+        return self.buf[off:off + int(self.lengths[i])]
+
+    def __iter__(self):
+        buf = self.buf
+        for off, size in zip(self.offsets.tolist(), self.lengths.tolist()):
+            yield buf[off:off + size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def gaps(self):
+        """
+        (start, end) offsets of the corrupt data skipped when indexing with _validate_
+        """
+        return list(self.sync.gaps) if self.sync is not None else []
+
+    @property
+    def size(self):
+        """
+        Total number of bytes in the stream
+        """
+        return len(self.buf)
+
+    def crc_valid(self):
+        """
+        Verify the packet error control of all packets, see :func:`crc_valid`
+
+        :return: boolean array, True for packets with valid CRC
+        """
+        return crc_valid(self.buf, self.offsets, self.lengths)
+
+    def select(self, mask):
+        """
+        Return the packets selected by a boolean mask or index array over the packet index
+
+        :param mask:
+        :return: list of memoryviews
+        """
+        buf = self.buf
+        return [buf[off:off + size] for off, size in zip(self.offsets[mask].tolist(), self.lengths[mask].tolist())]
+
+    def header_field(self, offset, dtype='u1'):
+        """
+        Return a header field of all packets as array, e.g. ``header_field(7)`` for the service type of TM packets
+
+        :param offset: byte offset of the field in the packet
+        :param dtype: NumPy dtype of the field, use big-endian types (e.g. '>u2') for multi-byte fields
+        :return: array with one entry per packet
+        """
+        dtype = np.dtype(dtype)
+        data = np.frombuffer(self.buf, dtype=np.uint8)
+        valid = self.lengths >= offset + dtype.itemsize
+        field = np.zeros(len(self), dtype=dtype)
+        idx = self.offsets[valid, None] + offset + np.arange(dtype.itemsize)
+        field[valid] = data[idx].copy().view(dtype).ravel()
+        return field
+
+    def close(self):
+        """
+        Release the mapped file. If packets handed out are still referenced, the mapping is released once they are gone.
+        """
+        try:
+            self.buf.release()
+        except BufferError:
+            pass
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
@@ -0,0 +1,345 @@
+"""
+Tests for ccs_function_lib, with the MIB replaced by in-memory tables
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('CCS_HEADLESS', '1')
+import ccs_function_lib as cfl
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class FakeMib:
+    """
+    MIB session serving the queries of ccs_function_lib from a dict of tables, each a list of row tuples
+    """
+
+    def __init__(self, tables, schema='mib'):
+        self.tables = tables
+        self.schema = schema
+        self.queries = []
+
+    def execute(self, que):
+        self.queries.append(que)
+        if que == 'SELECT DATABASE()':
+            return FakeResult([(self.schema,)])
+        if que.startswith('CHECKSUM TABLE'):
+            return FakeResult([('{}.{}'.format(self.schema, table), self._checksum(table))
+                               for table in que[len('CHECKSUM TABLE '):].split(',')])
+        table = re.search(r'FROM (\w+)', que).group(1)
+        if table not in self.tables:
+            raise cfl.SQLProgrammingError(que, None, Exception('no such table'))
+        return FakeResult(self.tables[table])
+
+    def _checksum(self, table):
+        if table not in self.tables:
+            return None
+        return zlib.crc32(repr(self.tables[table]).encode())
+
+    def close(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def mib(monkeypatch):
+    tables = {
+        'pcf': [('PAR_CAL', 3, 4, 'N', 'CAP1'), ('PAR_POL', 3, 4, 'N', 'MCF1'), ('PAR_TXT', 3, 4, 'S', 'TXP1')],
+        'cap': [('CAP1', '0', '0'), ('CAP1', '10', '100')],
+        'txp': [('TXP1', '0', 'OFF'), ('TXP1', '1', 'ON')],
+        'mcf': [('MCF1', 1., 2., None, None, None)],
+        'cpc': [('DPID_B',), ('DPID_A',)],
+    }
+    session = FakeMib(tables)
+    monkeypatch.setattr(cfl, 'scoped_session_idb', session)
+    cfl._reset_mib_caches()
+    yield session
+    cfl._reset_mib_caches()
+
+
+def test_mib_key_tracks_content(mib):
+    key = cfl.get_mib_key()
+    assert key[0] == 'mib'
+    assert [table for table, _ in key[1]] == ['mib.' + table for table in cfl.MIB_KEY_TABLES]
+
+    # same number of rows, changed value
+    mib.tables['cap'][1] = ('CAP1', '10', '200')
+    cfl._reset_mib_caches()
+    assert cfl.get_mib_key() != key
+
+    key = cfl.get_mib_key()
+    mib.tables['mcf'][0] = ('MCF1', 1., 3., None, None, None)
+    cfl._reset_mib_caches()
+    assert cfl.get_mib_key() != key
+
+
+def test_calibration_cache_reloaded_after_mib_change(mib, monkeypatch, tmp_path):
+    monkeypatch.setitem(cfl.cfg['ccs-database'], 'calibration_cache', str(tmp_path / 'cal.pickle'))
+
+    registry = cfl.get_calibration_registry()
+    assert registry.calibrate_num('PAR_CAL', 5) == pytest.approx(50)
+    assert registry.calibrate_num('PAR_POL', 2) == pytest.approx(5)
+    assert os.path.exists(tmp_path / 'cal.pickle')
+
+    # unchanged MIB, calibrations are loaded from the cache
+    cfl._reset_mib_caches()
+    nqueries = len(mib.queries)
+    cfl.get_calibration_registry()
+    assert not any(que.startswith('SELECT pcf_name') for que in mib.queries[nqueries:])
+
+    # edited in place
+    mib.tables['cap'][1] = ('CAP1', '10', '200')
+    mib.tables['mcf'][0] = ('MCF1', 1., 3., None, None, None)
+    cfl._reset_mib_caches()
+    registry = cfl.get_calibration_registry()
+    assert registry.calibrate_num('PAR_CAL', 5) == pytest.approx(100)
+    assert registry.calibrate_num('PAR_POL', 2) == pytest.approx(7)
+
+
+def test_calibrate_text(mib):
+    registry = cfl.get_calibration_registry()
+    assert registry.calibrate_text('PAR_TXT', 1) == 'ON'
+    assert np.isnan(registry.calibrate_num('PAR_CAL', 11))
+
+
+def test_data_pool_id_parameters_list(mib):
+    assert cfl.DATA_POOL_ID_PARAMETERS == ['DPID_B', 'DPID_A']
+    assert cfl.DATA_POOL_ID_PARAMETERS[0] == 'DPID_B'
+
+
+def test_mib_snapshot_reloaded_after_mib_change(mib, monkeypatch, tmp_path):
+    monkeypatch.setitem(cfl.cfg['ccs-database'], 'mib_snapshot', str(tmp_path / 'mib.pickle'))
+
+    assert cfl.get_data_pool_id_parameters() == ['DPID_B', 'DPID_A']
+
+    cfl._reset_mib_caches()
+    nqueries = len(mib.queries)
+    assert cfl.get_data_pool_id_parameters() == ['DPID_B', 'DPID_A']
+    assert not any('FROM cpc' in que for que in mib.queries[nqueries:])
+
+    # edited in place
+    mib.tables['cpc'][1] = ('DPID_C',)
+    cfl._reset_mib_caches()
+    assert cfl.get_data_pool_id_parameters() == ['DPID_B', 'DPID_C']
+
+
+
+def test_limits_soft_only():
+    table = cfl.LimitsTable([('SOFT', 'Soft', 'R', 'S', '0', '10'),
+                             ('BOTH', 'Both', 'I', 'S', '0', '10'), ('BOTH', 'Both', 'I', 'H', '-5', '15'),
+                             ('HARD', 'Hard', 'R', 'H', '1', '2')])
+
+    assert table.limits('SOFT') == ((0., 10.), (None, None))
+    assert table.limits('BOTH') == ((0, 10), (-5, 15))
+    assert table.limits_by_descr('Hard') == ((None, None), (1., 2.))
+    assert table.limits('NONE') == ((None, None), (None, None))
+
+
+def test_limit_violations_text_fallback(monkeypatch):
+    table = cfl.LimitsTable([('NUM', 'Num', 'R', 'H', '0', '10'), ('TXT', 'Txt', 'R', 'H', '0', '10')])
+    arrays = {'NUM': np.array([[1., 2., 3.], [5., 11., -1.]]),
+              # values that could not be converted to float in get_param_values
+              'TXT': np.array([(1., '5'), (2., '12'), (3., '7')], dtype='float, U32')}
+
+    monkeypatch.setattr(cfl, 'get_limits_table', lambda: table)
+    monkeypatch.setattr(cfl, 'get_pool_rows', lambda *args, **kwargs: FakeRows())
+    monkeypatch.setattr(cfl, 'get_param_values', lambda tmlist, param, **kwargs: (arrays[param], ('', '')))
+
+    violations = cfl.get_limit_violations('pool')
+
+    assert violations['NUM'][0].tolist() == [2., 3.]
+    assert violations['NUM'][2].tolist() == [2, 2]
+    assert violations['TXT'][0].tolist() == [2.]
+    assert violations['TXT'][1].tolist() == ['12']
+
+
+class FakeRows:
+    def yield_per(self, n):
+        return []
+
+
+class FakeParamMib:
+    """
+    MIB session answering the queries of get_param_values for a single uint16 parameter of TM(3,25)
+    """
+
+    def execute(self, que):
+        if 'pcf_categ' in que:
+            return FakeResult([('N', None)])
+        return FakeResult([('PAR', 1, cfl.TM_HEADER_LEN, 0, 3, 12, 'V', 'Par', 321, 3, 25, 'HK', 0)])
+
+    def close(self):
+        pass
+
+    def __call__(self):
+        return self
+
+
+def test_param_values_bulk_fallback(monkeypatch):
+    header = cfl.TMHeader()
+    header.bits.APID = 321
+    header.bits.SERV_TYPE = 3
+    header.bits.SERV_SUB_TYPE = 25
+    pkts = []
+    for i in range(3):
+        header.bits.CTIME = 100 + i
+        pkts.append(bytes(header.bin) + (10 * i).to_bytes(2, 'big') + bytes(2))
+
+    class ExtCalibrations:
+        @staticmethod
+        def calibrate_ext(values, descr):
+            raise ValueError('cannot calibrate')
+
+    monkeypatch.setattr(cfl, 'scoped_session_idb', FakeParamMib())
+    monkeypatch.setattr(cfl, 'get_calibration_registry', lambda: type('R', (), {'num_calibrator': lambda s, n: None})())
+    monkeypatch.setattr(cfl, 'get_ext_calibrations', lambda: ExtCalibrations)
+
+    arr, (descr, unit) = cfl.get_param_values(tmlist=pkts, param='PAR')
+
+    assert arr.shape == (3,)
+    assert arr['f0'].tolist() == [100., 101., 102.]
+    assert arr['f1'].tolist() == ['0', '10', '20']
+
+class FakeLink:
+    """
+    TC link recording the sent packets, with a live packet subscription that acknowledges them. Packets listed in
+    _fail_ (by order of sending) are rejected with TM(1,8), packets in _lose_ are not acknowledged at all.
+    """
+
+    def __init__(self, fail=(), lose=(), dead_after=None):
+        self.sent = []
+        self.fail = set(fail)
+        self.lose = set(lose)
+        self.dead_after = dead_after
+        self._acked = 0
+
+    def send(self, tc_bytes, pool_name='LIVE', pmgr_handle=None):
+        self.sent.append(bytes(tc_bytes))
+        return True
+
+    def subscription(self, pool_name, after=0, **kwargs):
+        link = self
+
+        class Subscription:
+            def __init__(self):
+                self.after = after
+
+            def get(self, timeout=0.):
+                return link.acks()
+
+            def close(self):
+                pass
+
+        return Subscription()
+
+    def acks(self):
+        header = cfl.TMHeader()
+        header.bits.SERV_TYPE = 1
+        acks = []
+        for n in range(self._acked, len(self.sent)):
+            if n in self.lose or (self.dead_after is not None and n >= self.dead_after):
+                continue
+            for sst in (1, 8) if n in self.fail else (1, 7):
+                header.bits.SERV_SUB_TYPE = sst
+                acks.append((n, bytes(header.bin) + self.sent[n][:4] + bytes(4)))
+        self._acked = len(self.sent)
+        return acks
+
+
+@pytest.fixture
+def link(monkeypatch):
+    link = FakeLink()
+    monkeypatch.setattr(cfl, '_get_upload_service_info', lambda tcname=None: (0x14C, None, '>BIH', b''))
+    monkeypatch.setattr(cfl, '_get_pmgr_handle', lambda *args, **kwargs: None)
+    monkeypatch.setattr(cfl, 'Tcsend_bytes', link.send)
+    monkeypatch.setattr(cfl, 'get_pool_stats', lambda pool_name: {'max_idx': 0})
+    monkeypatch.setattr(cfl, 'LivePacketSubscription', link.subscription)
+    monkeypatch.setattr(cfl.MemoryUpload, 'POLL_INTERVAL', 0.01)
+    return link
+
+
+def sent_slices(link):
+    # (address, data) of the sent S6,2 packets
+    return [(int.from_bytes(pkt[cfl.TC_HEADER_LEN + 1:cfl.TC_HEADER_LEN + 5], 'big'),
+             pkt[cfl.TC_HEADER_LEN + 7:-cfl.PEC_LEN]) for pkt in link.sent]
+
+
+def test_load_to_memory_fixed_period(link):
+    data = bytes(range(256)) * 20
+    dlen, dcrc = cfl.load_to_memory(data, 1, 0x1000, max_pkt_size=200, sleep=0, window=0, progress=False)
+
+    assert (dlen, dcrc) == (len(data), cfl.crc(data))
+    slices = sent_slices(link)
+    assert b''.join(sli for _, sli in slices) == data
+    assert [addr for addr, _ in slices] == list(range(0x1000, 0x1000 + len(data), len(slices[0][1])))
+
+
+def test_load_to_memory_retransmits(link, monkeypatch):
+    monkeypatch.setitem(cfl.cfg['ccs-misc'], 'upload_ack_timeout', '0.05')
+    link.fail = {3}
+    link.lose = {5}
+    data = bytes(range(256)) * 20
+
+    assert cfl.load_to_memory(data, 1, 0, max_pkt_size=200, window=4, progress=False) == (len(data), cfl.crc(data))
+    slices = sent_slices(link)
+    size = len(slices[0][1])
+    assert len(link.sent) == -(-len(data) // size) + 2
+    assert dict(slices) == {addr: data[addr:addr + size] for addr in range(0, len(data), size)}
+
+
+def test_load_to_memory_abort_and_resume(link, monkeypatch):
+    monkeypatch.setitem(cfl.cfg['ccs-misc'], 'upload_ack_timeout', '0.05')
+    link.dead_after = 10
+    data = bytes(range(256)) * 20
+
+    with pytest.raises(cfl.UploadAborted) as err:
+        cfl.load_to_memory(data, 1, 0, max_pkt_size=200, window=4, progress=False)
+    assert err.value.resume == 10
+    assert err.value.report['resume'] == 10
+
+    link.dead_after = None
+    link.sent.clear()
+    link._acked = 0
+    assert cfl.load_to_memory(data, 1, 0, max_pkt_size=200, window=4, start=err.value.resume,
+                              progress=False) == (len(data), cfl.crc(data))
+    assert sent_slices(link)[0][0] == 10 * len(sent_slices(link)[0][1])
+
+
+def test_upload_srec_termination_last(link, tmp_path):
+    lines = ['S3{:02X}{:08X}{}00'.format(21, 0x100 + 16 * i, bytes([i] * 16).hex().upper()) for i in range(40)]
+    fname = tmp_path / 'image.srec'
+    fname.write_text('\n'.join(['S0030000FC'] + lines + ['S70500000000FA']) + '\n')
+
+    dlen, dcrc = cfl.upload_srec(str(fname), 1, 0x2000, 7, max_pkt_size=100, window=8, progress=False)
+
+    segments = [sli for _, sli in sent_slices(link)]
+    assert segments[-1] == bytes(12)
+    assert dlen == sum(len(seg) for seg in segments[:-1])
+    assert dcrc == cfl.crc(b''.join(segments[:-1]))
+
+
+def test_srec_direct(link, tmp_path):
+    lines = ['S3{:02X}{:08X}{}00'.format(21, 0x100 + 16 * i, bytes([i] * 16).hex().upper()) for i in range(40)]
+    fname = tmp_path / 'image.srec'
+    fname.write_text('\n'.join(['S0030000FC'] + lines + ['S70500000000FA']) + '\n')
+
+    dlen, dcrc = cfl.srec_direct(str(fname), 1, max_pkt_size=100, window=8, progress=False)
+    data = b''.join(sli for _, sli in sent_slices(link))
+    assert (dlen, dcrc) == (len(data), cfl.crc(data))
+
+    # lines that do not fit in a packet end the upload prematurely
+    assert cfl.srec_direct(str(fname), 1, max_pkt_size=20, window=8, progress=False) is None
@@ -0,0 +1,97 @@
+"""
+Tests for the sample buffers and level-of-detail pyramids of the plotter
+"""
+
+import numpy as np
+import pytest
+
+from plot_series import LOD_FACTOR, MinMaxLOD, SeriesBuffer, extend_diff
+
+
+def test_extend_diff_first_chunk():
+    diff = SeriesBuffer()
+    extend_diff(diff, np.zeros(0), np.array([1., 2., 3.]), np.array([5., 7., 4.]))
+
+    assert diff.x.tolist() == [2., 3.]
+    assert diff.y.tolist() == [2., -3.]
+
+
+def test_extend_diff_chunks():
+    x = np.arange(100.)
+    y = np.random.default_rng(0).normal(size=100)
+    series = SeriesBuffer()
+    diff = SeriesBuffer()
+    lod = MinMaxLOD(diff)
+
+    for i in range(0, 100, 7):
+        ylast = series.y[-1:]
+        series.extend(x[i:i + 7], y[i:i + 7])
+        extend_diff(diff, ylast, x[i:i + 7], y[i:i + 7])
+        lod.update()
+
+    assert np.array_equal(diff.x, x[1:])
+    assert np.allclose(diff.y, np.diff(y))
+    assert len(lod) == 99
+
+
+def test_lod_keeps_extrema():
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=100000)
+    y[12345] = 100.
+    y[54321] = -100.
+    series = SeriesBuffer()
+    lod = MinMaxLOD(series)
+    for i in range(0, len(y), 3333):
+        series.extend(np.arange(i, min(i + 3333, len(y)), dtype=float), y[i:i + 3333])
+        lod.update()
+
+    xs, ys = lod.get(npix=500)
+    assert len(xs) <= 2000
+    assert ys.max() == 100. and ys.min() == -100.
+
+
+def lod_levels(lod):
+    return [(imin.values.tolist(), imax.values.tolist()) for imin, imax in zip(lod.imin, lod.imax)]
+
+
+@pytest.mark.parametrize('sizes', [(16, 4), (LOD_FACTOR ** 5, 200000 - LOD_FACTOR ** 5), (1, 3, 12, 48, 192, 1000),
+                                   (5,) * 100])
+def test_lod_incremental_matches_one_shot(sizes):
+    # levels that first appear during an update must be built from the start of the series
+    n = sum(sizes)
+    y = np.random.default_rng(2).normal(size=n)
+    y[2] = 50.
+    y[n // 3] = -50.
+    x = np.arange(n, dtype=float)
+
+    series = SeriesBuffer()
+    lod = MinMaxLOD(series)
+    i = 0
+    for size in sizes:
+        series.extend(x[i:i + size], y[i:i + size])
+        lod.update()
+        i += size
+
+    full = SeriesBuffer()
+    full.extend(x, y)
+    ref = MinMaxLOD(full)
+
+    assert lod_levels(lod) == lod_levels(ref)
+    assert lod.get(npix=500)[1].tolist() == ref.get(npix=500)[1].tolist()
+
+
+def test_lod_spike_across_new_level():
+    y = np.zeros(20)
+    y[2] = 1.
+    series = SeriesBuffer()
+    lod = MinMaxLOD(series)
+    series.extend(np.arange(16.), y[:16])
+    lod.update()
+    series.extend(np.arange(16., 20.), y[16:])
+    lod.update()
+
+    full = SeriesBuffer()
+    full.extend(np.arange(20.), y)
+    ref = MinMaxLOD(full)
+
+    assert lod.imax[1].values.tolist() == ref.imax[1].values.tolist() == [2, 16]
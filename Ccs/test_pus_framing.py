@@ -0,0 +1,138 @@
+"""
+Tests for the framing of PUS packet streams
+"""
+
+import random
+from binascii import crc_hqx
+
+import numpy as np
+import pytest
+
+from pus_framing import CRC_INIT, PacketFramer, PacketSync, PusStream, crc_valid, index_packets_crc, plausible_headers
+
+APIDS = {321, 2047}
+
+
+def mk_pkt(apid, size=20, seq=0, fill=0xAB):
+    head = bytes([0x08 | apid >> 8, apid & 0xFF, 0xC0 | (seq >> 8) & 0x3F, seq & 0xFF]) + (size - 7).to_bytes(2, 'big')
+    pkt = head + bytes([fill]) * (size - len(head) - 2)
+    return pkt + crc_hqx(pkt, CRC_INIT).to_bytes(2, 'big')
+
+
+def mk_stream(n, seed=0):
+    rnd = random.Random(seed)
+    return [mk_pkt(321, rnd.randrange(8, 300), seq=i, fill=rnd.randrange(256)) for i in range(n)]
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_unknown_apid_in_sync_framer(strict):
+    pkts = [mk_pkt(321), mk_pkt(999), mk_pkt(321)]
+    sync = PacketSync(apids=APIDS, max_len=1024)
+    framer = PacketFramer(sync, strict=strict)
+
+    assert framer.feed(b''.join(pkts)) == pkts
+    assert framer.skipped == 0
+    assert not sync.gaps
+
+
+def test_unknown_apid_in_sync_index():
+    pkts = [mk_pkt(321), mk_pkt(999), mk_pkt(321)]
+    stream = PusStream(b''.join(pkts), validate=True, sync=PacketSync(apids=APIDS, max_len=1024))
+
+    assert [bytes(p) for p in stream] == pkts
+    assert stream.skipped == 0
+    assert stream.gaps == []
+
+
+def test_resync_skips_unknown_apid():
+    # after corrupt data, only packets with a plausible header are accepted
+    pkts = [mk_pkt(321), mk_pkt(999), mk_pkt(321, seq=1)]
+    data = pkts[0][:-1] + b'\x00' + pkts[1] + pkts[2]
+    stream = PusStream(data, validate=True, sync=PacketSync(apids=APIDS, max_len=1024))
+
+    assert [bytes(p) for p in stream] == [pkts[2]]
+    assert stream.gaps == [(0, 40)]
+
+
+def test_max_len_in_sync():
+    pkts = [mk_pkt(321), mk_pkt(321, size=200), mk_pkt(321)]
+    offs, lens, skipped = index_packets_crc(b''.join(pkts), sync=PacketSync(max_len=100))
+
+    assert offs.tolist() == [0, 220]
+    assert skipped == 200
+
+
+@pytest.mark.parametrize('chunk', [1, 5, 7, 64, 1000])
+def test_framing_across_chunk_boundaries(chunk):
+    pkts = mk_stream(200)
+    data = b''.join(pkts)
+    framer = PacketFramer(PacketSync(apids=APIDS, max_len=1024), strict=True)
+
+    out = []
+    for i in range(0, len(data), chunk):
+        out += framer.feed(data[i:i + chunk])
+
+    assert out == pkts
+    assert len(framer) == 0
+    assert framer.skipped == 0
+
+
+@pytest.mark.parametrize('chunk', [1, 13, 256])
+def test_resync_across_chunk_boundaries(chunk):
+    pkts = mk_stream(50)
+    garbage = bytes(range(1, 40))
+    data = b''.join(pkts[:20]) + garbage + b''.join(pkts[20:])
+    sync = PacketSync(apids=APIDS, max_len=1024)
+    framer = PacketFramer(sync, strict=True)
+
+    out = []
+    for i in range(0, len(data), chunk):
+        out += framer.feed(data[i:i + chunk])
+    framer.flush()
+
+    start = sum(len(p) for p in pkts[:20])
+    assert out == pkts
+    assert list(sync.gaps) == [(start, start + len(garbage))]
+    assert framer.skipped == len(garbage)
+
+
+@pytest.mark.parametrize('validate', [False, True])
+def test_stream_from_file_closed(tmp_path, validate):
+    pkts = mk_stream(50, seed=3)
+    path = tmp_path / 'dump.bin'
+    path.write_bytes(b''.join(pkts))
+
+    with PusStream(str(path), partial=not validate, validate=validate,
+                   sync=PacketSync(apids=APIDS, max_len=1024)) as stream:
+        assert [bytes(p) for p in stream] == pkts
+
+    assert stream._mmap is None
+    with pytest.raises(ValueError):
+        len(stream.buf)
+
+
+def test_crc_valid_bulk():
+    pkts = mk_stream(20, seed=4)
+    bad = {3, 11, 19}
+    data = bytearray(b''.join(pkts))
+    offsets = np.cumsum([0] + [len(p) for p in pkts[:-1]])
+    for i in bad:
+        data[offsets[i] + 8] ^= 0x01
+
+    ok = crc_valid(data, offsets, np.array([len(p) for p in pkts]))
+
+    assert ok.tolist() == [i not in bad for i in range(len(pkts))]
+    assert PusStream(bytes(data), partial=True).crc_valid().tolist() == ok.tolist()
+
+
+def test_plausible_headers():
+    pkts = [mk_pkt(321), mk_pkt(999), mk_pkt(321, size=40)]
+    data = b''.join(pkts)
+
+    offs = plausible_headers(data, apids=APIDS, max_len=1024)
+    assert {0, 40} <= set(offs.tolist())
+    assert 20 not in offs.tolist()
+
+    # the last packet does not fit into the truncated stream
+    assert 40 not in plausible_headers(data[:-1], apids=APIDS, max_len=1024).tolist()
+    assert 40 not in plausible_headers(data, apids=APIDS, max_len=30).tolist()
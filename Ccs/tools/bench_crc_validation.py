@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark CRC validation of PUS packet streams.
+
+Compares per-packet cfl.crc_check calls against pus_framing.crc_valid on a clean stream, and the byte-wise
+resynchronisation of the former brute search against the plausible-header resynchronisation of
+cfl.extract_pus_brute_search on a stream with corrupt segments. The framing of a socket stream with PacketFramer is
+timed for the clean and the corrupt stream.
+
+USAGE: ./bench_crc_validation.py [<number of packets>] [<number of corrupt segments>]
+"""
+
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, '..')
+
+os.environ.setdefault('CCS_HEADLESS', '1')
+import ccs_function_lib as cfl
+from pus_framing import PacketFramer, PacketSync, PusStream, crc_valid
+
+N_PKTS = 200000
+N_CORRUPT = 200
+REPEAT = 3
+
+APIDS = [321, 322, 323]
+RECV_CHUNK = 4096
+
+
+def mk_stream(n_pkts, seed=0):
+    rnd = random.Random(seed)
+    pkts = []
+    for i in range(n_pkts):
+        apid = rnd.choice(APIDS)
+        size = rnd.randrange(cfl.TM_HEADER_LEN + cfl.PEC_LEN, cfl.MAX_PKT_LEN + 1)
+        head = bytes([0x08 | apid >> 8, apid & 0xFF, 0xC0 | (i >> 8) & 0x3F, i & 0xFF]) + (size - 7).to_bytes(2, 'big')
+        pkt = head + rnd.randbytes(size - len(head) - cfl.PEC_LEN)
+        pkts.append(pkt + cfl.crc(pkt).to_bytes(cfl.PEC_LEN, 'big'))
+    return b''.join(pkts)
+
+
+def corrupt(data, n_segments, seed=0):
+    rnd = random.Random(seed)
+    data = bytearray(data)
+    for _ in range(n_segments):
+        pos = rnd.randrange(len(data))
+        data[pos:pos + rnd.randrange(1, 64)] = rnd.randbytes(rnd.randrange(0, 64))
+    return bytes(data)
+
+
+def check_single(data):
+    pkts = PusStream(data)
+    return [not cfl.crc_check(bytes(pkt)) for pkt in pkts]
+
+
+def check_batch(data):
+    pkts = PusStream(data)
+    return crc_valid(pkts.buf, pkts.offsets, pkts.lengths).tolist()
+
+
+def brute_search_bytewise(data):
+    # byte-wise resynchronisation, as done by the former extract_pus_brute_search
+    data = io.BufferedReader(io.BytesIO(data))
+    pckts = []
+    trash = 0
+    while True:
+        pos = data.tell()
+        pckt = cfl.read_pus(data)
+        if pckt is None:
+            break
+        if not cfl.crc_check(pckt):
+            pckts.append(pckt)
+        else:
+            data.seek(pos + 1)
+            trash += 1
+    return pckts, trash
+
+
+def brute_search_resync(data):
+    trashcnt = {None: 0}
+    pckts = cfl.extract_pus_brute_search(data, trashcnt=trashcnt, sync=PacketSync(apids=APIDS, max_len=cfl.MAX_PKT_LEN))
+    return pckts, trashcnt[None]
+
+
+def frame_chunks(data):
+    # framing as done for a TM socket, which delivers the stream in chunks of RECV_CHUNK bytes
+    framer = PacketFramer(PacketSync(apids=APIDS, max_len=cfl.MAX_PKT_LEN))
+    pckts = []
+    for i in range(0, len(data), RECV_CHUNK):
+        pckts += framer.feed(data[i:i + RECV_CHUNK])
+    framer.flush()
+    return pckts, framer.skipped
+
+
+def timeit(func, *args):
+    dts = []
+    for _ in range(REPEAT):
+        t1 = time.perf_counter()
+        res = func(*args)
+        dts.append(time.perf_counter() - t1)
+    return statistics.median(dts), res
+
+
+def run(n_pkts=N_PKTS, n_corrupt=N_CORRUPT):
+    clean = mk_stream(n_pkts)
+    print('{} packets, {:.1f} MB, median of {} runs:'.format(n_pkts, len(clean) / 1e6, REPEAT))
+
+    dt_single, ref = timeit(check_single, clean)
+    dt_batch, res = timeit(check_batch, clean)
+    assert ref == res
+
+    print('  clean stream, per-packet crc_check:      {:10.1f} ms'.format(dt_single * 1e3))
+    print('  clean stream, crc_valid:                 {:10.1f} ms'.format(dt_batch * 1e3))
+
+    dt_frame_clean, _ = timeit(frame_chunks, clean)
+
+    dirty = corrupt(clean, n_corrupt)
+    dt_bytewise, (ref, ref_trash) = timeit(brute_search_bytewise, dirty)
+    dt_resync, (res, res_trash) = timeit(brute_search_resync, dirty)
+
+    print('{} corrupt segments:'.format(n_corrupt))
+    print('  byte-wise resync:                        {:10.1f} ms ({} packets, {} bytes skipped)'.format(
+        dt_bytewise * 1e3, len(ref), ref_trash))
+    print('  plausible-header resync:                 {:10.1f} ms ({} packets, {} bytes skipped)'.format(
+        dt_resync * 1e3, len(res), res_trash))
+
+    dt_frame, (res, res_trash) = timeit(frame_chunks, dirty)
+    print('socket framing in chunks of {} bytes:'.format(RECV_CHUNK))
+    print('  clean stream:                            {:10.1f} ms'.format(dt_frame_clean * 1e3))
+    print('  corrupt stream:                          {:10.1f} ms ({} packets, {} bytes skipped)'.format(
+        dt_frame * 1e3, len(res), res_trash))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the import of ccs_function_lib and the first use of the MIB look-up tables.
+
+The import is timed with python -X importtime in GUI and headless mode. The first use of the look-up tables derived
+from the MIB is timed without snapshot, with a snapshot being written (cold start) and with an existing snapshot
+(warm start). Each measurement runs in a fresh interpreter.
+
+USAGE: ./bench_import_time.py [<number of runs>]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CCS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+REPEAT = 5
+
+LOAD_LUTS = """
+import time
+import ccs_function_lib as cfl
+if {snapshot!r}:
+    cfl.cfg['ccs-database']['mib_snapshot'] = {snapshot!r}
+t1 = time.perf_counter()
+cfl.get_sid_lut()
+cfl.get_data_pool_id_parameters()
+cfl.get_dp_luts()
+cfl.get_s13_info()
+print(time.perf_counter() - t1)
+"""
+
+
+def import_time(headless):
+    env = dict(os.environ, CCS_HEADLESS='1' if headless else '0')
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ccs_function_lib'], cwd=CCS_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+
+    # import time: self [us] | cumulative | imported package
+    for line in res.stderr.splitlines():
+        if line.rstrip().endswith('| ccs_function_lib'):
+            return int(line.split('|')[1]) / 1e6
+
+
+def lut_time(snapshot=''):
+    env = dict(os.environ, CCS_HEADLESS='1')
+    res = subprocess.run([sys.executable, '-c', LOAD_LUTS.format(snapshot=snapshot)], cwd=CCS_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(res.stdout.split()[-1])
+
+
+def run(repeat=REPEAT):
+    print('median of {} runs:'.format(repeat))
+
+    for headless in (False, True):
+        dt = statistics.median([import_time(headless) for _ in range(repeat)])
+        print('  import, {:8s}                      {:10.1f} ms'.format('headless' if headless else 'GUI', dt * 1e3))
+
+    dt = statistics.median([lut_time() for _ in range(repeat)])
+    print('  MIB look-up tables, no snapshot:         {:10.1f} ms'.format(dt * 1e3))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        snapshot = os.path.join(tmpdir, 'mib_snapshot.pickle')
+        dts = []
+        for _ in range(repeat):
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+            dts.append(lut_time(snapshot))
+        print('  MIB look-up tables, cold snapshot:       {:10.1f} ms'.format(statistics.median(dts) * 1e3))
+
+        dt = statistics.median([lut_time(snapshot) for _ in range(repeat)])
+        print('  MIB look-up tables, warm snapshot:       {:10.1f} ms'.format(dt * 1e3))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:2]])
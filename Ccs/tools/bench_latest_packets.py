@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark "latest packet per type" look-ups on a large synthetic pool in the storage DB.
+
+Compares per-type queries with and without the composite (pool_id, stc, sst, apid, idx) index against a single
+cfl.get_latest_packets call.
+
+USAGE: ./bench_latest_packets.py [<number of rows>] [--keep]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, '..')
+
+os.environ.setdefault('CCS_HEADLESS', '1')
+import ccs_function_lib as cfl
+from database.tm_db import DbTelemetry, DbTelemetryPool
+
+POOL_NAME = '__bench_latest_packets__'
+N_ROWS = 5000000
+CHUNK = 50000
+REPEAT = 5
+
+# (ST, SST, APID, relative frequency), rare types are the expensive case without a suitable index
+PKT_TYPES = [(3, 25, 321, 200), (3, 25, 322, 50), (1, 1, 321, 20), (1, 7, 321, 20), (5, 1, 321, 5), (5, 2, 321, 1),
+             (5, 3, 321, 1), (5, 4, 321, 1), (13, 1, 321, 1), (17, 2, 321, 1), (6, 6, 321, 1), (20, 2, 321, 1)]
+
+IGNORE_HINT = 'IGNORE INDEX (pool_id_type_and_idx, pool_id_tmtc_and_idx)'
+
+
+def fill_pool(n_rows):
+    session = cfl.scoped_session_storage
+    pool = session.query(DbTelemetryPool).filter(DbTelemetryPool.pool_name == POOL_NAME).first()
+    if pool is not None:
+        if session.query(DbTelemetry).filter(DbTelemetry.pool_id == pool.iid).count() == n_rows:
+            print('Reusing existing pool {}'.format(POOL_NAME))
+            session.close()
+            return
+        clear_pool()
+
+    pool = DbTelemetryPool(pool_name=POOL_NAME, protocol='PUS', modification_time=int(time.time()))
+    session.add(pool)
+    session.commit()
+    pool_id = pool.iid
+
+    cycle = [pt[:3] for pt in PKT_TYPES for _ in range(pt[3])]
+    t1 = time.time()
+    for start in range(0, n_rows, CHUNK):
+        rows = []
+        for idx in range(start, min(start + CHUNK, n_rows)):
+            st, sst, apid = cycle[idx % len(cycle)]
+            rows.append(dict(pool_id=pool_id, idx=idx, is_tm=0, apid=apid, seq=idx % 16384, len_7=0, stc=st, sst=sst,
+                             destID=0, timestamp='{:.6f}U'.format(idx / 8), cuc=idx / 8, tsync=False, data=b'',
+                             raw=b''))
+        session.execute(DbTelemetry.__table__.insert(), rows)
+        session.commit()
+        print('\rInserted {} rows ({:.0f} s)'.format(start + len(rows), time.time() - t1), end='')
+    print()
+    session.close()
+
+
+def clear_pool():
+    session = cfl.scoped_session_storage
+    pool = session.query(DbTelemetryPool).filter(DbTelemetryPool.pool_name == POOL_NAME).first()
+    if pool is not None:
+        session.query(DbTelemetry).filter(DbTelemetry.pool_id == pool.iid).delete(synchronize_session=False)
+        session.delete(pool)
+        session.commit()
+    session.close()
+
+
+def latest_single(hint=None):
+    rows = cfl.get_pool_rows(POOL_NAME)
+    if hint is not None:
+        rows = rows.with_hint(DbTelemetry, hint, 'mysql')
+    return {pt[:3]: cfl.filter_rows(rows, st=pt[0], sst=pt[1], apid=pt[2], get_last=True) for pt in PKT_TYPES}
+
+
+def latest_batch():
+    return cfl.get_latest_packets(POOL_NAME, [pt[:3] for pt in PKT_TYPES])
+
+
+def timeit(func, *args):
+    dts = []
+    for _ in range(REPEAT):
+        t1 = time.perf_counter()
+        res = func(*args)
+        dts.append(time.perf_counter() - t1)
+    return statistics.median(dts), res
+
+
+def run(n_rows=N_ROWS, keep=False):
+    fill_pool(n_rows)
+
+    dt_noidx, ref = timeit(latest_single, IGNORE_HINT)
+    dt_idx, res_idx = timeit(latest_single)
+    dt_batch, res_batch = timeit(latest_batch)
+
+    for key in ref:
+        assert ref[key].idx == res_idx[key].idx == res_batch[key].idx, key
+
+    print('{} rows, {} packet types, median of {} runs:'.format(n_rows, len(PKT_TYPES), REPEAT))
+    print('  per-type queries, without composite index: {:10.1f} ms'.format(dt_noidx * 1e3))
+    print('  per-type queries, with composite index:    {:10.1f} ms'.format(dt_idx * 1e3))
+    print('  get_latest_packets (single query):         {:10.1f} ms'.format(dt_batch * 1e3))
+
+    if not keep:
+        clear_pool()
+
+
+if __name__ == '__main__':
+    keep = '--keep' in sys.argv
+    if keep:
+        sys.argv.remove('--keep')
+
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]), keep=keep)
+    else:
+        run(keep=keep)
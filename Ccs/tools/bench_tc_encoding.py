@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the encoding of TCs defined in the MIB.
+
+Compares Tcbuild with the MIB look-ups done for every TC, as before the TC encoder plans, against Tcbuild with a
+cached plan and a single Tcbuild_many call for all TCs.
+
+USAGE: ./bench_tc_encoding.py <CCF_DESCR> [<parameter value> ...] [-n <number of TCs>]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, '..')
+
+os.environ.setdefault('CCS_HEADLESS', '1')
+import ccs_function_lib as cfl
+
+N_TCS = 10000
+N_UNCACHED = 200
+REPEAT = 3
+
+
+def cast(arg):
+    for typ in (int, float):
+        try:
+            return typ(arg)
+        except ValueError:
+            pass
+    return arg
+
+
+def build_uncached(cmd, rows):
+    tcs = []
+    for row in rows:
+        # drop the plan and parameter info, so that every TC is built from the MIB
+        cfl._tc_encoder_plans.clear()
+        cfl._tc_param_cache.clear()
+        tcs.append(cfl.Tcbuild(cmd, *row)[0])
+    return tcs
+
+
+def build_cached(cmd, rows):
+    return [cfl.Tcbuild(cmd, *row)[0] for row in rows]
+
+
+def build_many(cmd, rows):
+    return cfl.Tcbuild_many(cmd, rows)
+
+
+def timeit(func, *args):
+    dts = []
+    for _ in range(REPEAT):
+        cfl.counters.clear()
+        t1 = time.perf_counter()
+        res = func(*args)
+        dts.append(time.perf_counter() - t1)
+    return statistics.median(dts), res
+
+
+def run(cmd, *args, n_tcs=N_TCS):
+    rows = [tuple(cast(arg) for arg in args)] * n_tcs
+    n_uncached = min(n_tcs, N_UNCACHED)
+
+    print('{} x {}{}, median of {} runs:'.format(n_tcs, cmd, rows[0], REPEAT))
+
+    dt_uncached, ref = timeit(build_uncached, cmd, rows[:n_uncached])
+    dt_cached, res = timeit(build_cached, cmd, rows)
+    assert res[:n_uncached] == ref
+    dt_many, res_many = timeit(build_many, cmd, rows)
+    assert res_many == res
+
+    print('  Tcbuild, MIB look-ups per TC:            {:10.1f} ms (extrapolated from {} TCs)'.format(
+        dt_uncached * n_tcs / n_uncached * 1e3, n_uncached))
+    print('  Tcbuild, cached plan:                    {:10.1f} ms'.format(dt_cached * 1e3))
+    print('  Tcbuild_many:                            {:10.1f} ms'.format(dt_many * 1e3))
+
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    n = N_TCS
+    if '-n' in argv:
+        i = argv.index('-n')
+        n = int(argv[i + 1])
+        del argv[i:i + 2]
+
+    if not argv:
+        print(__doc__)
+        sys.exit()
+
+    run(*argv, n_tcs=n)
@@ -6,11 +6,15 @@ Extract telemetry data from NCTRS files as provided by MOC
 Author: Marko Mecina
 """
 
-import io
+import os
 import struct
 import sys
 import crcmod
 
+# the CCS modules are located in the parent directory of this tool, independent of the working directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pus_framing import PusStream
+
 CRCFUNC = crcmod.predefined.mkCrcFun('crc-ccitt-false')
 trashbytes = 0
 
@@ -88,53 +92,21 @@ def convert_nctrs(infile):
 # get rid of idle packets and optionally restrict to packets that pass CRC
 def clear_idle_pckts(pcktstream):
     global trashbytes
-    data = io.BytesIO(pcktstream)
-    pckts = []
-
-    pkt = True
-    while pkt is not None:
-        cpos = data.tell()
-        pkt = read_pus(data)
-
-        if pkt is None:
-            break
-
-        if check_crc is True and (crc_check(pkt) is True or (int.from_bytes(pkt[:2], 'big') & 0x7ff not in (321,322,323,324,332,961,972))):
-            data.seek(cpos + 1)
-            trashbytes += 1
-            continue
 
-        if int.from_bytes(pkt[:2], 'big') & 2047 != 2047:
-            pckts.append(pkt)
+    if check_crc is True:
+        pckts = PusStream(pcktstream, validate=True, apids=(321,322,323,324,332,961,972))
+    else:
+        pckts = PusStream(pcktstream, partial=True)
+    trashbytes += pckts.skipped
 
-    return pckts
+    with pckts:
+        return [bytes(pkt) for pkt in pckts if int.from_bytes(pkt[:2], 'big') & 2047 != 2047]
 
 
 def crc_check(pkt):
     return bool(CRCFUNC(pkt))
 
 
-def read_pus(data):
-    pos = data.tell()
-    pus_size = data.read(6)
-
-    if pus_size == b'':
-        return
-
-    while len(pus_size) < 6:
-        add = data.read(1)
-        if add == b'':
-            return
-        pus_size += add
-
-    data.seek(pos)
-
-    # packet size is header size (6) + pus size field + 1
-    pckt_size = int.from_bytes(pus_size[4:6], 'big') + 7
-
-    return data.read(pckt_size)
-
-
 def get_cuc(tm):
     try:
         ct, ft = struct.unpack('>IH', tm[10:16])
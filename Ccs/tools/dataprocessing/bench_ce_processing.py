@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark decompression and conversion of a directory of CE files with different numbers of worker processes.
+
+The CE files are copied to a temporary directory, so the input directory is left untouched.
+
+USAGE: ./bench_ce_processing.py <CEDIR> [<number of workers> ...]
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import smile_L0b_converter as l0b
+
+
+def run(cedir, workers_list):
+    ces = sorted(f for f in os.listdir(cedir) if f.endswith('.ce'))
+    if not ces:
+        print('No CE files found in {}'.format(cedir))
+        return
+
+    mbytes = sum(os.path.getsize(os.path.join(cedir, ce)) for ce in ces) / 1e6
+    print('{} CEs, {:.1f} MB, decompressor: {}'.format(len(ces), mbytes, l0b.CE_EXEC))
+
+    ref = None
+    for workers in workers_list:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for ce in ces:
+                shutil.copy(os.path.join(cedir, ce), tmpdir)
+
+            t1 = time.perf_counter()
+            res = l0b.process_ces(ces, tmpdir, workers=workers)
+            dt = time.perf_counter() - t1
+
+        processed = [ce for ce, _ in res]
+        if ref is None:
+            ref = processed
+        elif processed != ref:
+            print('  WARNING: processed CEs differ from the first run!')
+
+        print('  {:3d} worker(s): {:8.2f} s  {:8.2f} CEs/s  {:8.2f} MB/s  ({} ok)'.format(
+            workers, dt, len(ces) / dt, mbytes / dt, len(processed)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if len(sys.argv) > 2:
+        run(sys.argv[1], [int(n) for n in sys.argv[2:]])
+    else:
+        run(sys.argv[1], sorted({1, 2, 4, l0b.N_WORKERS}))
@@ -2,6 +2,7 @@ import ctypes
 import io
 import logging
 import os
+import pickle
 import struct
 import packetstruct as pstruct
 from packetstruct import timepack, timecal, APID, TM_HEADER_LEN, PEC_LEN, PI1W
@@ -14,6 +15,11 @@ PID_TAB = os.path.join(MIBDIR, 'pid.dat')
 PLF_TAB = os.path.join(MIBDIR, 'plf.dat')
 VPD_TAB = os.path.join(MIBDIR, 'vpd.dat')
 PCF_TAB = os.path.join(MIBDIR, 'pcf.dat')
+MIB_TABS = {'pic': PIC_TAB, 'pid': PID_TAB, 'plf': PLF_TAB, 'vpd': VPD_TAB, 'pcf': PCF_TAB}
+
+# parsed MIB tables and packet structures, rebuilt if any of the MIB_TABS changes
+MIB_CACHE = os.path.join(MIBDIR, '.hk_mib_cache.pickle')
+MIB_CACHE_VERSION = 1
 
 
 def str_to_int(x):
@@ -25,9 +31,22 @@ def str_to_int(x):
 
 class PktStructs:
 
-    def __init__(self):
-        self.pus_tabs = PusTabs()
-        self.structs = {}
+    def __init__(self, use_cache=True):
+        cache = load_mib_cache() if use_cache else None
+
+        if cache is not None:
+            self.pus_tabs = PusTabs(tabs=cache['tabs'])
+            self.structs = cache['structs']
+        else:
+            self.pus_tabs = PusTabs()
+            self.structs = self.mk_all_structs()
+            if use_cache:
+                save_mib_cache(self.pus_tabs, self.structs)
+
+        for pktstruct in self.structs.values():
+            compile_struct(pktstruct)
+
+        self.by_id = {}  # (ST, SST, PI1VAL) -> (key, structure), filled by get_struct
 
     def __call__(self, *args, **kwargs):
         return
@@ -37,6 +56,7 @@ class PktStructs:
 
         fmts = []
         params = []
+        varfmts = None
 
         if tpsd == -1:
             # only try if there are any parameters defined
@@ -52,20 +72,119 @@ class PktStructs:
                 descr, ptc, pfc, width = self.pus_tabs.pcf[name]
                 params.append((name, descr, ptc, pfc, None, width, grp, fixrep))
 
-        pktstruct = {'pktdescr': pktdescr, 'fmts': fmts, 'params': params, 'tpsd': tpsd}
+            # formats of the variable packet parameters, if they can all be resolved in advance
+            try:
+                varfmts = [ptt(par[2], par[3]) for par in params]
+            except Exception:
+                varfmts = None
+
+        pktstruct = {'pktdescr': pktdescr, 'fmts': fmts, 'params': params, 'tpsd': tpsd, 'varfmts': varfmts}
 
         return pktstruct
 
+    def mk_all_structs(self):
+        """
+        Build the structures of all packets defined in the PID table. Packets whose structure cannot be built are left
+        out, get_struct raises the error when they are requested.
+
+        :return:
+        """
+        structs = {}
+        for key in self.pus_tabs.pid:
+            try:
+                structs[key] = self.mk_struct(key)
+            except Exception:
+                continue
+
+        return structs
+
     def get_struct(self, key):
         if key not in self.structs:
-            self.structs[key] = self.mk_struct(key)
+            self.structs[key] = compile_struct(self.mk_struct(key))
 
         return self.structs[key]
 
 
+def compile_struct(pktstruct):
+    """
+    Precompile the struct.Struct of a fixed packet, if its parameters can all be decoded by the struct module
+
+    :param pktstruct:
+    :return:
+    """
+    pktstruct['struct'] = None
+    if pktstruct['tpsd'] == -1:
+        try:
+            pktstruct['struct'] = struct.Struct('>' + ''.join(pktstruct['fmts']))
+        except struct.error:
+            pass
+
+    return pktstruct
+
+
+def mib_stamps():
+    """
+    Modification time and size of the MIB tables, used to validate the cache
+
+    :return:
+    """
+    return {name: (os.stat(fname).st_mtime_ns, os.stat(fname).st_size) for name, fname in MIB_TABS.items()}
+
+
+def load_mib_cache(fname=MIB_CACHE):
+    """
+    Load the parsed MIB tables and packet structures, if the cache is up to date
+
+    :param fname:
+    :return: dict with tabs and structs, or None
+    """
+    try:
+        with open(fname, 'rb') as fd:
+            cache = pickle.load(fd)
+        if cache['version'] == MIB_CACHE_VERSION and cache['stamps'] == mib_stamps():
+            return cache
+    except FileNotFoundError:
+        pass
+    except Exception as err:
+        logging.warning('Failed loading MIB cache {} ({})'.format(fname, err))
+
+    return
+
+
+def save_mib_cache(pus_tabs, structs, fname=MIB_CACHE):
+    """
+    Store the parsed MIB tables and packet structures, the precompiled structs are not stored
+
+    :param pus_tabs:
+    :param structs:
+    :param fname:
+    :return:
+    """
+    cache = {'version': MIB_CACHE_VERSION,
+             'stamps': mib_stamps(),
+             'tabs': {name: getattr(pus_tabs, name) for name in MIB_TABS},
+             'structs': {key: {k: v for k, v in pktstruct.items() if k != 'struct'} for key, pktstruct in structs.items()}}
+
+    tmp = '{}.{}'.format(fname, os.getpid())
+    try:
+        with open(tmp, 'wb') as fd:
+            pickle.dump(cache, fd, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fname)
+    except OSError as err:
+        logging.warning('Failed writing MIB cache {} ({})'.format(fname, err))
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
 class PusTabs:
 
-    def __init__(self):
+    def __init__(self, tabs=None):
+
+        if tabs is not None:
+            # tables already parsed, e.g. from the MIB cache
+            for name in MIB_TABS:
+                setattr(self, name, tabs[name])
+            return
 
         self.pic = self.load_table(PIC_TAB)
         self.pid = self.load_table(PID_TAB)
@@ -132,9 +251,9 @@ def proc_hk(pkt):
 
     try:
         if var == -1:
-            procpkt = (var, ps, decode_pus(pkt[TM_HEADER_LEN:-PEC_LEN], ps, fmts), fmts)
+            procpkt = (var, ps, decode_pus(pkt[TM_HEADER_LEN:-PEC_LEN], ps, fmts, compiled=pktstruct['struct']), fmts)
         else:
-            procpkt = (var, ps, read_variable_pckt(pkt[TM_HEADER_LEN:-PEC_LEN], ps), fmts)
+            procpkt = (var, ps, read_variable_pckt(pkt[TM_HEADER_LEN:-PEC_LEN], ps, fmts=pktstruct['varfmts']), fmts)
         decoded = True
     except Exception as err:
         logging.warning("Decoding failed for {}".format(descr))
@@ -155,6 +274,12 @@ def get_struct(pkt):
         pi1off = int(pkt_structs.pus_tabs.pic[(st, sst)])
         pi1val = int.from_bytes(pkt[pi1off:pi1off + PI1W], 'big')
 
+    # packet key and structure by integer ID, saves building the string key for every packet
+    try:
+        return pkt_structs.by_id[(st, sst, pi1val)]
+    except KeyError:
+        pass
+
     key = (str(st), str(sst), str(APID), str(pi1val))
 
     try:
@@ -162,26 +287,29 @@ def get_struct(pkt):
     except Exception as err:
         pktstruct = None
 
+    pkt_structs.by_id[(st, sst, pi1val)] = key, pktstruct
+
     return key, pktstruct
 
 
-def read_variable_pckt(tm_data, parameters):
+def read_variable_pckt(tm_data, parameters, fmts=None):
     """
     Read parameters from a variable length packet
 
     :param tm_data:
     :param parameters:
+    :param fmts: formats of the parameters, looked up for every parameter if None
     :return:
     """
     tms = io.BytesIO(tm_data)
     result = []
 
-    result = read_stream_recursive(tms, parameters, decoded=result)
+    result = read_stream_recursive(tms, parameters, decoded=result, fmts=fmts)
 
     return result
 
 
-def read_stream_recursive(tms, parameters, decoded=None, bit_off=0):
+def read_stream_recursive(tms, parameters, decoded=None, bit_off=0, fmts=None):
     """
     Recursively operating function for decoding variable length packets
 
@@ -189,7 +317,7 @@ def read_stream_recursive(tms, parameters, decoded=None, bit_off=0):
     :param parameters:
     :param decoded:
     :param bit_off:
-    :param tc:
+    :param fmts: formats of the parameters, looked up for every parameter if None
     :return:
     """
 
@@ -205,7 +333,7 @@ def read_stream_recursive(tms, parameters, decoded=None, bit_off=0):
         if grp is None:  # None happens for UDEF
             grp = 0
 
-        fmt = ptt(par[2], par[3])
+        fmt = ptt(par[2], par[3]) if fmts is None else fmts[par_idx]
         if fmt == 'deduced':
             raise NotImplementedError('Deduced parameter type PTC=11')
 
@@ -232,7 +360,8 @@ def read_stream_recursive(tms, parameters, decoded=None, bit_off=0):
             skip = grp
             rep = value
             while rep > 0:
-                decoded = read_stream_recursive(tms, parameters[par_idx + 1:par_idx + 1 + grp], decoded, bit_off=bit_off)
+                decoded = read_stream_recursive(tms, parameters[par_idx + 1:par_idx + 1 + grp], decoded, bit_off=bit_off,
+                                                fmts=None if fmts is None else fmts[par_idx + 1:par_idx + 1 + grp])
                 rep -= 1
 
     return decoded
@@ -320,16 +449,20 @@ def csize(fmt, offbi=0):
             raise NotImplementedError('Unknown format {}'.format(fmt))
 
 
-def decode_pus(tm_data, parameters, fmts):
+def decode_pus(tm_data, parameters, fmts, compiled=None):
     """
 
     :param tm_data:
     :param parameters:
     :param fmts:
+    :param compiled: precompiled struct.Struct of _fmts_, see compile_struct
     :return:
     """
     # fmts = [ptt(par[4], par[5]) for par in parameters]
 
+    if compiled is not None and compiled.size == len(tm_data):
+        return compiled.unpack(tm_data)
+
     try:
         # return list(zip(struct.unpack('>' + ''.join(fmts), tm_data), parameters))
         return struct.unpack('>' + ''.join(fmts), tm_data)
@@ -3,11 +3,18 @@
 Process SMILE SXI L0b product
 """
 
+import concurrent.futures
 import datetime
+import glob
+import heapq
+import itertools
+import json
 import logging
 import os
+import re
 import subprocess
 import sys
+import time
 
 from astropy.io import fits
 import numpy as np
@@ -19,6 +26,9 @@ from smile_raw_ce_converter import convert_ce, ED_BIN_DTYPE, STRUCT_CE_HEADER
 
 import crcmod
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+from pus_framing import PusStream
+
 puscrc = crcmod.predefined.mkPredefinedCrcFun('crc-ccitt-false')
 
 # logging.setLevel(logging.INFO)
@@ -50,6 +60,23 @@ trashcnt = 0
 # CE_EXEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "smile_raw_ce_converter.py")
 CE_EXEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_decompress.sh")
 
+N_WORKERS = os.cpu_count() or 1  # number of processes decompressing and converting CEs in parallel
+DECOMPRESS_TIMEOUT = 300  # seconds after which a hung decompression process is killed
+DECOMPRESS_RETRIES = 1  # number of further attempts after a timeout
+PROGRESS_INTERVAL = 10  # seconds between progress reports
+
+DEDUP_HEADER_LEN = 16  # number of header bytes hashed, together with the CRC, to identify duplicate packets
+DEDUP_HASH_SEED = 0x9E3779B97F4A7C15
+WRITE_BUFSIZE = 1 << 20
+MERGE_CHUNK = 65536  # number of packets per file converted to Python objects at once when merging
+
+BATCH_GLOB = '*.bin'  # raw files processed if a directory is given
+CE_DIR_SUFFIX = '_ce'  # suffix of the per-file directory holding CEs and log in batch mode
+LOG_FILENAME = 'log.json'
+SUMMARY_FILENAME = 'run_summary.json'
+LOG_FORMAT = '  {\n    "timestamp": "%(asctime)s",  \n    "level": "%(levelname)s",  \n    "message": "%(message)s"\n  },'
+LOG_ENTRY = re.compile(r'"timestamp": "(.*?)",\s*"level": "(.*?)",\s*"message": "(.*?)"\n  },', re.S)
+
 PRODUCT_IDS = {0: 'SXI-SCI-ED',
                2: 'SXI-SCI-FT',
                4: 'SXI-SCI-FF',
@@ -353,108 +380,145 @@ def remove_duplicates(infile, outfile=None):
     if outfile is None:
         outfile = infile + '_CLEAN.bin'
 
-    unique = []
-
-    with open(infile, 'rb') as fd:
-
-        while True:
-            pkt = extract_pus_crc(fd)
-            if pkt is None:
-                break
-
-            unique.append(pkt)
+    with read_pus_file(infile) as pkts:
+        unique = unique_pkts(pkts)
 
-    diff = len(unique)
-    clean = set()
-    unique = [pkt for pkt in unique if pkt not in clean and clean.add(pkt) is None]
-    diff -= len(unique)
+        diff = len(pkts) - len(unique)
+        if diff > 0:
+            print('{} duplicate S13 packets found.'.format(diff))
 
-    if diff > 0:
-        print('{} duplicate S13 packets found.'.format(diff))
-
-    with open(outfile, 'wb') as fd:
-        fd.write(b''.join(unique))
-        print('Clean file written to {}'.format(outfile))
+        buf = pkts.buf
+        with open(outfile, 'wb', buffering=WRITE_BUFSIZE) as fd:
+            for off, size in zip(pkts.offsets[unique].tolist(), pkts.lengths[unique].tolist()):
+                fd.write(buf[off:off + size])
+            print('Clean file written to {}'.format(outfile))
 
 
 def merge_raw_pus_data(flist, outfile, sort=True, rm_duplicates=False):
-
-    acc = []
+    """
+    Merge PUS packets from several files into one, optionally sorted by packet time. The input files are memory-mapped
+    and the packets are written straight to the output file, so that memory use only depends on the number of packets,
+    not their size.
+
+    @param flist: input files
+    @param outfile:
+    @param sort: sort packets by CUC time, packets with equal time keep the order of the input
+    @param rm_duplicates: remove duplicates within each input file, see unique_pkts
+    """
+    streams = []
+    order = []
     for fn in flist:
-        unique = []
-        with open(fn, 'rb') as fd:
-
-                while True:
-                    pkt = extract_pus_crc(fd)
-                    if pkt is None:
-                        break
-                    unique.append(pkt)
+        pkts = read_pus_file(fn)
+        idx = np.arange(len(pkts))
 
         if rm_duplicates:
-            diff = len(unique)
-            clean = set()
-            unique = [pkt for pkt in unique if pkt not in clean and clean.add(pkt) is None]
-            diff -= len(unique)
+            idx = unique_pkts(pkts)
+            diff = len(pkts) - len(idx)
 
             if diff > 0:
                 print('{} duplicate S13 packets found ({}).'.format(diff, fn))
 
-        acc += unique
+        if sort:
+            # stable sort, like list.sort
+            idx = idx[np.argsort(pkt_times(pkts)[idx], kind='stable')]
+
+        streams.append(pkts)
+        order.append(idx)
+
+    runs = [_iter_run(i, pkt_times(pkts)[idx] if sort else np.zeros(len(idx)), pkts.offsets[idx], pkts.lengths[idx])
+            for i, (pkts, idx) in enumerate(zip(streams, order))]
 
     if sort:
-        acc.sort(key=get_pkt_time)
+        # k-way merge of the sorted files, ties are resolved by file and then by offset, i.e. in input order
+        merged = heapq.merge(*runs)
+    else:
+        merged = itertools.chain(*runs)
+
+    bufs = [pkts.buf for pkts in streams]
+    with open(outfile, 'wb', buffering=WRITE_BUFSIZE) as fd:
+        for _, i, off, size in merged:
+            fd.write(bufs[i][off:off + size])
 
-    with open(outfile, 'wb') as fd:
-        fd.write(b''.join(acc))
+    del bufs
+    for pkts in streams:
+        pkts.close()
 
     print('Merged data written to {}.'.format(outfile))
 
 
-def read_pus(data):
+def _iter_run(i, times, offsets, lengths, chunk=MERGE_CHUNK):
+    # yield (time, file index, offset, length) of the packets of one file, converting the arrays chunk-wise
+    for j in range(0, len(offsets), chunk):
+        yield from zip(times[j:j + chunk].tolist(), itertools.repeat(i), offsets[j:j + chunk].tolist(),
+                       lengths[j:j + chunk].tolist())
+
+
+def pkt_times(pkts):
+    """
+    Vectorised get_pkt_time for all packets of a PusStream
+
+    @param pkts: PusStream
+    @return: float array of packet times
+    """
+    coarse = pkts.header_field(TIME_OFF, '>u4').astype(np.int64)
+    fine = (pkts.header_field(TIME_OFF + TIME_C_LEN, '>u2').astype(np.int64) << 8) | pkts.header_field(TIME_OFF + TIME_C_LEN + 2)
+
+    return coarse + fine / 1e6
+
+
+def pkt_hashes(pkts):
     """
-    Read single PUS packet from buffer
+    Compute a 64-bit hash over the header and the CRC of every packet of a PusStream, as compact replacement of the
+    packet bytes for finding duplicates
 
-    @param data: buffer
-    @return: single PUS packet as byte string or *None*
+    @param pkts: PusStream
+    @return: uint64 array
     """
-    pkt = b''
-    while len(pkt) < 6:
-        pkt += data.read(6 - len(pkt))
-        if len(pkt) == 0:
-            return
+    h = np.full(len(pkts), DEDUP_HASH_SEED, dtype=np.uint64)
+    for off in range(0, DEDUP_HEADER_LEN, 8):
+        h = _mix64(h ^ pkts.header_field(off, '>u8').astype(np.uint64))
 
-    pktlen = int.from_bytes(pkt[4:6], 'big') + 7
-    while len(pkt) < pktlen:
-        add = data.read(pktlen - len(pkt))
+    data = np.frombuffer(pkts.buf, dtype=np.uint8)
+    end = pkts.offsets + pkts.lengths
+    crc = (data[end - 2].astype(np.uint64) << np.uint64(8)) | data[end - 1]
 
-        if add == b'':
-            return
+    return _mix64(h ^ crc)
 
-        pkt += add
 
-    return pkt
+def _mix64(x):
+    # splitmix64 finaliser, integer overflow wraps around
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
 
 
-def extract_pus_crc(data):
+def unique_pkts(pkts):
     """
-    :param data:
-    :return:
+    Find the first occurrence of every packet in a PusStream. Packets are considered equal if header and CRC are,
+    see pkt_hashes.
+
+    @param pkts: PusStream
+    @return: sorted index array of the unique packets
     """
-    global trashcnt
+    _, first = np.unique(pkt_hashes(pkts), return_index=True)
+    return np.sort(first)
 
-    while True:
-        pos = data.tell()
-        pkt = read_pus(data)
 
-        if pkt is not None:
-            if not crc_check(pkt):
-                return pkt
-            else:
-                logging.warning('invalid CRC encountered at bytepos {}'.format(pos))
-                data.seek(pos + 1)
-                trashcnt += 1
-        else:
-            return
+def read_pus_file(infile):
+    """
+    Memory-map a binary file and index the PUS packets in it, data failing the CRC check are skipped
+
+    @param infile:
+    @return: PusStream, iterating over it yields the packets as memoryviews
+    """
+    pkts = PusStream(infile, validate=True)
+
+    if pkts.skipped:
+        logging.warning('skipped {} bytes in {} because of wrong CRCs'.format(pkts.skipped, infile))
+
+    return pkts
 
 
 def crc_check(pkt):
@@ -509,7 +573,7 @@ def extract_ce_data(pkt, check_seq=CHECK_SEQ):
     return pkt[SDU_DATA_OFF:SDU_DATA_OFF + datalen]
 
 
-def parse_pkts(fd, no_hk=False, sduid=1):
+def parse_pkts(pkts, no_hk=False, sduid=1):
     global seqcnt
 
     ces = {}
@@ -525,10 +589,7 @@ def parse_pkts(fd, no_hk=False, sduid=1):
     else:
         hk_to_proc = PROC_ST
 
-    while True:
-        pkt = extract_pus_crc(fd)
-        if pkt is None:
-            break
+    for pkt in pkts:
 
         # discard TCs
         if (pkt[0] >> 4) & 1:
@@ -536,7 +597,7 @@ def parse_pkts(fd, no_hk=False, sduid=1):
 
         # handle ENG telemetry
         elif pkt[ST_OFF] in hk_to_proc:
-            pktkey, descr, procpkt, timestamp, decoded = proc_hk(pkt)
+            pktkey, descr, procpkt, timestamp, decoded = proc_hk(bytes(pkt))
 
             if pktkey is None:
                 logging.debug("Unidentified packet: {}".format(pkt[:SDUID_OFF].hex()))
@@ -641,22 +702,22 @@ def extract(infile, outdir):
     #
     # return extracted_ces
 
-    with open(infile, 'rb') as fd:
-        try:
-            trashcnt = 0
-            good_ces, bad_ces, hks = parse_pkts(fd)
-            if trashcnt != 0:
-                logging.warning('skipped {} bytes because of wrong CRCs'.format(trashcnt))
+    # do not report the count of a previous file if this one cannot be read
+    trashcnt = 0
 
-            # rewind to parse and add FFs with SDUID=2
-            fd.seek(0)
-            good_ffs, bad_ffs, _ = parse_pkts(fd, no_hk=True, sduid=2)
-            good_ces.update(good_ffs)
-            bad_ces.update(bad_ffs)
+    try:
+        pkts = read_pus_file(infile)
+        trashcnt = pkts.skipped
+        good_ces, bad_ces, hks = parse_pkts(pkts)
 
-        except Exception as err:
-            logging.exception(err)
-            good_ces, bad_ces, hks = [], [], []
+        # parse again to add FFs with SDUID=2, the packet index is reused
+        good_ffs, bad_ffs, _ = parse_pkts(pkts, no_hk=True, sduid=2)
+        good_ces.update(good_ffs)
+        bad_ces.update(bad_ffs)
+
+    except Exception as err:
+        logging.exception(err)
+        good_ces, bad_ces, hks = [], [], []
 
     logging.info('extracted {} files'.format(len(good_ces)))
 
@@ -677,7 +738,7 @@ def extract(infile, outdir):
     return extracted_ces, hks
 
 
-def decompress(cefile, outdir):
+def decompress(cefile, outdir, timeout=DECOMPRESS_TIMEOUT, retries=DECOMPRESS_RETRIES):
 
     cefile = os.path.join(outdir, cefile)
 
@@ -685,7 +746,15 @@ def decompress(cefile, outdir):
     fitsfile = os.path.basename(cefile)[:-2] + 'de'
     fitspath = os.path.join(outdir, fitsfile)
 
-    proc = subprocess.run([CE_EXEC, cefile, fitspath], capture_output=True)
+    for attempt in range(1, retries + 2):
+        try:
+            proc = subprocess.run([CE_EXEC, cefile, fitspath], capture_output=True, timeout=timeout)
+            break
+        except subprocess.TimeoutExpired:
+            logging.warning("Decompression of {} timed out after {} s (attempt {}/{})".format(cefile, timeout, attempt,
+                                                                                              retries + 1))
+    else:
+        raise Exception("Decompression timed out for {}".format(cefile))
 
     for msg in proc.stdout.decode().split('\n'):
         if msg.strip():
@@ -702,6 +771,88 @@ def decompress(cefile, outdir):
     return fitspath
 
 
+def decompress_and_convert(ce, outdir, timeout=DECOMPRESS_TIMEOUT, retries=DECOMPRESS_RETRIES):
+    depath = decompress(ce, outdir, timeout=timeout, retries=retries)
+    if not os.path.isfile(depath):
+        return
+
+    # convert_ce exits on errors, which must not take down the worker pool
+    try:
+        return convert_ce(depath)
+    except SystemExit:
+        raise Exception("Conversion failed for {}".format(depath))
+
+
+def ce_sort_key(ce):
+    # CE file names are OBSID_CeCounter_TimeStamp_SequenceNumber_Product.ce, see get_ce_id
+    try:
+        return int(os.path.basename(ce).split('_')[2])
+    except (IndexError, ValueError):
+        return -1
+
+
+def process_ces(ces, outdir, workers=N_WORKERS, timeout=DECOMPRESS_TIMEOUT, retries=DECOMPRESS_RETRIES):
+    """
+    Decompress and convert CEs using a pool of at most _workers_ processes
+
+    Returns list of (CE, (header, arrays)) of the successfully processed CEs, ordered by CE timestamp.
+    """
+    ces = sorted(ces, key=ce_sort_key)
+    nbytes = {ce: os.path.getsize(os.path.join(outdir, ce)) for ce in ces}
+    results = {}
+
+    t0 = tlast = time.time()
+    done = 0
+
+    def report(final=False):
+        dt = time.time() - t0
+        mbytes = sum(nbytes[ce] for ce in results) / 1e6
+        logging.info('{} {}/{} CEs in {:.1f} s ({:.2f} CEs/s, {:.2f} MB/s)'.format(
+            'Processed' if final else 'Progress:', done, len(ces), dt, done / dt if dt else 0, mbytes / dt if dt else 0))
+
+    if workers <= 1:
+        pool = None
+        jobs = ((ce, _run_job(decompress_and_convert, ce, outdir, timeout, retries)) for ce in ces)
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        futures = {pool.submit(decompress_and_convert, ce, outdir, timeout, retries): ce for ce in ces}
+        jobs = ((futures[fut], fut) for fut in concurrent.futures.as_completed(futures))
+
+    try:
+        for ce, job in jobs:
+            done += 1
+            try:
+                res = job.result()
+                if res is not None:
+                    results[ce] = res
+            except Exception as err:
+                logging.error('Decompression failed for {}'.format(ce))
+                logging.exception(err)
+
+            if time.time() - tlast > PROGRESS_INTERVAL:
+                tlast = time.time()
+                report()
+    finally:
+        if pool is not None:
+            for fut in futures:
+                fut.cancel()
+            pool.shutdown()
+
+    report(final=True)
+
+    return [(ce, results[ce]) for ce in ces if ce in results]
+
+
+def _run_job(func, *args):
+    # run func in the calling process and wrap the outcome like a completed future
+    fut = concurrent.futures.Future()
+    try:
+        fut.set_result(func(*args))
+    except Exception as err:
+        fut.set_exception(err)
+    return fut
+
+
 def mk_hk_prod(hks, infile, outdir):
     hdl = mk_hdl('HK')
 
@@ -715,7 +866,7 @@ def mk_hk_prod(hks, infile, outdir):
             logging.error(str(key))
 
     fname = mk_outfile_name(outdir, os.path.basename(infile), '_ENG.fits')
-    hdl.writeto(fname, overwrite=True)
+    write_fits(hdl, fname)
 
     return fname
 
@@ -862,7 +1013,7 @@ def merge_ed(groups, infile, outdir):
     fname = mk_outfile_name(outdir, infile, '_ED.fits')
 
     try:
-        hdul.writeto(fname, overwrite=True)
+        write_fits(hdul, fname)
     except Exception as err:
         logging.exception(err)
         return
@@ -927,7 +1078,7 @@ def merge_ed2(files, infile):
     fname = mk_outfile_name(outdir, infile, '_ED.fits')
 
     try:
-        hdul.writeto(fname, overwrite=True)
+        write_fits(hdul, fname)
     except Exception as err:
         logging.exception(err)
         return
@@ -996,7 +1147,7 @@ def merge_ft(groups, infile, outdir):
     fname = mk_outfile_name(outdir, infile, '_FT.fits')
 
     try:
-        hdul.writeto(fname, overwrite=True)
+        write_fits(hdul, fname)
     except Exception as err:
         logging.exception(err)
         return
@@ -1040,7 +1191,7 @@ def merge_ff(groups, infile, outdir):
     fname = mk_outfile_name(outdir, infile, '_FF.fits')
 
     try:
-        hdul.writeto(fname, overwrite=True)
+        write_fits(hdul, fname)
     except Exception as err:
         logging.exception(err)
         return
@@ -1115,7 +1266,7 @@ def merge_uv(groups, infile, outdir):
     fname = mk_outfile_name(outdir, infile, '_UV.fits')
 
     try:
-        hdul.writeto(fname, overwrite=True)
+        write_fits(hdul, fname)
     except Exception as err:
         logging.exception(err)
         return
@@ -1191,31 +1342,36 @@ def mk_hdl(dmode):
     return hdl
 
 
-def process_file(infile, outdir):
-    ces, hks = extract(infile, outdir)
-
-    decompressed = {PRODUCT_IDS[k]: [] for k in PRODUCT_IDS}
+def process_file(infile, outdir, workers=N_WORKERS, workdir=None, stats=None):
+    """
+    Produce the L0b FITS products of a raw PUS file
+
+    @param infile:
+    @param outdir: directory the products are written to
+    @param workers: number of processes decompressing CEs
+    @param workdir: directory for the extracted CEs, defaults to _outdir_
+    @param stats: dict, filled with trash byte and CE/product counts if given
+    @return: paths of the ED, FT, FF, ST, PT, UV and ENG products, None for those not produced
+    """
+    if workdir is None:
+        workdir = outdir
 
-    for ce in ces:
-        try:
+    ces, hks = extract(infile, workdir)
 
-            if ce.endswith('_{}.ce'.format(UNKNOWN_PROD)):
-                logging.exception('Skipped decompression of {}'.format(ce))
-                continue
+    decompressed = {PRODUCT_IDS[k]: [] for k in PRODUCT_IDS}
 
-            depath = decompress(ce, outdir)
-            if os.path.isfile(depath):
-                cehead, arrays = convert_ce(depath)
-                scimode = cehead.items.product
-                # decompressed = sort_by_mode(decompressed, scimode, cehead, arrays)
-                if scimode in SCI_PRODUCTS:
-                    decompressed[PRODUCT_IDS[scimode]].append([cehead, *arrays])
-                else:
-                    logging.error('Unidentified mode {}'.format(scimode))
+    skipped = [ce for ce in ces if ce.endswith('_{}.ce'.format(UNKNOWN_PROD))]
+    for ce in skipped:
+        logging.exception('Skipped decompression of {}'.format(ce))
 
-        except Exception as err:
-            logging.error('Decompression failed for {}'.format(ce))
-            logging.exception(err)
+    processed = process_ces([ce for ce in ces if ce not in skipped], workdir, workers=workers)
+    for ce, (cehead, arrays) in processed:
+        scimode = cehead.items.product
+        # decompressed = sort_by_mode(decompressed, scimode, cehead, arrays)
+        if scimode in SCI_PRODUCTS:
+            decompressed[PRODUCT_IDS[scimode]].append([cehead, *arrays])
+        else:
+            logging.error('Unidentified mode {}'.format(scimode))
 
     merged = merge_to_fits(decompressed, infile, outdir)
     print('\n'.join([x for x in merged if x is not None]))
@@ -1229,9 +1385,167 @@ def process_file(infile, outdir):
 
     print(hkfile)
 
+    if stats is not None:
+        stats.update({'trashbytes': trashcnt,
+                      'ces': len(ces),
+                      'ces_skipped': len(skipped),
+                      'ces_processed': len(processed),
+                      'products': {mode: len(decompressed[mode]) for mode in decompressed},
+                      'hk_tables': len(hks)})
+
     return *merged, hkfile
 
 
+def find_input_files(source, pattern=BATCH_GLOB):
+    """
+    Return the raw files in a directory matching _pattern_, or the files matching the glob _source_
+
+    @param source: directory or glob pattern
+    @param pattern: file name pattern if _source_ is a directory
+    @return: sorted list of paths
+    """
+    if os.path.isdir(source):
+        source = os.path.join(source, pattern)
+
+    return sorted(fn for fn in glob.glob(source) if os.path.isfile(fn))
+
+
+def process_batch(files, outdir, workers=N_WORKERS, ce_workers=1):
+    """
+    Run process_file for many raw files, using a pool of at most _workers_ processes. Each file gets its own
+    directory in _outdir_ for CEs and log, its products are written to _outdir_.
+
+    A run summary with status, timing, trash bytes, product counts and log entries of every file is written to
+    SUMMARY_FILENAME in _outdir_.
+
+    @param files: raw files
+    @param outdir:
+    @param workers: number of files processed in parallel
+    @param ce_workers: number of processes decompressing CEs per file
+    @return: run summary
+    """
+    t0 = time.time()
+    started = datetime.datetime.now().isoformat(timespec='seconds')
+    results = {}
+
+    if workers <= 1:
+        pool = None
+        jobs = ((fn, _run_job(_process_file_job, fn, outdir, ce_workers)) for fn in files)
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker)
+        futures = {pool.submit(_process_file_job, fn, outdir, ce_workers): fn for fn in files}
+        jobs = ((futures[fut], fut) for fut in concurrent.futures.as_completed(futures))
+
+    try:
+        for fn, job in jobs:
+            try:
+                results[fn] = job.result()
+            except Exception as err:
+                logging.exception(err)
+                results[fn] = {'file': fn, 'status': 'failed', 'error': str(err)}
+
+            logging.info('Processed {}/{} files ({}: {}, {:.1f} s)'.format(
+                len(results), len(files), os.path.basename(fn), results[fn]['status'],
+                results[fn].get('duration', 0)))
+    finally:
+        if pool is not None:
+            for fut in futures:
+                fut.cancel()
+            pool.shutdown()
+
+    per_file = [results[fn] for fn in files]
+    summary = {'started': started,
+               'duration': time.time() - t0,
+               'workers': workers,
+               'totals': {'files': len(per_file),
+                          'failed': sum(res['status'] != 'ok' for res in per_file),
+                          'cpu_time': sum(res.get('duration', 0) for res in per_file),
+                          'trashbytes': sum(res.get('trashbytes', 0) for res in per_file),
+                          'ces': sum(res.get('ces', 0) for res in per_file),
+                          'products': {mode: sum(res.get('products', {}).get(mode, 0) for res in per_file)
+                                       for mode in PRODUCT_IDS.values()}},
+               'files': per_file}
+
+    sumfile = os.path.join(outdir, SUMMARY_FILENAME)
+    with open(sumfile + '.part', 'w') as fd:
+        json.dump(summary, fd, indent=2)
+    os.replace(sumfile + '.part', sumfile)
+
+    logging.info('Processed {} files in {:.1f} s, {} failed, summary written to {}'.format(
+        len(per_file), summary['duration'], summary['totals']['failed'], sumfile))
+
+    return summary
+
+
+def _init_batch_worker():
+    # forked workers inherit the handlers of the parent, i.e. the log of the batch run, drop them so that a worker only
+    # logs to the file of the job it is processing
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def _process_file_job(infile, outdir, ce_workers):
+    # process one file of a batch, logging to a file of its own
+    workdir = mk_outfile_name(outdir, infile, CE_DIR_SUFFIX)
+    os.makedirs(workdir, exist_ok=True)
+
+    log_filename = os.path.join(workdir, LOG_FILENAME)
+    handler = logging.FileHandler(log_filename, mode='w')
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    if root.level > logging.INFO or root.level == logging.NOTSET:
+        root.setLevel(logging.INFO)
+
+    res = {'file': infile, 'status': 'ok', 'error': None}
+    stats = {}
+    t1 = time.time()
+    try:
+        res['outputs'] = [fn for fn in process_file(infile, outdir, workers=ce_workers, workdir=workdir, stats=stats)
+                          if fn is not None]
+    except Exception as err:
+        logging.exception(err)
+        res.update({'status': 'failed', 'error': str(err), 'outputs': []})
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+    res['duration'] = time.time() - t1
+    res.update(stats)
+    res['log'] = read_log(log_filename)
+
+    return res
+
+
+def read_log(log_filename):
+    """
+    Read the entries of a log written with LOG_FORMAT, see setup_logging
+
+    @param log_filename:
+    @return: list of dicts with timestamp, level and message
+    """
+    with open(log_filename, 'r') as fd:
+        return [{'timestamp': ts, 'level': lvl, 'message': msg} for ts, lvl, msg in LOG_ENTRY.findall(fd.read())]
+
+
+def write_fits(hdul, fname):
+    """
+    Write a FITS file via a temporary file, so that an interrupted run does not leave an incomplete product behind
+
+    @param hdul:
+    @param fname:
+    """
+    tmp = fname + '.part'
+    try:
+        hdul.writeto(tmp, overwrite=True)
+        os.replace(tmp, fname)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
 # def load_dp():
 #     with open('dp.csv', 'r') as fd:
 #         dp = fd.read()
@@ -1243,14 +1557,13 @@ def process_file(infile, outdir):
 
 def setup_logging(output_dir):
     # Configure logging to write to a file in the output directory
-    log_filename = os.path.join(output_dir, "log.json")
+    log_filename = os.path.join(output_dir, LOG_FILENAME)
 
     if not os.path.isfile(log_filename):
         with open(log_filename, 'w') as fd:
             fd.write('')
 
-    logging.basicConfig(filename=log_filename, level=logging.INFO,
-                        format='  {\n    "timestamp": "%(asctime)s",  \n    "level": "%(levelname)s",  \n    "message": "%(message)s"\n  },')
+    logging.basicConfig(filename=log_filename, level=logging.INFO, format=LOG_FORMAT)
 
     return log_filename
 
@@ -1261,16 +1574,32 @@ if __name__ == '__main__':
     # process_file('/home/marko/ucloud/madrid/2024/X_BAND_SCOE/SXI_TMTC_RRC1_PS_X_20240729_merged.bin', '/home/marko/ucloud/madrid/2024/X_BAND_SCOE')
     # sys.exit()
 
+    workers = N_WORKERS
+    if '-j' in sys.argv:
+        i = sys.argv.index('-j')
+        workers = int(sys.argv[i + 1])
+        del sys.argv[i:i + 2]
+
     if len(sys.argv) < 2:
-        print('Usage: ./{} <INFILE> [<OUTDIR>]'.format(os.path.basename(__file__)))
+        print('Usage: ./{} <INFILE|DIR|GLOB> [<OUTDIR>] [-j <WORKERS>]'.format(os.path.basename(__file__)))
+        print('  A directory or glob pattern processes all matching raw files ({} in a directory), '
+              '<WORKERS> files at a time.'.format(BATCH_GLOB))
         sys.exit()
 
     elif len(sys.argv) == 2:
         infile = sys.argv[1]
-        outdir = os.path.dirname(infile)
+        outdir = infile if os.path.isdir(infile) else os.path.dirname(infile)
 
     else:
         infile, outdir = sys.argv[1:3]
 
     setup_logging(outdir)
-    process_file(infile, outdir)
+
+    if os.path.isfile(infile):
+        process_file(infile, outdir, workers=workers)
+    else:
+        files = find_input_files(infile)
+        if not files:
+            print('No input files found for {}'.format(infile))
+            sys.exit(1)
+        process_batch(files, outdir, workers=workers)
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 
 import datetime
+import os
 import sys
 
 sys.path.append('..')
 
+os.environ.setdefault('CCS_HEADLESS', '1')
 import ccs_function_lib as cfl
 
 
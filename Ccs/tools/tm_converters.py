@@ -1,10 +1,10 @@
 #! /usr/bin/env python3
 
-import io
 import sys
 sys.path.insert(0, '..')
 
 from database.tm_db import connect_to_db
+from pus_framing import PusStream
 
 dbcon = connect_to_db()
 
@@ -29,14 +29,7 @@ def merge_pools(*args, outfile=None, time_sort=False):
         print('TIME SORTING NOT YET IMPLEMENTED FOR SMILE')
         return
 
-    pcktstream = io.BytesIO(pcktdata)
-
-    pckts_list = []
-    pkt = True
-    while pkt is not None:
-        pkt = read_pus(pcktstream)
-        if pkt is not None:
-            pckts_list.append(pkt)
+    pckts_list = [bytes(pkt) for pkt in PusStream(pcktdata, partial=True)]
 
     pckts_list.sort(key=lambda x: get_cuc(x))
     with open(outfile, 'wb') as fd:
@@ -45,27 +38,6 @@ def merge_pools(*args, outfile=None, time_sort=False):
     print('>> TM packets written to {}, SORTED BY TIMESTAMP <<'.format(outfile))
 
 
-def read_pus(data):
-    pos = data.tell()
-    pus_size = data.read(6)
-
-    if pus_size == b'':
-        return
-
-    while len(pus_size) < 6:
-        add = data.read(1)
-        if add == b'':
-            return
-        pus_size += add
-
-    data.seek(pos)
-
-    # packet size is header size (6) + pus size field + 1
-    pckt_size = int.from_bytes(pus_size[4:6], 'big') + 7
-
-    return data.read(pckt_size)
-
-
 """
 def get_cuc(tm):
     try:
@@ -51,9 +51,12 @@ Functions in detail:
 --------------------
 """
 
+import concurrent.futures
 import logging
 import sys
+import threading
 import time
+from collections import deque
 
 import confignator
 sys.path.append(confignator.get_option('paths', 'ccs'))
@@ -69,6 +72,17 @@ import idb
 # create a logger
 logger = logging.getLogger(__name__)
 
+WAITER_POLL_INTERVAL = 0.2  # seconds between DB queries if the live packet buffer is not available
+WAITER_LIVE_WAIT = 1.  # maximum time a request to the live packet buffer blocks
+WAITER_LIVE_RETRY = 10.  # seconds after which the live packet buffer is tried again
+WAITER_RECENT_PKTS = 1000  # number of dispatched packets kept to serve waiters registered late
+AWAIT_TIMEOUT_MARGIN = 10.  # seconds an await_* call waits beyond its time window if no packets arrive at all
+ACK_WAIT_ALL = 1.  # seconds to wait for the remaining acknowledgements of a TC after the first one was received
+
+ACK_FAILURES = {2: 'Acknowledge failure of acceptance check for a command.',
+                4: 'Acknowledge failure of start check for a command.',
+                8: 'Acknowledge failure of termination check for a command.'}
+
 
 def filter_chain(query, pool_name, is_tm=True, st=None, sst=None, apid=None, seq=None, t_from=None, t_to=None, dest_id=None, not_apid=None):
     """
@@ -111,18 +125,9 @@ def filter_chain(query, pool_name, is_tm=True, st=None, sst=None, apid=None, seq
     if seq is not None:
         query = query.filter(tm_db.DbTelemetry.seq == seq)
     if t_from is not None:
-        # ToDo database has the CUC timestamp as string. Here the timestamps are floats.
-        # Does this comparison operations work?
-        t_from_string = str(t_from) + 'U'  # the timestamps in the database are saved as string
-        query = query.filter(tm_db.DbTelemetry.timestamp >= t_from)  # ToDo check if the change from > to >= breaks something!
-        # ToDo: Funktion Cast verwenden um String auf Double zu casten
-        # query = query.filter(tm_db.DbTelemetry.timestamp > t_from)  # <- comparison with float
+        query = query.filter(tm_db.DbTelemetry.cuc >= t_from)
     if t_to is not None:
-        # ToDo database has the CUC timestamp as string. Here the timestamps are floats.
-        # Does this comparison operations work?
-        t_to_string = str(t_to) + 'U'  # the timestamps in the database are saved as string
-        query = query.filter(tm_db.DbTelemetry.timestamp <= t_to) # ToDo: Funktion Cast verwenden um String auf Double zu casten
-        # query = query.filter(tm_db.DbTelemetry.timestamp <= end)  # <- comparison with float
+        query = query.filter(tm_db.DbTelemetry.cuc <= t_to)
     if dest_id is not None:
         query = query.filter(tm_db.DbTelemetry.destID == dest_id)
     if not_apid is not None:
@@ -529,9 +534,247 @@ def fetch_packets(pool_name, is_tm=True, st=None, sst=None, apid=None, ssc=None,
     return data
 
 
+class PacketWaiterRegistry:
+    """
+    Registry of waiters for packets of a pool. A waiter is a predicate on newly recorded packets and a future, which
+    is resolved with the matching packets as soon as they are recorded. A single dispatcher thread per pool reads the
+    new packets from the live packet buffer of the pool manager or, if that is not available, queries the DB for
+    packets with an index larger than the last one seen.
+    """
+
+    _registries = {}
+    _registries_lock = threading.Lock()
+
+    def __init__(self, pool_name, poll_interval=WAITER_POLL_INTERVAL):
+        self.pool_name = pool_name
+        self.poll_interval = poll_interval
+        self.last_idx = 0
+
+        self._waiters = {}  # future: (predicate, after, t_from, t_to)
+        self._recent = deque(maxlen=WAITER_RECENT_PKTS)
+        self._cond = threading.Condition()
+        self._idle = True
+        self._sub = None
+        self._live_retry = 0
+
+        self._thread = threading.Thread(target=self._run, name='packet_waiters_{}'.format(pool_name))
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    def for_pool(cls, pool_name):
+        """
+        Get the waiter registry of a pool, create it if necessary
+
+        :param str pool_name: Name of the pool
+        :rtype: PacketWaiterRegistry
+        """
+        with cls._registries_lock:
+            if pool_name not in cls._registries:
+                cls._registries[pool_name] = cls(pool_name)
+            return cls._registries[pool_name]
+
+    def register(self, predicate, t_from=None, t_to=None, after=None):
+        """
+        Register a waiter for packets recorded from now on. The returned future is resolved with the list of matching
+        raw packets, or an empty list as soon as a TM packet later than *t_to* is recorded. Once resolved, its
+        *last_idx* attribute holds the index of the last packet passed to the waiter.
+
+        :param predicate: callable taking the unpacked header and the raw packet, returning True for matching packets
+        :param float t_from: CUC timestamp, earlier TM packets are ignored
+        :param float t_to: CUC timestamp, end of the time window of the waiter
+        :param int after: only packets with a larger index are passed to the waiter, defaults to the last index in the
+                          DB; use the *last_idx* of a resolved future to continue where it left off
+        :rtype: concurrent.futures.Future
+        """
+        future = concurrent.futures.Future()
+        if after is None:
+            after = _get_last_idx(self.pool_name)
+
+        with self._cond:
+            self._waiters[future] = (predicate, after, t_from, t_to)
+            # packets already dispatched, but possibly not yet in the DB
+            self._dispatch([pkt for pkt in self._recent if pkt[0] > after], waiters=[future], keep=False)
+            self._cond.notify_all()
+
+        return future
+
+    def cancel(self, future):
+        """
+        Remove a waiter from the registry
+
+        :param concurrent.futures.Future future: The future returned by register
+        """
+        with self._cond:
+            self._waiters.pop(future, None)
+        future.cancel()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._waiters:
+                    self._idle = True
+                    self._recent.clear()
+                while not self._waiters:
+                    self._cond.wait()
+                if self._idle:
+                    # start from the oldest waiter, packets recorded before were not needed by anyone
+                    self.last_idx = min(waiter[1] for waiter in self._waiters.values())
+                    self._idle = False
+                    if self._sub is not None:
+                        self._sub.after = self.last_idx
+
+            try:
+                pkts = self._fetch()
+            except Exception as err:
+                logger.warning('PacketWaiterRegistry: fetching packets from {} failed: {}'.format(self.pool_name, err))
+                time.sleep(self.poll_interval)
+                continue
+
+            if pkts:
+                with self._cond:
+                    self.last_idx = max(self.last_idx, pkts[-1][0])
+                    self._dispatch(pkts)
+
+    def _fetch(self):
+        if self._sub is None and time.time() > self._live_retry:
+            self._sub = cfl.LivePacketSubscription(self.pool_name, after=self.last_idx)
+
+        if self._sub is not None:
+            pkts = self._sub.get(timeout=WAITER_LIVE_WAIT)
+            if pkts is not None:
+                return pkts
+
+            logger.debug('PacketWaiterRegistry: no live packet buffer for {}, polling DB'.format(self.pool_name))
+            self._sub.close()
+            self._sub = None
+            self._live_retry = time.time() + WAITER_LIVE_RETRY
+
+        rows = cfl.filter_rows(cfl.get_pool_rows(self.pool_name), idx_from=self.last_idx + 1)
+        pkts = [(row.idx, row.raw) for row in rows.order_by(tm_db.DbTelemetry.idx)]
+        if not pkts:
+            time.sleep(self.poll_interval)
+        return pkts
+
+    def _dispatch(self, pkts, waiters=None, keep=True):
+        matches = {}
+        expired = []
+
+        for idx, raw in pkts:
+            if keep:
+                self._recent.append((idx, raw))
+
+            try:
+                head = cfl.Tmread(raw)[0]
+                cuc = cfl.get_cuctime(head) if (head.PKT_TYPE == 0 and head.SEC_HEAD_FLAG == 1) else None
+            except Exception as err:
+                logger.debug('PacketWaiterRegistry: could not unpack packet {}: {}'.format(idx, err))
+                continue
+
+            for future in (waiters if waiters is not None else list(self._waiters)):
+                predicate, after, t_from, t_to = self._waiters[future]
+                if idx <= after or future in expired:
+                    continue
+                if cuc is not None:
+                    if t_to is not None and cuc > t_to:
+                        expired.append(future)
+                        continue
+                    if t_from is not None and cuc < t_from:
+                        continue
+                try:
+                    if predicate(head, raw):
+                        matches.setdefault(future, []).append(raw)
+                except Exception as err:
+                    logger.debug('PacketWaiterRegistry: predicate failed for packet {}: {}'.format(idx, err))
+
+        for future in set(expired) | set(matches):
+            self._waiters.pop(future, None)
+            if not future.done():
+                future.last_idx = pkts[-1][0]
+                future.set_result(matches.get(future, []))
+
+
+def _get_last_idx(pool_name):
+    """
+    Get the index of the most recent packet in the pool, 0 if it is empty
+
+    :param str pool_name: Name of the pool
+    :rtype: int
+    """
+    rows = cfl.tail(pool_name)
+    return rows[0].idx if rows else 0
+
+
+def _window_passed(pool_name, t_to):
+    """
+    Check whether the pool already holds a packet later than the end of a time window
+
+    :param str pool_name: Name of the pool
+    :param float t_to: CUC timestamp, end of the time window
+    :rtype: bool
+    """
+    last = cfl.get_last_pckt_time(pool_name=pool_name, string=False)
+    return last is not None and last > t_to
+
+
+def packet_predicate(is_tm=True, st=None, sst=None, apid=None, ssc=None, dest_id=None, not_apid=None):
+    """
+    Create a packet waiter predicate that checks the header fields, analogous to the filters of fetch_packets
+
+    :param bool is_tm: TM or TC
+    :param int st: Service type of the packet
+    :param int sst: Sub service type of the packet
+    :param int-or-str apid: Application process id of the packet
+    :param int ssc: Source sequence counter of the packet
+    :param int dest_id: Destination ID of the packet
+    :param int-or-str not_apid: APID the packet must not have
+    :return: predicate for PacketWaiterRegistry.register
+    """
+    if apid is not None:
+        apid = tools.convert_apid_to_int(apid=apid)
+    if not_apid is not None:
+        not_apid = tools.convert_apid_to_int(apid=not_apid)
+    pkt_type = 0 if is_tm else 1
+
+    def predicate(head, raw):
+        if head.PKT_TYPE != pkt_type:
+            return False
+        if st is not None and head.SERV_TYPE != st:
+            return False
+        if sst is not None and head.SERV_SUB_TYPE != sst:
+            return False
+        if apid is not None and head.APID != apid:
+            return False
+        if ssc is not None and head.PKT_SEQ_CNT != ssc:
+            return False
+        if dest_id is not None and (head.DEST_ID if is_tm else head.SOURCE_ID) != dest_id:
+            return False
+        if not_apid is not None and head.APID == not_apid:
+            return False
+        return True
+
+    return predicate
+
+
+def wait_for_packets(future, timeout):
+    """
+    Wait for the packets of a registered waiter
+
+    :param concurrent.futures.Future future: The future returned by PacketWaiterRegistry.register
+    :param float timeout: Maximum time in seconds to wait
+    :return: List of matching raw packets or []
+    :rtype: list
+    """
+    try:
+        return future.result(timeout=max(timeout, 0))
+    except concurrent.futures.TimeoutError:
+        return []
+
+
 def await_tm(pool_name, st, sst=None, apid=None, ssc=None, t_from=None, t_to=None, dest_id=None, not_apid=None, decode=True, duration=5, check_int=None):
     """ Waiting for a specific TM packet, if it is received the packet is returned immediately.
-    The database queries are done in regular intervals.
+    Packets already in the pool are fetched from the database, afterwards a waiter is woken up as soon as a matching
+    packet is recorded.
     
     :param pool_name: str
         name of the pool in the database
@@ -556,43 +799,41 @@ def await_tm(pool_name, st, sst=None, apid=None, ssc=None, t_from=None, t_to=Non
     :param duration: int
         Seconds how long the function waits and do database queries in regular intervals
     :param check_int: float
-        Frequency for executing database queries. If it is not provided, it will be set depending on the value of duration
+        Not used anymore, packets are dispatched as soon as they are recorded. Kept for compatibility.
     :return: list
         List of TM packets or []
     """
-    # always a empty array should be returned in order to prevent code-breaking bugs
-    result = []
-
     # set time interval for the desired packets
     t_from, t_to = set_time_interval(pool_name=pool_name, t_from=t_from, t_to=t_to, duration=duration)
 
-    # set the interval of fetching packets from the pool
-    if check_int is None:
-        check_int = set_query_interval(t_from=t_from, t_to=t_to)
+    # register the waiter before looking into the DB, so no packet is missed in between
+    waiters = PacketWaiterRegistry.for_pool(pool_name)
+    predicate = packet_predicate(st=st, sst=sst, apid=apid, ssc=ssc, dest_id=dest_id, not_apid=not_apid)
+    future = waiters.register(predicate, t_from=t_from, t_to=t_to)
 
-    # repeat the database call till the TM packet was received or t_to is reached
-    condition = True
-    while condition is True:
-        # get packets from the database
-        packets = fetch_packets(pool_name=pool_name,
-                                is_tm=True,
-                                st=st,
-                                sst=sst,
-                                apid=apid,
-                                ssc=ssc,
-                                t_from=t_from,
-                                t_to=t_to,
-                                dest_id=dest_id,
-                                not_apid=not_apid,
-                                decode=decode,
-                                silent=True)
-        # check condition
-        if len(packets) > 0 or cfl.get_last_pckt_time(pool_name=pool_name, string=False) > t_to:
-            condition = False
-            result = packets
-        else:
-            logger.debug('await_tm: waiting for {}s and then doing the query again'.format(check_int))
-            time.sleep(check_int)
+    try:
+        result = fetch_packets(pool_name=pool_name,
+                               is_tm=True,
+                               st=st,
+                               sst=sst,
+                               apid=apid,
+                               ssc=ssc,
+                               t_from=t_from,
+                               t_to=t_to,
+                               dest_id=dest_id,
+                               not_apid=not_apid,
+                               decode=decode,
+                               silent=True)
+        if len(result) == 0 and _window_passed(pool_name, t_to):
+            # e.g. a stored pool, no packet will be recorded anymore that expires the waiter
+            logger.debug('await_tm: pool {} is already past CUC {}'.format(pool_name, t_to))
+        elif len(result) == 0:
+            logger.debug('await_tm: waiting for TM({},{}) until CUC {}'.format(st, sst, t_to))
+            result = wait_for_packets(future, timeout=t_to - t_from + AWAIT_TIMEOUT_MARGIN)
+            if len(result) > 0 and decode is True:
+                result = decode_tm(tm_packets=result)
+    finally:
+        waiters.cancel(future)
 
     return result
 
@@ -1099,6 +1340,62 @@ def get_hk_val(pool_name, sid, par_id, apid=None):
     return cfl.get_hk_val(pool_name, sid, par_id, apid=apid)
 
 
+def is_acknow_of_tc(packet, tc_apid, tc_ssc):
+    """
+    Check if a decoded TM packet is an acknowledgement of the TC with the given APID and source sequence counter
+
+    :param tuple packet: decoded TM packet (header, data)
+    :param int tc_apid: Application process ID of the TC
+    :param int tc_ssc: Source sequence counter of the TC
+    :rtype: bool
+    """
+    if packet is None or packet[1] is None or packet[1][0] is None:
+        return False
+
+    # get the data entries for APID and SSC
+    pac_apid = packet[0][0].APID
+    if pac_apid == 961:  # for acknowledgements from SEM
+        name_apid = 'PAR_CMD_APID'
+        name_psc = 'PAR_CMD_SEQUENCE_COUNT'
+    else:
+        name_apid = 'TcPcktId'
+        name_psc = 'TcPcktSeqCtrl'
+    para = get_tm_data_entries(tm_packet=packet, data_entry_names=[name_apid, name_psc])
+    if name_apid not in para or name_psc not in para:
+        return False
+
+    # extract the SSC from the PSC
+    ssc = extract_ssc_from_psc(psc=para[name_psc])
+    apid = extract_apid_from_packetid(packet_id=para[name_apid])
+    if pac_apid == 961:  # acknowledgement packets from SEM have the PID in the field 'PAR_CMD_APID'
+        return apid == tools.extract_pid_from_apid(tc_apid) and ssc == tc_ssc
+    else:
+        return apid == tc_apid and ssc == tc_ssc
+
+
+def acknow_outcome(ack_tms):
+    """
+    Evaluate the acknowledgement TM packets of a TC
+
+    :param list ack_tms: decoded acknowledgement TM packets
+    :return: None if there are no acknowledgements, False if one of TM(1,2), TM(1,4), TM(1,8) was received,
+        True otherwise
+    """
+    result = None
+    for ack in ack_tms:
+        head = ack[0][0]
+        if head.SERV_SUB_TYPE in [2, 4, 8]:
+            logger.info('TM({},{}) @ {} FAILURE: {}'.format(head.SERV_TYPE, head.SERV_SUB_TYPE, cfl.get_cuctime(head),
+                                                           ACK_FAILURES[head.SERV_SUB_TYPE]))
+            logger.debug('Data of the TM packet: {}'.format(ack[1]))
+            result = False
+        elif head.SERV_SUB_TYPE in [1, 3, 7]:
+            logger.info('TM({},{}) @ {}'.format(head.SERV_TYPE, head.SERV_SUB_TYPE, cfl.get_cuctime(head)))
+            if result is None:
+                result = True
+    return result
+
+
 def get_tc_acknow(pool_name="LIVE", tc_apid=321, tc_ssc=None, tm_st=1, tm_sst=None):
     """
     Check if for the TC acknowledgement packets can be found in the database.
@@ -1140,29 +1437,9 @@ def get_tc_acknow(pool_name="LIVE", tc_apid=321, tc_ssc=None, tm_st=1, tm_sst=No
     ack_tms = []
     for i in range(len(packets)):
         if packets[i][1] is not None and packets[i][1][0] is not None:
-            # get the data entries for APID and SSC
-            #pac_apid = packets[i][0][3]  # TODO: not compatible anymore
-            pac_apid = packets[i][0][0].APID
             first_tm_bytes = packets[i][0][1].hex()[0:4]
-
-            if pac_apid == 961:  # for acknowledgements from SEM
-                name_apid = 'PAR_CMD_APID'
-                name_psc = 'PAR_CMD_SEQUENCE_COUNT'
-            else:
-                name_apid = 'TcPcktId'
-                name_psc = 'TcPcktSeqCtrl'
-            para = get_tm_data_entries(tm_packet=packets[i], data_entry_names=[name_apid, name_psc])
-            if name_apid in para and name_psc in para:
-                # extract the SSC from the PSC
-                ssc = extract_ssc_from_psc(psc=para[name_psc])
-                apid = extract_apid_from_packetid(packet_id=para[name_apid])
-                if pac_apid == 961:  # acknowledgement packets from SEM have the PID in the field 'PAR_CMD_APID'
-                    tc_pid = tools.extract_pid_from_apid(tc_apid)
-                    if apid == tc_pid and ssc == tc_ssc:
-                        ack_tms.append(packets[i])
-                else:
-                    if apid == tc_apid and ssc == tc_ssc:
-                        ack_tms.append(packets[i])
+            if is_acknow_of_tc(packets[i], tc_apid=tc_apid, tc_ssc=tc_ssc):
+                ack_tms.append(packets[i])
         else:
             logger.debug('get_tc_acknow: could not read the data from the TM packet')
 
@@ -1316,7 +1593,7 @@ def await_tc_acknow(tc_identifier, pool_name="LIVE", duration=10, tm_st=1, tm_ss
     :param tc_identifier: tuple
         A tuple consisting out of (APID, SSC, CUC-timestamp) of the TC
     :param duration: int or float
-        This is the time in second were the function repeatedly tries to find acknowledgment packets in the database
+        Maximum time in seconds to wait for acknowledgement packets
     :return: bool, list
         bool:
             None if no acknowledgement packets were found for the TC
@@ -1336,43 +1613,42 @@ def await_tc_acknow(tc_identifier, pool_name="LIVE", duration=10, tm_st=1, tm_ss
     assert isinstance(t_tc_sent, float)
     assert isinstance(duration, int) or isinstance(duration, float)
 
-    result = None
+    tc_apid = tools.convert_apid_to_int(apid=tc_apid)
 
-    # do database queries till, the acknowledgement packets are found or the duration elapsed
-    start_time = time.time()
-    finished = False
-    while True:
-        # get the acknowledgement packets for the TC
-        outcome, ack_list = get_tc_acknow(pool_name=pool_name,
-                                          t_tc_sent=t_tc_sent,
-                                          tc_apid=tc_apid,
-                                          tc_ssc=tc_ssc,
-                                          tm_st=tm_st,
-                                          tm_sst=tm_sst)
-        # if no acknowledgement packets were found, wait and do the next loop
-        if outcome is None:
-            time.sleep(1)
-        # acknowledgement packets were found
-        else:
-            finished = True
-            # if not all 3 TM(1,1), TM(1,3), TM(1,7) were received, wait 1s and query a last time
-            if tm_sst is None and len(ack_list) < 3:
-                time.sleep(1)
-                outcome, ack_list = get_tc_acknow(pool_name=pool_name,
-                                                  t_tc_sent=t_tc_sent,
-                                                  tc_apid=tc_apid,
-                                                  tc_ssc=tc_ssc,
-                                                  tm_st=tm_st,
-                                                  tm_sst=tm_sst)
-            result = outcome
-        # stop the loop if the duration is elapsed
-        current_time = time.time()
-        elapsed_time = current_time - start_time
-        if elapsed_time > duration:
-            finished = True
-        # if finished, leave the while loop
-        if finished is True:
-            break
+    def is_acknow(head, raw):
+        return head.PKT_TYPE == 0 and head.SERV_TYPE == tm_st and (tm_sst is None or head.SERV_SUB_TYPE == tm_sst) \
+            and is_acknow_of_tc(decode_single_tm_packet(raw), tc_apid=tc_apid, tc_ssc=tc_ssc)
+
+    def add_acks(pkts):
+        for pkt in pkts:
+            key = (pkt[0][0].SERV_SUB_TYPE, pkt[0][0].PKT_SEQ_CNT)
+            if key not in acks and is_acknow_of_tc(pkt, tc_apid=tc_apid, tc_ssc=tc_ssc):
+                acks[key] = pkt
+
+    acks = {}
+    waiters = PacketWaiterRegistry.for_pool(pool_name)
+    t_end = time.time() + duration
+    # register the waiter before looking into the DB, so no packet is missed in between
+    future = waiters.register(is_acknow, t_from=t_tc_sent)
+    try:
+        add_acks(fetch_packets(pool_name=pool_name, st=tm_st, sst=tm_sst, t_from=t_tc_sent))
+        while True:
+            # if not all 3 TM(1,1), TM(1,3), TM(1,7) were received, wait a little for the remaining ones
+            if acks and (tm_sst is not None or len(acks) >= 3):
+                break
+            if acks:
+                t_end = min(t_end, time.time() + ACK_WAIT_ALL)
+            if time.time() >= t_end:
+                break
+            add_acks(decode_tm(wait_for_packets(future, timeout=t_end - time.time())))
+            if future.done():
+                # continue after the packets the waiter has already seen, instead of querying the DB again
+                future = waiters.register(is_acknow, t_from=t_tc_sent, after=future.last_idx)
+    finally:
+        waiters.cancel(future)
+
+    ack_list = list(acks.values())
+    result = acknow_outcome(ack_list)
 
     # if no acknowledgement packets were received at all after the loop
     if result is None:
@@ -1540,7 +1816,7 @@ def get_frequency_of_hk(duration=60., frequency=20, SID=1, pool_name="LIVE"):
 
 
     list_of_timestamps = []
-    last_telemetry_packet = cfl.get_pool_rows(pool_name)[-1].raw
+    last_telemetry_packet = cfl.tail(pool_name)[0].raw
     timestamp = cfl.get_cuctime(last_telemetry_packet)
     # last_packet_sid = get_sid_of_tm(last_telemetry_packet)
     current_timestamp = 0.0
@@ -1548,7 +1824,7 @@ def get_frequency_of_hk(duration=60., frequency=20, SID=1, pool_name="LIVE"):
 
     while current_timestamp <= end_time:
 
-        current_telemetry_packet = cfl.get_pool_rows(pool_name)[-1].raw
+        current_telemetry_packet = cfl.tail(pool_name)[0].raw
         current_timestamp = cfl.get_cuctime(current_telemetry_packet)
         current_packet_sid = get_sid_of_tm((current_telemetry_packet))
         if current_timestamp not in list_of_timestamps and current_packet_sid == SID:
@@ -1750,29 +2026,27 @@ def await_event(pool_name, severity, event_id, entries=None, duration=10, t_from
     :param dict-or-list-of-dicts entries: Entries in the data field of the event TM packet which should be checked
     :param int-or-float duration: Seconds which will be waited. This time will be added to t_from
     :param float t_from: CUC timestamp of the start of the waiting for the event
-    :param int-or-float check_period: Seconds between the database queries
+    :param int-or-float check_period: Not used anymore, events are dispatched as soon as they are recorded
     :param bool decode: If True the TM packets will be decoded, otherwise not
 
     :return: A list of the found event TM is returned. If none are found a empty list is returned.
     :rtype: list
     """
-    # always a empty array should be returned in order to prevent code-breaking bugs
-    result = []
-
     # set time interval for the desired packets
     t_from, t_to = set_time_interval(pool_name=pool_name, t_from=t_from, t_to=None, duration=duration)
 
-    # set the interval of fetching packets from the pool
-    if check_period is None:
-        check_period = set_query_interval(t_from=t_from, t_to=t_to)
-
     st = 5
     sst = severity
 
-    # repeat the database call till the TM packet was received or t_to is reached
-    condition = True
-    while condition is True:
-        # get packets from the database
+    def is_event(head, raw):
+        return head.PKT_TYPE == 0 and head.SERV_TYPE == st and head.SERV_SUB_TYPE == sst and \
+            len(condition_event_id(tmpackets=[raw], event_id=event_id, data_entries=entries)) > 0
+
+    # register the waiter before looking into the DB, so no packet is missed in between
+    waiters = PacketWaiterRegistry.for_pool(pool_name)
+    future = waiters.register(is_event, t_from=t_from, t_to=t_to)
+
+    try:
         packets = fetch_packets(pool_name=pool_name,
                                 is_tm=True,
                                 st=st,
@@ -1783,14 +2057,17 @@ def await_event(pool_name, severity, event_id, entries=None, duration=10, t_from
                                 silent=True)
 
         # check condition (if the event TM packets have been found)
-        events = condition_event_id(tmpackets=packets, event_id=event_id, data_entries=entries)
-
-        if len(events) > 0 or cfl.get_last_pckt_time(pool_name=pool_name, string=False) > t_to:
-            condition = False
-            result = events
-        else:
-            logger.debug('await_event: waiting for {}s and then doing the query again'.format(check_period))
-            time.sleep(check_period)
+        result = condition_event_id(tmpackets=packets, event_id=event_id, data_entries=entries)
+
+        if len(result) == 0 and _window_passed(pool_name, t_to):
+            # e.g. a stored pool, no packet will be recorded anymore that expires the waiter
+            logger.debug('await_event: pool {} is already past CUC {}'.format(pool_name, t_to))
+        elif len(result) == 0:
+            logger.debug('await_event: waiting for event {} until CUC {}'.format(event_id, t_to))
+            packets = wait_for_packets(future, timeout=t_to - t_from + AWAIT_TIMEOUT_MARGIN)
+            result = condition_event_id(tmpackets=packets, event_id=event_id, data_entries=entries)
+    finally:
+        waiters.cancel(future)
 
     # logging and return of the result
     if len(result) > 0:
@@ -1974,22 +2251,15 @@ def get_data_of_last_tc(pool_name="LIVE", apid=None):
         timestamp of packet, IID of packet, First four bytes of packet data
     """
 
-    tm_pool = cfl.get_pool_rows(pool_name)
-
-    tcpkt = tm_pool.filter(cfl.DbTelemetry.is_tm == 1).order_by(cfl.DbTelemetry.idx.desc())
-
-    if apid is not None:
-        tcpkt = tcpkt.filter(cfl.DbTelemetry.apid == apid)
-
-    tcpkt = tcpkt.first()
+    tcpkt = cfl.tail(pool_name, tmtc=1, apid=apid)
 
-    if tcpkt is None:
+    if not tcpkt:
         return
 
-    tc_id = tcpkt.idx
-    tc_bytes = tcpkt.raw[:4]  # fist 4 bytes of TC used for identification in ACK service
+    tc_id = tcpkt[0].idx
+    tc_bytes = tcpkt[0].raw[:4]  # fist 4 bytes of TC used for identification in ACK service
 
-    tm_before_tc = tm_pool.filter(cfl.DbTelemetry.is_tm == 0, cfl.DbTelemetry.idx < tc_id).order_by(cfl.DbTelemetry.idx.desc()).first()
+    tm_before_tc = cfl.tail(pool_name, tmtc=0, idx_to=tc_id - 1)[0]
 
     timestamp = tm_before_tc.timestamp
     timestamp = float(timestamp[:-1])
@@ -2013,10 +2283,8 @@ def verify_no_more_hk(wait_time=5, pool_name="LIVE"):
 
     hk_signature = "0001050000000000000000000000000000000000000000000000000000000000000000000000000000000112"
     time.sleep(wait_time)
-    # TODO incorporate function to find last 100 packets
     list_of_packets = []
-    for i in range (1,1000):
-        current_telemetry_packet = cfl.get_pool_rows(pool_name)[-i]
+    for current_telemetry_packet in reversed(cfl.tail(pool_name, 999)):
         current_raw = current_telemetry_packet.raw
         current_data = current_telemetry_packet.data
         list_of_packets.append(current_data.hex())
@@ -2045,19 +2313,10 @@ def get_last_100_packets(pool_name="Live"):
 # TODO Fix function to work with any number of packets
     raw_packets = []
     data_packets = []
-    data_pool = cfl.get_pool_rows(pool_name)
 
-
-
-    for i in range(1, 101):
-        try:
-            current_packet = cfl.get_pool_rows(pool_name)[-i]
-            current_raw = current_packet.raw
-            current_data = current_packet.data
-            raw_packets.append(current_raw)
-            data_packets.append(current_data)
-        except IndexError:
-            break
+    for current_packet in reversed(cfl.tail(pool_name, 100)):
+        raw_packets.append(current_packet.raw)
+        data_packets.append(current_packet.data)
 
 
     return raw_packets, data_packets
@@ -2078,7 +2337,7 @@ def get_dpu_mode(pool_name="LIVE"):
 
     """
 
-    data_packet = cfl.get_pool_rows(pool_name)[-1].raw
+    data_packet = cfl.tail(pool_name)[0].raw
     dpu_mode = get_tm_data_entries(data_packet,"DpuMode")
     print(dpu_mode)
 
@@ -2094,7 +2353,7 @@ def get_packet_length(pool_name="LIVE"):
 
     """
 
-    data_packet = cfl.get_pool_rows(pool_name)[-1].raw
+    data_packet = cfl.tail(pool_name)[0].raw
     packet_length = len(data_packet)
     print(packet_length)
 
@@ -2115,7 +2374,7 @@ def get_version_number(version_number="0x0112", pool_name="LIVE"):
 
     assert isinstance(version_number, str)
 
-    data_packet = cfl.get_pool_rows(pool_name)[-1].raw
+    data_packet = cfl.tail(pool_name)[0].raw
     packet_version_number_dic = get_tm_data_entries(data_packet, "VersionNumber")
     # print(packet_version_number)
     packet_version_number = hex(packet_version_number_dic["VersionNumber"])
@@ -2147,7 +2406,7 @@ def await_tc_identifier(pool_name, tc_apid, tc_ssc):
     assert isinstance(tc_apid, int) or isinstance(tc_apid, str)
     assert isinstance(tc_ssc, int)
 
-    last_tm_timestamp = cfl.get_pool_rows(pool_name)[-1].timestamp
+    last_tm_timestamp = cfl.tail(pool_name, tmtc=0)[0].timestamp
     length_last_tm_timestamp = len(last_tm_timestamp)
     last_tm_timestamp = last_tm_timestamp[:length_last_tm_timestamp - 1]
     last_tm_timestamp = float(last_tm_timestamp)
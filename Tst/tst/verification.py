@@ -293,15 +293,15 @@ def read_verification(verification_string):
 """
 
 def type_comparison(comparison_data, sst_1=1, sst_2=7, st_=1, st_2=1,):
-    pool_rows = cfl.get_pool_rows("PLM")
+    # walk backwards through the pool, without loading it completely
+    pool_rows = cfl.get_pool_rows("PLM").order_by(cfl.DbTelemetry.idx.desc()).yield_per(1000)
 
     st_list = []
     sst_list = []
-    x = 0
     header_counter = 0
-    while header_counter < 2:
-        x += 1
-        entry = pool_rows.all()[-x]
+    for entry in pool_rows:
+        if header_counter >= 2:
+            break
 
         if entry.data.hex() == comparison_data:
 
@@ -345,13 +345,9 @@ def Verification( st_1=1, sst_1=1, st_2=1, sst_2=7, pool_name="PLM", verificatio
         # while running the script checks the last three entries of the database and keeps them up to date
         # to recognize a tc it checks the time
 
-        pool_rows = cfl.get_pool_rows(pool_name)
-
         system_time = time.clock_gettime(0)
 
-        entry_1_data = pool_rows.all()[-1]
-        # entry_2_data = pool_rows.all()[-2]
-        # entry_3_data = pool_rows.all()[-3]
+        entry_1_data = cfl.tail(pool_name)[0]
 
         time_1 = entry_1_data.timestamp
 